@@ -1,9 +1,17 @@
 """Contains the project versioning."""
 
+from typing import Any
+
 __version__ = "0.0.1"
 __version_info__ = tuple(int(i) for i in __version__.split(".") if i.isdigit())
 
 
-from hledger_preprocessor.__main__ import main
+def __getattr__(name: str) -> Any:
+    """Imports `main` on first access, so that importing a submodule does not
+    import the whole CLI."""
+    if name == "main":
+        # pylint: disable=import-outside-toplevel
+        from hledger_preprocessor.__main__ import main
 
-_ = main  # Prevents linter warnings without executing `main`.
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
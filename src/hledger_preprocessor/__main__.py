@@ -1,170 +1,361 @@
 """Entry point for the project."""
 
-import csv
 import os
+import sys
 from argparse import Namespace
-from typing import Any, Dict, List
-
-from typeguard import typechecked
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 from hledger_preprocessor.arg_parser import create_arg_parser, verify_args
 from hledger_preprocessor.classification.ai_based.ai_eg0 import ExampleAIModel
-from hledger_preprocessor.classification.classifier import classify_transactions
+from hledger_preprocessor.classification.ai_based.answer_store import (
+    AnswerStore,
+    get_answer_store,
+)
+from hledger_preprocessor.classification.ai_based.model_pool import (
+    get_model_pool,
+)
+from hledger_preprocessor.classification.ai_scheduler import (
+    AIClassificationScheduler,
+)
+from hledger_preprocessor.classification.classifier import (
+    ClassificationCache,
+    get_classification_cache,
+    iter_classified_transactions,
+)
 from hledger_preprocessor.classification.logic_based.logic_eg0 import (
     ExampleLogicModel,
 )
+from hledger_preprocessor.classification.unclassified import (
+    UnclassifiedCollector,
+    get_review_path,
+    review_unclassified_transactions,
+    update_review_file,
+)
+from hledger_preprocessor.columnar_ingestion import iter_columnar_transactions
 from hledger_preprocessor.create_start import ask_user_for_starting_info
+from hledger_preprocessor.deduplication import (
+    DuplicateFilter,
+    create_duplicate_filter,
+)
 from hledger_preprocessor.dir_reading_and_writing import (
     assert_dir_exists,
     assert_dir_hierarchy_exists,
     generate_output_path,
 )
 from hledger_preprocessor.file_reading_and_writing import (
+    YearRoutedCsvWriter,
     assert_file_exists,
-    convert_input_csv_encoding,
-    detect_file_encoding,
+    hash_file,
     write_to_file,
 )
 from hledger_preprocessor.generate_rules_content import RulesContentCreator
 from hledger_preprocessor.parser_logic_structure import Transaction
-from hledger_preprocessor.triodos_logic import (
-    TriodosParserSettings,
-    parse_triodos_transaction,
+from hledger_preprocessor.preprocessing_manifest import (
+    ManifestEntry,
+    get_manifest_key,
+    get_parser_version,
+    get_rules_fingerprint,
+    is_up_to_date,
+    update_manifest,
 )
+from hledger_preprocessor.profiling import (
+    NULL_PROFILER,
+    NullStageProfiler,
+    StageProfiler,
+    write_profile_report,
+)
+from hledger_preprocessor.statement_parsing import iter_input_transactions
+from hledger_preprocessor.triodos_logic import TriodosParserSettings
+from hledger_preprocessor.typechecking import typechecked
+
+
+def iter_source_transactions(
+    *,
+    args: Namespace,
+    profiler: Union[StageProfiler, NullStageProfiler] = NULL_PROFILER,
+) -> Iterator[Transaction]:
+    """Yields the transactions of the input file, parsed row by row, or in
+    bulk if --columnar is used."""
+    if getattr(args, "columnar", False):
+        return iter_columnar_transactions(
+            input_csv_filepath=args.input_file,
+            account_holder=args.account_holder,
+            bank=args.bank,
+            account_type=args.account_type,
+            profiler=profiler,
+        )
+    return iter_input_transactions(
+        input_csv_filepath=args.input_file,
+        account_holder=args.account_holder,
+        bank=args.bank,
+        account_type=args.account_type,
+        profiler=profiler,
+    )
 
 
 @typechecked
-def write_processed_csv(
-    transactions: List[Transaction],
-    file_name: str,
-    ai_models: List,
-    logic_models: List,
-) -> None:
-    classified_transactions: List[Transaction] = classify_transactions(
-        transactions=transactions,
-        ai_models=ai_models,
-        logic_models=logic_models,
+def get_years(*, transactions: List[Transaction]) -> List[int]:
+    """Returns the unique years of the transactions, in order of first
+    appearance."""
+    years: List[int] = list(
+        dict.fromkeys(transaction.get_year() for transaction in transactions)
     )
-    # Get fieldnames dynamically from the first object in the list
-    if transactions:
-        fieldnames = transactions[0].to_dict().keys()
-        # TODO: change to ensure the fields are not sorted by the .keys() function.
-        # So that they preserve the same order.
-        print(f"fieldnames={fieldnames}")
-
-        with open(file_name, mode="w", encoding="utf-8", newline="") as outfile:
-            # writer = csv.writer(outfile)
-            writer = csv.DictWriter(
-                outfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL
-            )
-            writer.writeheader()
+    return years
 
-            # Write each transaction as a row in the CSV
-            for txn in transactions:
-                writer.writerow(txn.to_dict())
+
+def sort_transactions_on_years(
+    *, transactions: List[Transaction]
+) -> Dict[int, List[Transaction]]:
+    """Groups the transactions per year in a single pass, preserving their
+    order."""
+    transactions_per_year: Dict[int, List[Transaction]] = {}
+    for transaction in transactions:
+        transactions_per_year.setdefault(transaction.get_year(), []).append(
+            transaction
+        )
+    return transactions_per_year
 
 
 @typechecked
-def process_transactions(
-    rows: List[List[str]],
-    account_holder: str,
-    bank: str,
-    account_type: str,
-) -> List[Transaction]:
-    transactions: List[Transaction] = []
-    for index, row in enumerate(
-        reversed(rows), start=1
-    ):  # Process rows from bottom to top
-        transaction = parse_triodos_transaction(
-            row,
-            index,
-            account_holder=account_holder,
-            bank=bank,
-            account_type=account_type,
-        )
-        transactions.append(transaction)
-    return transactions
+def use_rules_file(*, logic_models: List, filepath: Optional[str]) -> None:
+    """Lets the logic models that support a rule file use it, or stop using
+    the rule file of a previous run if filepath is None."""
+    for logic_model in logic_models:
+        if hasattr(logic_model, "use_rules_file"):
+            logic_model.use_rules_file(filepath=filepath)
 
 
 @typechecked
-def parse_encoded_input_csv(
-    input_csv_filepath: str,
-    account_holder: str,
-    bank: str,
-    account_type: str,
-) -> List[Transaction]:
-    updated_encoding = detect_file_encoding(input_csv_filepath)
-    with open(
-        input_csv_filepath,
-        encoding=updated_encoding,
-        errors="replace",
-    ) as infile:
-        reader = csv.reader(infile)
-        rows = list(reader)
-    transactions = process_transactions(
-        rows,
-        account_holder=account_holder,
-        bank=bank,
-        account_type=account_type,
-    )
-
-    return transactions
+def should_ask_for_rules(*, args: Namespace) -> bool:
+    """Returns True if the run should wait for the user to add a rule per
+    unclassified transaction. By default, it only does so for a single input
+    file that is preprocessed from a terminal."""
+    unclassified: Optional[str] = getattr(args, "unclassified", None)
+    if unclassified is not None:
+        return unclassified == "ask"
+    return sys.stdin.isatty() and not getattr(args, "all", False)
 
 
 @typechecked
-def get_years(*, transactions: List[Transaction]) -> List[int]:
-    years: List[int] = [transaction.get_year() for transaction in transactions]
-    return years
+def set_ask_for_rules(*, logic_models: List, ask_for_rules: bool) -> None:
+    for logic_model in logic_models:
+        if hasattr(logic_model, "ask_for_rules"):
+            logic_model.ask_for_rules = ask_for_rules
 
 
-def sort_transactions_on_years(
-    *, transactions: List[Transaction]
-) -> Dict[int, List[Transaction]]:
-    years = get_years(transactions=transactions)
-    return {
-        year: [t for t in transactions if t.get_year() == year]
-        for year in years
-    }
+@typechecked
+def select_ai_models(*, args: Namespace, ai_models: List) -> List:
+    """Returns the AI models that are selected with --ai-model."""
+    if getattr(args, "ai_model", "llm") == "nearest_neighbour":
+        # pylint: disable=import-outside-toplevel
+        from hledger_preprocessor.classification.ai_based import (
+            nearest_neighbour,
+        )
+
+        return [
+            nearest_neighbour.get_nearest_neighbour_model(
+                index_path=getattr(args, "nearest_neighbour_index", None)
+            )
+        ]
+    return ai_models
 
 
 @typechecked
 def pre_process_csvs(
     *, args: Namespace, ai_models: List, logic_models: List
-) -> None:
-    # Hardcoded parameters.
-    csv_encoding: str = "utf-8"
+) -> int:
+    """Writes the pre-processed .csv files per year of the input file, and
+    returns the number of processed transactions.
 
-    # Convert the input csv file encoding.
-    convert_input_csv_encoding(
-        input_csv_filepath=args.input_file, output_encoding=csv_encoding
+    Input files that did not change since they were last preprocessed (with
+    the same parser and rules) are skipped, unless --force is used.
+    """
+    use_rules_file(
+        logic_models=logic_models, filepath=getattr(args, "rules_file", None)
     )
-    total_transactions: List[Transaction] = parse_encoded_input_csv(
-        input_csv_filepath=args.input_file,
-        account_holder=args.account_holder,
-        bank=args.bank,
-        account_type=args.account_type,
+    set_ask_for_rules(
+        logic_models=logic_models,
+        ask_for_rules=should_ask_for_rules(args=args),
+    )
+    use_ai_models: bool = getattr(args, "ai_classification", False)
+    if use_ai_models:
+        ai_models = select_ai_models(args=args, ai_models=ai_models)
+    account_type_path: str = (
+        f"{args.start_path}/import/{args.account_holder}/{args.bank}/"
+        + f"{args.account_type}"
+    )
+    input_key: str = get_manifest_key(
+        account_type_path=account_type_path, filepath=args.input_file
     )
-    transactions_per_year: Dict[int, List[Transaction]] = (
-        sort_transactions_on_years(transactions=total_transactions)
+    expected_entry: ManifestEntry = ManifestEntry(
+        input_hash=hash_file(filepath=args.input_file),
+        parser_version=get_parser_version(),
+        rules_fingerprint=get_rules_fingerprint(
+            models=ai_models + logic_models, use_ai_models=use_ai_models
+        ),
+        outputs=[],
+        duplicates_mode=getattr(args, "duplicates", "off"),
     )
+    if not args.force and is_up_to_date(
+        account_type_path=account_type_path,
+        input_key=input_key,
+        expected_entry=expected_entry,
+    ):
+        print(f"Skipping unchanged input file: {args.input_file}")
+        return 0
 
-    # Output the pre-processed .csv files per year.
-    for year, transactions in transactions_per_year.items():
-        output_filepath: str = generate_output_path(
-            root_path=args.start_path,
-            account_holder=args.account_holder,
-            bank=args.bank,
-            account_type=args.account_type,
-            pre_processed_output_dir=args.pre_processed_output_dir,
-            year=year,
-            input_filename=os.path.basename(args.input_file),
+    classification_cache: Optional[ClassificationCache] = None
+    if getattr(args, "cache_classifications", False):
+        classification_cache = get_classification_cache(
+            fingerprint=expected_entry.rules_fingerprint
+        )
+
+    duplicate_filter: Optional[DuplicateFilter] = None
+    if expected_entry.duplicates_mode != "off":
+        duplicate_filter = create_duplicate_filter(
+            account_type_path=account_type_path,
+            input_file=input_key,
+            input_csv_filepath=args.input_file,
+            input_hash=expected_entry.input_hash,
+            mode=expected_entry.duplicates_mode,
+        )
+        if duplicate_filter.drop:
+            # Without the input files that contain the dropped duplicates,
+            # the input file has to be processed again.
+            expected_entry.duplicate_owners = duplicate_filter.owner_hashes
+
+    profiler: Union[StageProfiler, NullStageProfiler] = NULL_PROFILER
+    if getattr(args, "profile", False):
+        profiler = StageProfiler(use_cprofile=args.cprofile)
+        ai_models = [profiler.profile_model(model) for model in ai_models]
+        logic_models = [profiler.profile_model(model) for model in logic_models]
+
+    ai_scheduler: Optional[AIClassificationScheduler] = None
+    if use_ai_models:
+        ai_scheduler = AIClassificationScheduler(
+            ai_models=ai_models,
+            batch_size=args.ai_batch_size,
+            max_workers=args.ai_workers,
+            max_in_flight=args.ai_max_in_flight,
+            timeout=args.ai_timeout,
         )
-        write_processed_csv(
-            transactions=transactions,
-            file_name=output_filepath,
+
+    # Stream the transactions from the reader through the classifiers to the
+    # pre-processed .csv file of their year.
+    source_transactions: Iterator[Transaction] = profiler.iter_stage(
+        "parse", iter_source_transactions(args=args, profiler=profiler)
+    )
+    if duplicate_filter is not None:
+        # Duplicates are dropped before they are classified.
+        source_transactions = duplicate_filter.iter_filtered(
+            source_transactions
+        )
+    classified_transactions: Iterator[Transaction] = profiler.iter_stage(
+        "classify",
+        iter_classified_transactions(
+            source_transactions,
             ai_models=ai_models,
             logic_models=logic_models,
+            cache=classification_cache,
+            ai_scheduler=ai_scheduler,
+        ),
+    )
+    unclassified_collector: UnclassifiedCollector = UnclassifiedCollector(
+        input_file=input_key
+    )
+    nr_of_transactions: int = 0
+    profiler.start()
+    try:
+        with YearRoutedCsvWriter(
+            get_output_filepath=lambda year: generate_output_path(
+                root_path=args.start_path,
+                account_holder=args.account_holder,
+                bank=args.bank,
+                account_type=args.account_type,
+                pre_processed_output_dir=args.pre_processed_output_dir,
+                year=year,
+                input_filename=os.path.basename(args.input_file),
+            ),
+            profiler=profiler,
+        ) as year_routed_writer:
+            for transaction in unclassified_collector.iter_collected(
+                classified_transactions
+            ):
+                with profiler.stage("write"):
+                    year_routed_writer.write(transaction=transaction)
+                nr_of_transactions += 1
+    finally:
+        profiler.stop()
+        if ai_scheduler is not None:
+            ai_scheduler.close()
+    if isinstance(profiler, StageProfiler):
+        print_profile(
+            args=args,
+            profiler=profiler,
+            nr_of_transactions=nr_of_transactions,
+        )
+    if classification_cache is not None:
+        classification_cache.flush()
+    if ai_scheduler is not None:
+        print(get_model_pool().format_stats())
+        print(
+            f"AI classification timeouts: {ai_scheduler.nr_of_timeouts},"
+            f" failures: {ai_scheduler.nr_of_failures}."
+        )
+        answer_store: AnswerStore = get_answer_store()
+        print(
+            f"LLM answer store: {answer_store.hits}/{answer_store.lookups}"
+            f" hits ({answer_store.get_hit_rate():.0%})."
         )
+    if duplicate_filter is not None and duplicate_filter.found:
+        print(duplicate_filter.format_report(input_file=input_key))
+    update_review_file(
+        account_type_path=account_type_path,
+        input_file=input_key,
+        entries=list(unclassified_collector.entries.values()),
+    )
+    if unclassified_collector.nr_of_transactions:
+        print(
+            f"{unclassified_collector.nr_of_transactions} transactions"
+            f" ({len(unclassified_collector.entries)} unique) have no rule,"
+            f" see: {get_review_path(account_type_path=account_type_path)}"
+        )
+    for output_filepath in year_routed_writer.output_filepaths.values():
+        expected_entry.outputs.append(
+            get_manifest_key(
+                account_type_path=account_type_path, filepath=output_filepath
+            )
+        )
+
+    update_manifest(
+        account_type_path=account_type_path,
+        input_key=input_key,
+        entry=expected_entry,
+    )
+    return nr_of_transactions
+
+
+@typechecked
+def print_profile(
+    *, args: Namespace, profiler: StageProfiler, nr_of_transactions: int
+) -> None:
+    """Prints the time and memory per stage, and writes them to a JSON report
+    in the --profile-dir."""
+    print(profiler.format_stats())
+    report_path: str = write_profile_report(
+        profile_dir=args.profile_dir,
+        name=(
+            f"{args.account_holder}-{args.bank}-{args.account_type}-"
+            + os.path.splitext(os.path.basename(args.input_file))[0]
+        ),
+        profiler=profiler,
+        report=profiler.get_report(
+            account=f"{args.account_holder}:{args.bank}:{args.account_type}",
+            input_file=os.path.abspath(args.input_file),
+            nr_of_transactions=nr_of_transactions,
+        ),
+    )
+    print(f"Wrote the profile to: {report_path}")
 
 
 @typechecked
@@ -198,16 +389,30 @@ def generate_rules_file(*, args: Namespace) -> None:
 
 
 @typechecked
-def main() -> None:
-
-    # Parse input arguments
-    parser = create_arg_parser()
-    args: Any = verify_args(parser=parser)
-
+def create_models() -> Tuple[List, List]:
+    """Creates the AI and logic classification models."""
     ai_model = ExampleAIModel()
     logic_model = ExampleLogicModel()
     ai_models: List = [ai_model]
     logic_models: List = [logic_model]
+    return ai_models, logic_models
+
+
+@typechecked
+def run(*, args: Namespace, ai_models: List, logic_models: List) -> None:
+    """Performs the actions specified by the parsed CLI args."""
+    if args.all:
+        # pylint: disable=import-outside-toplevel
+        from hledger_preprocessor.batch_processing import (
+            pre_process_all_statements,
+        )
+
+        pre_process_all_statements(
+            args=args, ai_models=ai_models, logic_models=logic_models
+        )
+        validate_balances_after_run(args=args)
+        review_after_run(args=args)
+        return
     # TODO: determine which bank is used and get logic accordingly.
     if args.new:
         ask_user_for_starting_info(
@@ -228,3 +433,54 @@ def main() -> None:
             ai_models=ai_models,
             logic_models=logic_models,
         )
+        validate_balances_after_run(args=args)
+    review_after_run(args=args)
+
+
+@typechecked
+def validate_balances_after_run(*, args: Namespace) -> None:
+    """Prints the balance breaks of the processed accounts, if
+    --validate-balances is used."""
+    if not getattr(args, "validate_balances", False):
+        return
+    # pylint: disable=import-outside-toplevel
+    from hledger_preprocessor.balance_validation import (
+        validate_account_balances,
+    )
+
+    account_filter: str = (
+        ""
+        if args.all
+        else f"{args.account_holder}:{args.bank}:{args.account_type}"
+    )
+    balance_breaks = validate_account_balances(
+        start_path=args.start_path, account_filter=account_filter
+    )
+    for balance_break in balance_breaks:
+        print(balance_break)
+    print(f"Found {len(balance_breaks)} balance breaks.")
+
+
+@typechecked
+def review_after_run(*, args: Namespace) -> None:
+    """Starts the interactive review of the unclassified transactions, if
+    --review is used and the user can answer."""
+    if not getattr(args, "review", False):
+        return
+    if not sys.stdin.isatty():
+        print("Skipping --review, because the input is not a terminal.")
+        return
+    review_unclassified_transactions(
+        start_path=args.start_path, rules_file=args.rules_file
+    )
+
+
+@typechecked
+def main() -> None:
+
+    # Parse input arguments
+    parser = create_arg_parser()
+    args: Any = verify_args(parser=parser)
+
+    ai_models, logic_models = create_models()
+    run(args=args, ai_models=ai_models, logic_models=logic_models)
@@ -0,0 +1,44 @@
+"""Contains the exact money type of the transactions.
+
+Amounts and balances are stored as an integer number of cents with their
+currency, instead of as floats. So they are parsed, summed and compared
+exactly, and written to the pre-processed .csv files with exactly 2 decimals.
+"""
+
+from dataclasses import dataclass
+
+DEFAULT_CURRENCY: str = "EUR"
+
+
+@dataclass(frozen=True, slots=True)
+class Amount:
+    cents: int
+    currency: str = DEFAULT_CURRENCY
+
+    def __str__(self) -> str:
+        """Returns the amount with 2 decimals, e.g. -1234.56, which hledger
+        reads without a decimal mark directive."""
+        euros, cents = divmod(abs(self.cents), 100)
+        return f"{'-' if self.cents < 0 else ''}{euros}.{cents:02d}"
+
+    def check_currency(self, other: "Amount") -> None:
+        if self.currency != other.currency:
+            raise ValueError(
+                f"Cannot combine {self.currency} with {other.currency}."
+            )
+
+    def __add__(self, other: "Amount") -> "Amount":
+        self.check_currency(other)
+        return Amount(cents=self.cents + other.cents, currency=self.currency)
+
+    def __sub__(self, other: "Amount") -> "Amount":
+        self.check_currency(other)
+        return Amount(cents=self.cents - other.cents, currency=self.currency)
+
+    def __neg__(self) -> "Amount":
+        return Amount(cents=-self.cents, currency=self.currency)
+
+    def to_float(self) -> float:
+        """Returns the approximate amount, for features that do not need to
+        be exact."""
+        return self.cents / 100
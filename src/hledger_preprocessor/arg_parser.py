@@ -1,11 +1,14 @@
 """Parses the CLI args."""
 
 import argparse
+import os
 import re
 from argparse import ArgumentParser
-from typing import Any
+from typing import Any, List, Optional
 
-from typeguard import typechecked
+from hledger_preprocessor.cache_dir import get_cache_dir
+from hledger_preprocessor.deduplication import DUPLICATE_MODES
+from hledger_preprocessor.typechecking import typechecked
 
 
 @typechecked
@@ -14,22 +17,22 @@ def create_arg_parser() -> argparse.ArgumentParser:
         description="Convert Triodos Bank CSV to custom format."
     )
 
-    # Required args.
+    # Required args, unless --all is used.
     parser.add_argument(
         "-a",
         "--account-holder",
         type=str,
-        required=True,
+        required=False,
         help="Name of account holder.",
     )
     parser.add_argument(
-        "-b", "--bank", type=str, required=True, help="Name of bank."
+        "-b", "--bank", type=str, required=False, help="Name of bank."
     )
     parser.add_argument(
         "-t",
         "--account-type",
         type=str,
-        required=True,
+        required=False,
         help="Account type, e.g. checkings/savings etc..",
     )
 
@@ -77,14 +80,210 @@ def create_arg_parser() -> argparse.ArgumentParser:
         required=False,
         help="The dir name containing the pre-processed csv files..",
     )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help=(
+            "Preprocesses the input csv files even if they did not change"
+            " since they were last preprocessed."
+        ),
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help=(
+            "Preprocesses all input csv files of all accounts in the"
+            " start-path, and generates their .rules files."
+        ),
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of processes used by --all.",
+    )
+    parser.add_argument(
+        "-r",
+        "--rules-file",
+        type=str,
+        required=False,
+        help=(
+            "Path to a .csv file with classification rules, which are applied"
+            " before the rules in the Python code."
+        ),
+    )
+    parser.add_argument(
+        "--ai-classification",
+        action="store_true",
+        help=(
+            "Classifies the transactions with the AI models too, instead of"
+            " writing a filler."
+        ),
+    )
+    parser.add_argument(
+        "--ai-model",
+        choices=["llm", "nearest_neighbour"],
+        default="llm",
+        help=(
+            "The AI model of --ai-classification: the local LLM, or the"
+            " nearest neighbours in the previously classified transactions."
+        ),
+    )
+    parser.add_argument(
+        "--nearest-neighbour-index",
+        type=str,
+        required=False,
+        help=(
+            "Path to the index of hledger_preprocessor_nn_index, the default"
+            " is in ~/.cache/hledger_preprocessor."
+        ),
+    )
+    parser.add_argument(
+        "--ai-batch-size",
+        type=int,
+        default=16,
+        help="Number of transactions per batch of AI classification.",
+    )
+    parser.add_argument(
+        "--ai-workers",
+        type=int,
+        default=1,
+        help="Number of threads that run the AI classification.",
+    )
+    parser.add_argument(
+        "--ai-max-in-flight",
+        type=int,
+        default=4,
+        help=(
+            "Number of batches that may wait for their AI classification,"
+            " before the preprocessor waits for the oldest batch."
+        ),
+    )
+    parser.add_argument(
+        "--ai-timeout",
+        type=float,
+        default=30.0,
+        help=(
+            "Seconds the AI models get per transaction, before the logic"
+            " classification is used instead."
+        ),
+    )
+    parser.add_argument(
+        "--cache-classifications",
+        action="store_true",
+        help=(
+            "Reuses the classifications of earlier transactions with the same"
+            " direction, counterparty and description (ignoring dates and"
+            " reference numbers)."
+        ),
+    )
+    parser.add_argument(
+        "--unclassified",
+        choices=["ask", "defer"],
+        required=False,
+        help=(
+            "Whether to wait for a new rule per unclassified transaction, or"
+            " to classify it as unclassified and list it in the"
+            " unclassified_transactions.csv review file. The default is ask"
+            " for a single input file from a terminal, and defer otherwise."
+        ),
+    )
+    parser.add_argument(
+        "--review",
+        action="store_true",
+        help=(
+            "After the run, asks a category per unique unclassified transaction"
+            " and adds it as a rule to the --rules-file."
+        ),
+    )
+    parser.add_argument(
+        "--columnar",
+        action="store_true",
+        help=(
+            "Parses each input file in bulk with numpy, which is faster for"
+            " large exports, instead of row by row."
+        ),
+    )
+    parser.add_argument(
+        "--duplicates",
+        choices=DUPLICATE_MODES,
+        default="off",
+        help=(
+            "What to do with the transactions that an other input file of"
+            " the account already contains: report them, drop them from the"
+            " output, or do not check (off, the default). Checking keeps an"
+            " index in: transaction_fingerprints.sqlite per account type"
+            " directory."
+        ),
+    )
+    parser.add_argument(
+        "--validate-balances",
+        action="store_true",
+        help=(
+            "After the run, checks that the balance of each row equals the"
+            " previous balance plus the amount, over all input files of the"
+            " account, and reports the breaks."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=(
+            "Measures the wall time, CPU time and peak memory per stage of"
+            " each input file, and writes them to a JSON report."
+        ),
+    )
+    parser.add_argument(
+        "--profile-dir",
+        type=str,
+        default=f"{get_cache_dir()}/profiles",
+        help="Directory of the --profile reports.",
+    )
+    parser.add_argument(
+        "--cprofile",
+        action="store_true",
+        help=(
+            "Also writes the cProfile statistics of each input file to a"
+            " .prof file next to the --profile report."
+        ),
+    )
 
     return parser
 
 
 @typechecked
-def verify_args(*, parser: ArgumentParser) -> Any:
-    args: Any = parser.parse_args()
-    print(f"args={args}")
+def verify_args(
+    *, parser: ArgumentParser, argv: Optional[List[str]] = None
+) -> Any:
+    args: Any = parser.parse_args(argv)
+    if min(args.ai_batch_size, args.ai_workers, args.ai_max_in_flight) < 1:
+        parser.error(
+            "--ai-batch-size, --ai-workers and --ai-max-in-flight must be at"
+            " least 1."
+        )
+    if args.cprofile and not args.profile:
+        parser.error("If you use --cprofile, include --profile.")
+    if args.review and not args.rules_file:
+        parser.error("If you use --review, include --rules-file.")
+    if args.all:
+        if args.account_holder or args.bank or args.account_type:
+            parser.error(
+                "--all processes all accounts, so do not include"
+                " --account-holder, --bank or --account-type."
+            )
+        if args.new or args.input_file:
+            parser.error("Do not combine --all with --new or --input-file.")
+        if args.pre_processed_output_dir is None:
+            args.pre_processed_output_dir = "2-preprocessed"
+        if args.jobs < 1:
+            parser.error("--jobs must be at least 1.")
+        return args
+    if not (args.account_holder and args.bank and args.account_type):
+        parser.error(
+            "Include --account-holder, --bank and --account-type, or use --all."
+        )
     if args.account_holder or args.bank or args.account_type:
         if (
             not args.generate_rules
@@ -0,0 +1,157 @@
+"""Validates the running balance of all statements of an account.
+
+Each Triodos row holds the balance after the transaction. So in a complete
+history, the balance of each row is the balance of the previous row plus the
+(signed) amount of the row. The rows of all input statements of an account
+type are parsed into NumPy columns, concatenated and sorted on date, after
+which the whole balance chain is checked in one vectorized pass. A break in
+the chain shows where a statement is missing (a gap), or where statements
+overlap or contain a transaction twice.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from hledger_preprocessor.amount import Amount
+from hledger_preprocessor.batch_processing import (
+    InputStatement,
+    get_input_statements,
+)
+from hledger_preprocessor.columnar_ingestion import (
+    TRANSACTION_CODE_COLUMN,
+    ColumnarStatement,
+    read_columnar_statement,
+)
+from hledger_preprocessor.helper import import_numpy
+from hledger_preprocessor.typechecking import typechecked
+
+
+@dataclass(frozen=True)
+class BalanceBreak:
+    account: str
+    the_date: str
+    input_file: str
+    # The row in the input file, counted from the top.
+    row_nr: int
+    expected_balance: Amount
+    balance: Amount
+
+    def get_difference(self) -> Amount:
+        return self.balance - self.expected_balance
+
+    def __str__(self) -> str:
+        return (
+            f"{self.account}: balance break on {self.the_date} in"
+            f" {self.input_file} row {self.row_nr}: expected"
+            f" {self.expected_balance}, found {self.balance} (difference"
+            f" {self.get_difference()})"
+        )
+
+
+@typechecked
+def get_signed_amounts(*, statement: ColumnarStatement) -> Any:
+    """Returns the amounts in cents, negative for Debet transactions."""
+    np = import_numpy(option="--validate-balances")
+    is_debit = np.array(
+        [row[TRANSACTION_CODE_COLUMN] == "Debet" for row in statement.rows],
+        dtype=bool,
+    )
+    return np.where(is_debit, -np.abs(statement.amounts), statement.amounts)
+
+
+@typechecked
+def find_balance_breaks(
+    *, account: str, statements: Dict[str, ColumnarStatement]
+) -> List[BalanceBreak]:
+    """Returns the rows whose balance is not the balance of the previous row
+    plus their amount, with all statements in chronological order."""
+    np = import_numpy(option="--validate-balances")
+    statements = {
+        input_file: statement
+        for input_file, statement in statements.items()
+        if len(statement)
+    }
+    if not statements:
+        return []
+    input_files: List[str] = list(statements)
+    dates = np.concatenate([s.dates for s in statements.values()])
+    amounts = np.concatenate(
+        [get_signed_amounts(statement=s) for s in statements.values()]
+    )
+    balances = np.concatenate([s.balances for s in statements.values()])
+    file_indices = np.concatenate(
+        [
+            np.full(len(statement), file_index)
+            for file_index, statement in enumerate(statements.values())
+        ]
+    )
+    row_indices = np.concatenate(
+        [np.arange(len(statement)) for statement in statements.values()]
+    )
+    # Each statement is in chronological order, and the statements are
+    # ordered on their first date, so the stable sort keeps the order of the
+    # transactions of the same day.
+    first_dates = np.array([s.dates[0] for s in statements.values()])
+    file_order = np.argsort(first_dates, kind="stable")
+    file_ranks = np.empty_like(file_order)
+    file_ranks[file_order] = np.arange(len(file_order))
+    order = np.lexsort((row_indices, file_ranks[file_indices], dates))
+    dates = dates[order]
+    amounts = amounts[order]
+    balances = balances[order]
+    file_indices = file_indices[order]
+    row_indices = row_indices[order]
+
+    expected_balances = balances[:-1] + amounts[1:]
+    break_indices = np.flatnonzero(balances[1:] != expected_balances) + 1
+    balance_breaks: List[BalanceBreak] = []
+    for index in break_indices.tolist():
+        statement: ColumnarStatement = statements[
+            input_files[file_indices[index]]
+        ]
+        balance_breaks.append(
+            BalanceBreak(
+                account=account,
+                the_date=str(dates[index]),
+                input_file=input_files[file_indices[index]],
+                # The statement rows are stored from the bottom row up.
+                row_nr=len(statement) - int(row_indices[index]),
+                expected_balance=Amount(
+                    cents=int(expected_balances[index - 1])
+                ),
+                balance=Amount(cents=int(balances[index])),
+            )
+        )
+    return balance_breaks
+
+
+@typechecked
+def validate_account_balances(
+    *, start_path: str, account_filter: str = ""
+) -> List[BalanceBreak]:
+    """Returns the balance breaks of all accounts, or only of the account
+    (holder:bank:account_type) of the filter."""
+    statements_per_account: Dict[str, List[InputStatement]] = {}
+    for statement in get_input_statements(start_path=start_path):
+        if account_filter and statement.get_account() != account_filter:
+            continue
+        statements_per_account.setdefault(statement.get_account(), []).append(
+            statement
+        )
+    balance_breaks: List[BalanceBreak] = []
+    for account, input_statements in sorted(statements_per_account.items()):
+        balance_breaks.extend(
+            find_balance_breaks(
+                account=account,
+                statements={
+                    statement.input_filepath: read_columnar_statement(
+                        input_csv_filepath=statement.input_filepath,
+                        account_holder=statement.account_holder,
+                        bank=statement.bank,
+                        account_type=statement.account_type,
+                    )
+                    for statement in input_statements
+                },
+            )
+        )
+    return balance_breaks
@@ -0,0 +1,191 @@
+"""Preprocesses all input statements of all accounts in a single run.
+
+hledger-flow calls the preprocessor once per input `.csv` file. The `--all`
+mode instead discovers every statement in:
+`<start_path>/import/<account_holder>/<bank>/<account_type>/1-in/<year>/`,
+preprocesses them in a process pool, and generates the `.rules` file of each
+account type.
+"""
+
+import os
+import time
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from hledger_preprocessor.__main__ import (
+    create_models,
+    generate_rules_file,
+    pre_process_csvs,
+)
+from hledger_preprocessor.create_start import get_account_info_from_dir
+from hledger_preprocessor.typechecking import typechecked
+
+RAW_INPUT_DIR: str = "1-in"
+
+# The classification models of a worker process, created once per process.
+_worker_models: Optional[Tuple[List, List]] = None
+
+
+@dataclass(frozen=True)
+class InputStatement:
+    account_holder: str
+    bank: str
+    account_type: str
+    input_filepath: str
+
+    def get_account(self) -> str:
+        return f"{self.account_holder}:{self.bank}:{self.account_type}"
+
+
+@dataclass(frozen=True)
+class StatementResult:
+    statement: InputStatement
+    nr_of_transactions: int
+    duration: float
+
+
+@typechecked
+def get_input_statements(*, start_path: str) -> List[InputStatement]:
+    """Returns the input .csv files of all accounts, sorted on path."""
+    statements: List[InputStatement] = []
+    import_path: str = f"{start_path}/import"
+    for account_info in get_account_info_from_dir(import_path):
+        raw_input_path: str = (
+            f"{import_path}/{account_info['account']}/{account_info['bank']}/"
+            + f"{account_info['account_type']}/{RAW_INPUT_DIR}"
+        )
+        if not os.path.isdir(raw_input_path):
+            continue
+        for year in sorted(os.listdir(raw_input_path)):
+            year_path: str = f"{raw_input_path}/{year}"
+            if not os.path.isdir(year_path):
+                continue
+            for filename in sorted(os.listdir(year_path)):
+                if filename.lower().endswith(".csv"):
+                    statements.append(
+                        InputStatement(
+                            account_holder=account_info["account"],
+                            bank=account_info["bank"],
+                            account_type=account_info["account_type"],
+                            input_filepath=f"{year_path}/{filename}",
+                        )
+                    )
+    return sorted(statements, key=lambda statement: statement.input_filepath)
+
+
+@typechecked
+def get_statement_args(
+    *, args: Namespace, statement: InputStatement
+) -> Namespace:
+    """Returns the CLI args that preprocess a single input statement."""
+    statement_args: Namespace = Namespace(**vars(args))
+    statement_args.account_holder = statement.account_holder
+    statement_args.bank = statement.bank
+    statement_args.account_type = statement.account_type
+    statement_args.input_file = statement.input_filepath
+    return statement_args
+
+
+def initialise_worker() -> None:
+    global _worker_models  # pylint: disable=global-statement
+    _worker_models = create_models()
+
+
+def pre_process_statement(
+    args: Namespace,
+    statement: InputStatement,
+    models: Optional[Tuple[List, List]] = None,
+) -> StatementResult:
+    if models is None:
+        assert _worker_models is not None, "Worker was not initialised."
+        models = _worker_models
+    ai_models, logic_models = models
+    start: float = time.perf_counter()
+    nr_of_transactions: int = pre_process_csvs(
+        args=get_statement_args(args=args, statement=statement),
+        ai_models=ai_models,
+        logic_models=logic_models,
+    )
+    return StatementResult(
+        statement=statement,
+        nr_of_transactions=nr_of_transactions,
+        duration=time.perf_counter() - start,
+    )
+
+
+@typechecked
+def pre_process_all_statements(
+    *, args: Namespace, ai_models: List, logic_models: List
+) -> List[StatementResult]:
+    start: float = time.perf_counter()
+    statements: List[InputStatement] = get_input_statements(
+        start_path=args.start_path
+    )
+
+    # Generate the .rules file once per account type.
+    accounts: Dict[str, InputStatement] = {}
+    for statement in statements:
+        accounts.setdefault(statement.get_account(), statement)
+    for statement in accounts.values():
+        generate_rules_file(
+            args=get_statement_args(args=args, statement=statement)
+        )
+
+    results: List[StatementResult] = []
+    if args.jobs == 1 or len(statements) < 2:
+        for statement in statements:
+            results.append(
+                pre_process_statement(
+                    args, statement, models=(ai_models, logic_models)
+                )
+            )
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(args.jobs, len(statements)),
+            initializer=initialise_worker,
+        ) as executor:
+            results = list(
+                executor.map(
+                    pre_process_statement,
+                    [args] * len(statements),
+                    statements,
+                )
+            )
+    print_throughput_summary(
+        results=results, wall_time=time.perf_counter() - start
+    )
+    return results
+
+
+@typechecked
+def print_throughput_summary(
+    *, results: List[StatementResult], wall_time: float
+) -> None:
+    """Prints the number of files, transactions and the throughput per
+    account."""
+    per_account: Dict[str, List[StatementResult]] = {}
+    for result in results:
+        per_account.setdefault(result.statement.get_account(), []).append(
+            result
+        )
+
+    print(f"{'account':<40} {'files':>6} {'transactions':>13} {'txn/s':>10}")
+    for account, account_results in sorted(per_account.items()):
+        nr_of_transactions: int = sum(
+            result.nr_of_transactions for result in account_results
+        )
+        duration: float = sum(result.duration for result in account_results)
+        throughput: float = nr_of_transactions / duration if duration else 0.0
+        print(
+            f"{account:<40} {len(account_results):>6}"
+            f" {nr_of_transactions:>13} {throughput:>10.0f}"
+        )
+    total_transactions: int = sum(
+        result.nr_of_transactions for result in results
+    )
+    print(
+        f"Preprocessed {total_transactions} transactions in"
+        f" {len(results)} files in {wall_time:.2f}s."
+    )
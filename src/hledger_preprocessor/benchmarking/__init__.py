@@ -0,0 +1 @@
+"""Generates synthetic bank statements and times the preprocessing stages."""
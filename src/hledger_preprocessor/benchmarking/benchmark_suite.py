@@ -0,0 +1,491 @@
+"""Times each stage of the preprocessor on a synthetic statement.
+
+Each stage runs on the output of the previous stage, a number of times, and
+the fastest and median durations are recorded:
+
+- detect_encoding: detects the encoding of the statement (uncached).
+- decode: decodes the statement backwards into lines.
+- parse: parses the lines into transactions.
+- partition: groups the transactions per year.
+- classify: classifies the transactions with a rule file of N rules.
+- write: writes the pre-processed .csv file per year.
+- generate_rules: creates the content of the hledger-flow .rules file.
+
+The results are stored as a JSON file per git commit, so that a run can be
+compared to an earlier commit to catch performance regressions.
+"""
+
+import argparse
+import contextlib
+import csv
+import hashlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess  # nosec
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from hledger_preprocessor import file_reading_and_writing
+from hledger_preprocessor.benchmarking.synthetic_statements import (
+    SyntheticStatementSettings,
+    generate_rows,
+    write_synthetic_statement,
+)
+from hledger_preprocessor.cache_dir import get_cache_dir
+from hledger_preprocessor.classification.rule_file import REQUIRED_COLUMNS
+from hledger_preprocessor.typechecking import typechecked
+
+STAGES: List[str] = [
+    "detect_encoding",
+    "decode",
+    "parse",
+    "partition",
+    "classify",
+    "write",
+    "generate_rules",
+]
+
+
+@dataclass
+class StageTiming:
+    stage: str
+    nr_of_items: int
+    best: float
+    median: float
+
+    def get_throughput(self) -> float:
+        """Returns the number of items per second of the best run."""
+        return self.nr_of_items / self.best if self.best else 0.0
+
+
+@typechecked
+def time_stage(
+    *, stage: str, run: Callable[[], Any], nr_of_items: int, repeat: int
+) -> StageTiming:
+    durations: List[float] = []
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        run()
+        durations.append(time.perf_counter() - start)
+    return StageTiming(
+        stage=stage,
+        nr_of_items=nr_of_items,
+        best=min(durations),
+        median=statistics.median(durations),
+    )
+
+
+@typechecked
+def write_rule_file(
+    *, filepath: str, settings: SyntheticStatementSettings, nr_of_rules: int
+) -> None:
+    """Writes a rule file with exact, prefix and substring rules on the
+    counterparties and descriptions of the synthetic statement."""
+    names: List[str] = sorted(
+        {row[4] for row in generate_rows(settings=settings)}
+    )
+    match_types: List[str] = ["exact", "prefix", "substring"]
+    with open(filepath, mode="w", encoding="utf-8", newline="") as rule_file:
+        writer = csv.writer(rule_file)
+        writer.writerow(REQUIRED_COLUMNS)
+        for index in range(nr_of_rules):
+            if index < len(names):
+                writer.writerow(
+                    [
+                        "other_party",
+                        match_types[index % len(match_types)],
+                        names[index],
+                        "any",
+                        f"category:{index}",
+                        0,
+                    ]
+                )
+            else:
+                # Rules that never match, but still have to be checked.
+                writer.writerow(
+                    [
+                        "description",
+                        "substring",
+                        f"no match {index}",
+                        "any",
+                        f"category:{index}",
+                        0,
+                    ]
+                )
+
+
+@typechecked
+def run_benchmarks(
+    *,
+    settings: SyntheticStatementSettings,
+    nr_of_rules: int = 100,
+    repeat: int = 5,
+) -> List[StageTiming]:
+    """Runs each stage on a synthetic statement, and returns their
+    timings."""
+    # pylint: disable=import-outside-toplevel
+    from hledger_preprocessor.__main__ import sort_transactions_on_years
+    from hledger_preprocessor.classification.classifier import (
+        classify_transactions,
+    )
+    from hledger_preprocessor.classification.logic_based.logic_eg0 import (
+        ExampleLogicModel,
+    )
+    from hledger_preprocessor.generate_rules_content import RulesContentCreator
+    from hledger_preprocessor.statement_parsing import iter_input_transactions
+    from hledger_preprocessor.triodos_logic import TriodosParserSettings
+
+    timings: List[StageTiming] = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        statement_path: str = f"{tmp_dir}/statement.csv"
+        nr_of_rows: int = write_synthetic_statement(
+            filepath=statement_path, settings=settings
+        )
+        with open(statement_path, "rb") as statement_file:
+            sample: bytes = statement_file.read(
+                file_reading_and_writing.ENCODING_SAMPLE_SIZE
+            )
+
+        def detect_encoding() -> str:
+            # Measure the detection itself, not its memo.
+            file_reading_and_writing.clear_encoding_cache()
+            return file_reading_and_writing.detect_sample_encoding(
+                sample=sample
+            )
+
+        def decode() -> List[str]:
+            with file_reading_and_writing.open_input_csv_reversed(
+                input_csv_filepath=statement_path
+            ) as reversed_lines:
+                return list(reversed_lines)
+
+        def parse() -> List:
+            return list(
+                iter_input_transactions(
+                    input_csv_filepath=statement_path,
+                    account_holder="benchmark",
+                    bank="triodos",
+                    account_type="checking",
+                )
+            )
+
+        transactions: List = parse()
+        logic_model = ExampleLogicModel()
+        rule_file_path: str = f"{tmp_dir}/rules.csv"
+        write_rule_file(
+            filepath=rule_file_path, settings=settings, nr_of_rules=nr_of_rules
+        )
+        logic_model.use_rules_file(filepath=rule_file_path)
+
+        def classify() -> List:
+            return classify_transactions(
+                transactions=transactions,
+                ai_models=[],
+                logic_models=[logic_model],
+            )
+
+        classify()
+
+        def write() -> None:
+            with file_reading_and_writing.YearRoutedCsvWriter(
+                get_output_filepath=lambda year: f"{tmp_dir}/{year}.csv"
+            ) as year_routed_writer:
+                for transaction in transactions:
+                    year_routed_writer.write(transaction=transaction)
+
+        rules_content_creator = RulesContentCreator(
+            parserSettings=TriodosParserSettings(),
+            currency="EUR",
+            account_holder="benchmark",
+            bank_name="triodos",
+            account_type="checking",
+            status="*",
+        )
+        stages: Dict[str, Callable[[], Any]] = {
+            "detect_encoding": detect_encoding,
+            "decode": decode,
+            "parse": parse,
+            "partition": lambda: sort_transactions_on_years(
+                transactions=transactions
+            ),
+            "classify": classify,
+            "write": write,
+            "generate_rules": rules_content_creator.create_rulecontent,
+        }
+        # The encoding detection processes bytes, the other stages rows.
+        nr_of_items: Dict[str, int] = {
+            "detect_encoding": len(sample),
+            "generate_rules": 1,
+        }
+        # The stages print progress information, which is not benchmarked.
+        with contextlib.redirect_stdout(io.StringIO()):
+            for stage in STAGES:
+                timings.append(
+                    time_stage(
+                        stage=stage,
+                        run=stages[stage],
+                        nr_of_items=nr_of_items.get(stage, nr_of_rows),
+                        repeat=repeat,
+                    )
+                )
+    return timings
+
+
+@typechecked
+def get_git_commit(*, repository_path: str = ".") -> str:
+    """Returns the hash of the checked out commit, with a + suffix if the
+    working tree has changes, or unknown outside a git repository."""
+    try:
+        commit: str = subprocess.run(  # nosec
+            ["git", "rev-parse", "HEAD"],
+            cwd=repository_path,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+        status: str = subprocess.run(  # nosec
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=repository_path,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}+" if status else commit
+
+
+@typechecked
+def create_result(
+    *,
+    commit: str,
+    settings: SyntheticStatementSettings,
+    nr_of_rules: int,
+    timings: List[StageTiming],
+) -> Dict[str, Any]:
+    return {
+        "commit": commit,
+        "created_at": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": asdict(settings),
+        "nr_of_rules": nr_of_rules,
+        "stages": {timing.stage: asdict(timing) for timing in timings},
+    }
+
+
+@typechecked
+def get_settings_key(
+    *, settings: SyntheticStatementSettings, nr_of_rules: int
+) -> str:
+    """Returns a short hash of the benchmark settings, so that only results
+    of the same benchmark are compared."""
+    key: str = json.dumps([asdict(settings), nr_of_rules], sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+
+
+@typechecked
+def get_result_path(*, results_dir: str, commit: str, settings_key: str) -> str:
+    return f"{results_dir}/{commit}-{settings_key}.json"
+
+
+@typechecked
+def store_result(
+    *, results_dir: str, settings_key: str, result: Dict[str, Any]
+) -> str:
+    os.makedirs(results_dir, exist_ok=True)
+    result_path: str = get_result_path(
+        results_dir=results_dir,
+        commit=result["commit"],
+        settings_key=settings_key,
+    )
+    with open(result_path, mode="w", encoding="utf-8") as result_file:
+        json.dump(result, result_file, indent=2, sort_keys=True)
+    return result_path
+
+
+@typechecked
+def load_result(
+    *, results_dir: str, commit: str, settings_key: str
+) -> Optional[Dict[str, Any]]:
+    """Returns the result of the commit with the same settings, or None if
+    that benchmark did not run on the commit."""
+    result_path: str = get_result_path(
+        results_dir=results_dir, commit=commit, settings_key=settings_key
+    )
+    if not os.path.isfile(result_path):
+        return None
+    with open(result_path, encoding="utf-8") as result_file:
+        return json.load(result_file)
+
+
+@typechecked
+def find_regressions(
+    *,
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = 0.2,
+) -> List[str]:
+    """Returns the stages whose best duration increased by more than the
+    threshold (a fraction) compared to the baseline."""
+    regressions: List[str] = []
+    for stage, timing in current["stages"].items():
+        baseline_timing: Optional[Dict[str, Any]] = baseline["stages"].get(
+            stage
+        )
+        if baseline_timing is None or not baseline_timing["best"]:
+            continue
+        if timing["best"] > baseline_timing["best"] * (1 + threshold):
+            regressions.append(stage)
+    return regressions
+
+
+@typechecked
+def format_comparison(
+    *, baseline: Dict[str, Any], current: Dict[str, Any]
+) -> str:
+    lines: List[str] = [
+        f"{'stage':<16} {baseline['commit'][:10]:>12}"
+        f" {current['commit'][:10]:>12} {'change':>8}"
+    ]
+    for stage, timing in current["stages"].items():
+        baseline_best: Optional[float] = (
+            baseline["stages"].get(stage, {}).get("best")
+        )
+        change: str = (
+            f"{timing['best'] / baseline_best - 1:>+8.0%}"
+            if baseline_best
+            else f"{'n/a':>8}"
+        )
+        lines.append(
+            f"{stage:<16} {baseline_best or 0:>12.5f} {timing['best']:>12.5f}"
+            f" {change}"
+        )
+    return "\n".join(lines)
+
+
+@typechecked
+def format_timings(*, timings: List[StageTiming]) -> str:
+    lines: List[str] = [
+        f"{'stage':<16} {'best s':>10} {'median s':>10} {'items/s':>12}"
+    ]
+    for timing in timings:
+        lines.append(
+            f"{timing.stage:<16} {timing.best:>10.5f} {timing.median:>10.5f}"
+            f" {timing.get_throughput():>12.0f}"
+        )
+    return "\n".join(lines)
+
+
+@typechecked
+def create_benchmark_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Times the preprocessing stages on a synthetic Triodos statement,"
+            " and compares the result to an earlier commit."
+        )
+    )
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--first-year", type=int, default=2020)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--counterparties", type=int, default=200)
+    parser.add_argument(
+        "--encoding",
+        type=str,
+        default="utf-8",
+        help="Encoding of the statement, e.g. utf-8, latin-1 or cp1252.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--rules",
+        type=int,
+        default=100,
+        help="Number of rules in the rule file of the classify stage.",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--results-dir",
+        type=str,
+        default=f"{get_cache_dir()}/benchmarks",
+        help="Directory with the JSON result per commit.",
+    )
+    parser.add_argument(
+        "--compare-to",
+        type=str,
+        help="Commit of an earlier result to compare this run to.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help=(
+            "Fraction by which a stage may be slower than in --compare-to,"
+            " before it counts as a regression."
+        ),
+    )
+    return parser
+
+
+@typechecked
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = create_benchmark_arg_parser()
+    args: Any = parser.parse_args(argv)
+    if min(args.rows, args.years, args.counterparties, args.repeat) < 1:
+        parser.error(
+            "--rows, --years, --counterparties and --repeat must be at least 1."
+        )
+    settings = SyntheticStatementSettings(
+        nr_of_rows=args.rows,
+        first_year=args.first_year,
+        nr_of_years=args.years,
+        nr_of_counterparties=args.counterparties,
+        encoding=args.encoding,
+        seed=args.seed,
+    )
+    settings_key: str = get_settings_key(
+        settings=settings, nr_of_rules=args.rules
+    )
+    baseline: Optional[Dict[str, Any]] = None
+    if args.compare_to is not None:
+        baseline = load_result(
+            results_dir=args.results_dir,
+            commit=args.compare_to,
+            settings_key=settings_key,
+        )
+        if baseline is None:
+            parser.error(
+                f"There is no result of commit: {args.compare_to} with the"
+                f" same settings in: {args.results_dir}"
+            )
+    timings: List[StageTiming] = run_benchmarks(
+        settings=settings, nr_of_rules=args.rules, repeat=args.repeat
+    )
+    print(format_timings(timings=timings))
+    result: Dict[str, Any] = create_result(
+        commit=get_git_commit(),
+        settings=settings,
+        nr_of_rules=args.rules,
+        timings=timings,
+    )
+    result_path: str = store_result(
+        results_dir=args.results_dir, settings_key=settings_key, result=result
+    )
+    print(f"Stored the result in: {result_path}")
+    if baseline is not None:
+        print(format_comparison(baseline=baseline, current=result))
+        regressions: List[str] = find_regressions(
+            baseline=baseline, current=result, threshold=args.threshold
+        )
+        if regressions:
+            print(f"Regressions in: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compares the fast date and amount parsers to the `strptime` and `float`
+path they replaced, on the columns of a synthetic statement.
+
+Run it with:
+`python -m hledger_preprocessor.benchmarking.parsing_benchmark --rows 100000`
+"""
+
+import argparse
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from hledger_preprocessor import helper
+from hledger_preprocessor.benchmarking.synthetic_statements import (
+    SyntheticStatementSettings,
+    generate_rows,
+)
+from hledger_preprocessor.typechecking import typechecked
+
+
+def parse_date_with_strptime(date_string: str) -> datetime:
+    return datetime.strptime(date_string, "%d-%m-%Y")
+
+
+def parse_amount_with_float(amount_string: str) -> float:
+    return float(amount_string.replace(".", "").replace(",", "."))
+
+
+def parse_amount_with_cents(amount_string: str) -> float:
+    return helper.parse_european_amount_cents(amount_string) / 100
+
+
+def parse_date_with_memo(date_string: str) -> datetime:
+    return helper.parse_dd_mm_yyyy_date(date_string)
+
+
+@typechecked
+def time_parser(
+    *, parse: Callable[[str], Any], values: List[str], repeat: int
+) -> float:
+    """Returns the fastest duration of parsing all values, in seconds."""
+    durations: List[float] = []
+    for _ in range(repeat):
+        # Each run starts with an empty date memo, like a new process.
+        helper._parsed_dates.clear()
+        start: float = time.perf_counter()
+        for value in values:
+            parse(value)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+@typechecked
+def run_parsing_benchmark(
+    *, settings: SyntheticStatementSettings, repeat: int = 5
+) -> Dict[str, Dict[str, float]]:
+    """Returns the nanoseconds per value of the current and fast parser of
+    the dates and amounts, after checking that they parse identically."""
+    rows: List[List[str]] = generate_rows(settings=settings)
+    columns: Dict[str, List[str]] = {
+        "date": [row[0] for row in rows],
+        "amount": [row[2] for row in rows] + [row[8] for row in rows],
+    }
+    parsers: Dict[str, List[Callable[[str], Any]]] = {
+        "date": [parse_date_with_strptime, parse_date_with_memo],
+        "amount": [parse_amount_with_float, parse_amount_with_cents],
+    }
+    results: Dict[str, Dict[str, float]] = {}
+    for column, (current_parse, fast_parse) in parsers.items():
+        values: List[str] = columns[column]
+        for value in values:
+            if current_parse(value) != fast_parse(value):
+                raise ValueError(f"The parsers disagree on: {value!r}")
+        current: float = time_parser(
+            parse=current_parse, values=values, repeat=repeat
+        )
+        fast: float = time_parser(
+            parse=fast_parse, values=values, repeat=repeat
+        )
+        results[column] = {
+            "current_ns": current / len(values) * 1e9,
+            "fast_ns": fast / len(values) * 1e9,
+            "speedup": current / fast if fast else 0.0,
+        }
+    return results
+
+
+@typechecked
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Compares the fast date and amount parsers to strptime."
+    )
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args: Any = parser.parse_args(argv)
+    results: Dict[str, Dict[str, float]] = run_parsing_benchmark(
+        settings=SyntheticStatementSettings(
+            nr_of_rows=args.rows, nr_of_years=args.years
+        ),
+        repeat=args.repeat,
+    )
+    print(f"{'column':<8} {'current ns':>11} {'fast ns':>9} {'speedup':>8}")
+    for column, result in results.items():
+        print(
+            f"{column:<8} {result['current_ns']:>11.0f}"
+            f" {result['fast_ns']:>9.0f} {result['speedup']:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Generates realistic synthetic Triodos statements.
+
+The statements have the same shape as real Triodos exports: no header, the
+newest transaction first, European amounts (1.234,56), Debet/Credit codes, a
+running balance, and descriptions with dates and reference numbers. The
+counterparties are drawn from a fixed size pool with a skewed distribution,
+like the few shops and employers that make up most of a real statement. The
+generator is seeded, so a benchmark always reads the same statement.
+"""
+
+import csv
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import List, Tuple
+
+from hledger_preprocessor.typechecking import typechecked
+
+ACCOUNT_OWNER: str = "NL12TRIO0123456789"
+# Counterparty names contain non-ascii characters, so that the encoding
+# detection has something to detect.
+COUNTERPARTY_NAMES: List[str] = [
+    "Albert Heijn",
+    "Eko Plaza",
+    "IKEA BV",
+    "Bäckerei Müller",
+    "Café de Prés",
+    "Gemeente Utrecht",
+    "Energie Coöperatie",
+    "Zorgverzekeraar",
+    "Boulangerie Crème",
+    "Salaris Werkgever",
+]
+DESCRIPTIONS: List[str] = [
+    "Betaalautomaat {date} 12:{minute:02d} pas {reference}",
+    "Incasso {reference} periode {date}",
+    "iDEAL betaling kenmerk {reference}",
+    "Overschrijving {reference}",
+]
+
+
+@dataclass(frozen=True)
+class SyntheticStatementSettings:
+    nr_of_rows: int = 1000
+    first_year: int = 2020
+    nr_of_years: int = 1
+    nr_of_counterparties: int = 50
+    encoding: str = "utf-8"
+    seed: int = 0
+
+
+@typechecked
+def format_european_amount(*, cents: int) -> str:
+    """Formats an amount like Triodos does, e.g. 1.234,56."""
+    sign: str = "-" if cents < 0 else ""
+    euros, remainder = divmod(abs(cents), 100)
+    return f"{sign}{euros:,}".replace(",", ".") + f",{remainder:02d}"
+
+
+@typechecked
+def create_counterparties(
+    *, nr_of_counterparties: int, rng: random.Random
+) -> List[Tuple[str, str, str]]:
+    """Returns the name, account and BIC of the counterparties."""
+    counterparties: List[Tuple[str, str, str]] = []
+    for index in range(nr_of_counterparties):
+        name: str = COUNTERPARTY_NAMES[index % len(COUNTERPARTY_NAMES)]
+        if index >= len(COUNTERPARTY_NAMES):
+            name = f"{name} {index // len(COUNTERPARTY_NAMES)}"
+        account: str = (
+            f"NL{rng.randint(10, 99)}BANK{rng.randint(0, 10**10):010d}"
+        )
+        counterparties.append((name, account, "BANKNL2A"))
+    return counterparties
+
+
+@typechecked
+def generate_rows(*, settings: SyntheticStatementSettings) -> List[List[str]]:
+    """Returns the rows of the statement, newest transaction first."""
+    rng: random.Random = random.Random(settings.seed)
+    counterparties: List[Tuple[str, str, str]] = create_counterparties(
+        nr_of_counterparties=settings.nr_of_counterparties, rng=rng
+    )
+    first_day: date = date(settings.first_year, 1, 1)
+    nr_of_days: int = (
+        date(settings.first_year + settings.nr_of_years, 1, 1) - first_day
+    ).days
+    days: List[int] = sorted(
+        rng.randrange(nr_of_days) for _ in range(settings.nr_of_rows)
+    )
+    balance: int = 100000
+    rows: List[List[str]] = []
+    for day in days:
+        # A Zipf-like distribution: a few counterparties dominate.
+        counterparty_index: int = min(
+            int(rng.paretovariate(1.2)) - 1, len(counterparties) - 1
+        )
+        name, account, bic = counterparties[counterparty_index]
+        is_credit: bool = rng.random() < 0.2
+        cents: int = rng.randint(100, 250000 if is_credit else 20000)
+        balance += cents if is_credit else -cents
+        the_date: date = first_day + timedelta(days=day)
+        description: str = rng.choice(DESCRIPTIONS).format(
+            date=the_date.strftime("%d-%m-%Y"),
+            minute=rng.randrange(60),
+            reference=rng.randint(10**7, 10**9),
+        )
+        rows.append(
+            [
+                the_date.strftime("%d-%m-%Y"),
+                ACCOUNT_OWNER,
+                format_european_amount(cents=cents),
+                "Credit" if is_credit else "Debet",
+                name,
+                account,
+                bic,
+                description,
+                format_european_amount(cents=balance),
+            ]
+        )
+    rows.reverse()
+    return rows
+
+
+@typechecked
+def write_synthetic_statement(
+    *, filepath: str, settings: SyntheticStatementSettings
+) -> int:
+    """Writes the statement in the encoding of the settings, and returns its
+    number of rows."""
+    rows: List[List[str]] = generate_rows(settings=settings)
+    with open(
+        filepath, mode="w", encoding=settings.encoding, newline=""
+    ) as csvfile:
+        csv.writer(csvfile).writerows(rows)
+    return len(rows)
@@ -0,0 +1,19 @@
+"""Locates the directory in which the preprocessor caches compiled rules and
+classifications between runs."""
+
+import os
+
+from hledger_preprocessor.typechecking import typechecked
+
+CACHE_DIR_ENV_VAR: str = "HLEDGER_PREPROCESSOR_CACHE_DIR"
+
+
+@typechecked
+def get_cache_dir() -> str:
+    """Returns the cache directory, which is private to the current user."""
+    if os.environ.get(CACHE_DIR_ENV_VAR):
+        return os.environ[CACHE_DIR_ENV_VAR]
+    cache_home: str = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(
+        "~/.cache"
+    )
+    return os.path.join(cache_home, "hledger_preprocessor")
@@ -1,17 +1,43 @@
-import os
-
-from gpt4all import GPT4All
-from transformers import pipeline
+from typing import Any, Dict, List, Optional
+
+from hledger_preprocessor.classification.ai_based.answer_store import (
+    AnswerStore,
+    get_answer_key,
+    get_answer_store,
+    get_prompt_fields,
+)
+from hledger_preprocessor.classification.ai_based.model_loading import (
+    get_local_model_filepath,
+    get_pipeline_name,
+    import_heavy_module,
+    load_gpt4all_model,
+    load_transformers_pipeline,
+)
+from hledger_preprocessor.classification.ai_based.model_pool import (
+    get_model_pool,
+)
 
 
 # Example usage
 class ExampleAIModel:
     name = "ExampleAIModel"
+    # Increase when the prompts change, so that stored answers are not reused.
+    prompt_template_version: str = "2"
+    labels: List[str] = [
+        "groceries",
+        "electricity_bill",
+        "rent",
+        "entertainment",
+        "others",
+    ]
+
+    def __init__(self, *, local_model_filepath: Optional[str] = None) -> None:
+        self.local_model_filepath: Optional[str] = local_model_filepath
 
     def default(self, data):
         return "ai_filler"
 
-    def get_debet_question(self, data: str) -> str:
+    def get_debet_question(self, data: Dict[str, Any]) -> str:
         llm_classification_question: str = (
             f"""What kind of an expense is this transaction? Some example
  categories are:
@@ -27,7 +53,7 @@ Give a category and/or subcategory('s) in format:
         )
         return llm_classification_question
 
-    def get_credit_question(self, data: str) -> str:
+    def get_credit_question(self, data: Dict[str, Any]) -> str:
         llm_classification_question: str = (
             f"""What kind of an income is this transaction? Some example
 categories are:
@@ -42,40 +68,73 @@ format for the following transaction:\n{data}"""
         )
         return llm_classification_question
 
+    def get_question(self, data: Dict[str, Any]) -> str:
+        # TODO: Generalise to support for all Transaction types.
+        if data["transaction_code"] == "Debet":
+            return self.get_debet_question(data=data)
+        if data["transaction_code"] == "Credit":
+            return self.get_credit_question(data=data)
+        raise ValueError(f"Unknown transaction_code for:{data}")
+
     def predict(self, data):
+        return self.predict_batch([data])[0]
 
-        # Try loading a model from the internets.
-        print("Start loading gpt4all model.")
-        # model = GPT4All("gpt4all-lora-quantized")
-        # model = GPT4All("orca-mini-3b-gguf2-q4_0.gguf")
-        # model = GPT4All("llama-2-7b-chat.ggmlv.q4_K_M.bin") # DOn't have file
-
-        # Load local model.
-        main_user_path = os.path.expanduser("~")
-        model_filename: str = "Meta-Llama-3.1-8B-Instruct-Q5_K_S.gguf"
-        local_model_filepath: str = f"{main_user_path}/.models/{model_filename}"
-        assert os.path.exists(
-            local_model_filepath
-        ), f"File does not exist: {local_model_filepath}"
-        model = GPT4All(
-            local_model_filepath,
-        )
+    def predict_batch(self, datas: List[Dict]) -> List[str]:
+        """Asks the local LLM to classify a batch of transactions.
 
-        print("Done loading gpt4all model.")
-        # TODO: Generalise to support for all Transaction types.
-        if data["transaction_code"] == "Debet":
-            prompt = self.get_debet_question(data=data)
-        elif data["transaction_code"] == "Credit":
-            prompt = self.get_credit_question(data=data)
-        else:
-            raise ValueError(f"Unknown transaction_code for:{data}")
-
-        print(f"\nAsking Question:\n{prompt}\n")
-        result = model.generate(prompt)
-        print("Answer:\n")
-        print(result)
-        print("\n")
-        return result.strip()
+        Transactions that the model already answered are looked up in the
+        answer store. The model is loaded once per process, through the model
+        pool, which also records the throughput and latency of the batches.
+        """
+        local_model_filepath: str = (
+            self.local_model_filepath or get_local_model_filepath()
+        )
+        answer_store: AnswerStore = get_answer_store()
+        model_hash: str = answer_store.get_model_hash(
+            filepath=local_model_filepath
+        )
+        keys: List[str] = [
+            get_answer_key(
+                model_hash=model_hash,
+                prompt_template_version=self.prompt_template_version,
+                data=data,
+            )
+            for data in datas
+        ]
+        answers: Dict[str, str] = answer_store.get_answers(keys=keys)
+
+        # Only ask the model about the transactions it did not answer yet.
+        unanswered: Dict[str, Dict] = {}
+        for key, data in zip(keys, datas):
+            if key not in answers:
+                unanswered.setdefault(key, data)
+        if unanswered:
+            # Load local model (only once per process).
+            model = load_gpt4all_model(local_model_filepath)
+            prompts: List[str] = [
+                self.get_question(data=get_prompt_fields(data=data))
+                for data in unanswered.values()
+            ]
+            # GPT4All has no batched generate, so the prompts of the batch
+            # share the loaded model and are generated one after another.
+            results: List[str] = get_model_pool().run_batch(
+                name=local_model_filepath,
+                inputs=prompts,
+                infer=lambda batch: [
+                    model.generate(prompt) for prompt in batch
+                ],
+            )
+            new_answers: Dict[str, str] = {
+                key: result.strip()
+                for key, result in zip(unanswered.keys(), results)
+            }
+            answer_store.put_answers(
+                model_hash=model_hash,
+                prompt_template_version=self.prompt_template_version,
+                answers=new_answers,
+            )
+            answers.update(new_answers)
+        return [answers[key] for key in keys]
 
     def try0(self, data):
 
@@ -90,8 +149,8 @@ format for the following transaction:\n{data}"""
 
     def try1(self, data):
         # Load a text classification pipeline with a pre-trained model
-        classifier = pipeline(
-            "text-classification", model="distilbert-base-uncased"
+        classifier = load_transformers_pipeline(
+            "text-classification", "distilbert-base-uncased"
         )
         labels = [
             "groceries",
@@ -122,29 +181,31 @@ format for the following transaction:\n{data}"""
         return predicted_class
 
     def try2(self, data):
-        # Load a text classification pipeline with a pre-trained model
-        classifier = pipeline(
-            "text-classification", model="distilbert-base-uncased"
-        )
-        labels = [
-            "groceries",
-            "electricity_bill",
-            "rent",
-            "entertainment",
-            "others",
-        ]
-
-        # Perform classification.
-        text = (
+        return self.predict_labels_batch([data])[0]
+
+    def predict_labels_batch(self, datas: List[Dict]) -> List[str]:
+        """Classifies a batch of transactions into the labels, in batched
+        forward passes of a zero-shot classification pipeline."""
+        task: str = "zero-shot-classification"
+        model_name: str = "distilbert-base-uncased"
+        classifier = load_transformers_pipeline(task, model_name)
+        texts: List[str] = [
             f"{data['description']} | Amount: {data['amount']} | Account:"
-            f" {data['account']}"
+            f" {data['other_account']}"
+            for data in datas
+        ]
+        results = get_model_pool().run_batch(
+            name=get_pipeline_name(task=task, model=model_name),
+            inputs=texts,
+            infer=lambda batch: classifier(
+                batch, candidate_labels=self.labels, batch_size=len(batch)
+            ),
         )
-        result = self.classifier(text, candidate_labels=self.labels)
-        print(f"result: {result}")
-        return result["labels"][0]  # Top label (most likely category)
+        # Top label (most likely category).
+        return [result["labels"][0] for result in results]
 
     def try3(self, data):
-        import fasttext
+        fasttext = import_heavy_module("fasttext")
 
         fasttext.load_model("lid.176.ftz")  # Language ID model as placeholder
         text = (
@@ -0,0 +1,324 @@
+"""Stores the answers of the local LLM in a sqlite file.
+
+Asking the LLM to classify a transaction is by far the slowest step of the
+preprocessor, and the answer only depends on the model, the prompt template
+and the transaction. So the answers are stored, keyed on the hash of the model
+file, the version of the prompt template and the normalised fields of the
+transaction, and the LLM is only asked about transactions it has not seen.
+The prompt only contains those normalised fields, so transactions that share
+an answer also share their prompt.
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from hledger_preprocessor.cache_dir import get_cache_dir
+from hledger_preprocessor.classification.classifier import normalise_text
+from hledger_preprocessor.file_reading_and_writing import hash_file
+from hledger_preprocessor.typechecking import typechecked
+
+ANSWER_STORE_FILENAME: str = "llm_answers.sqlite"
+SECONDS_PER_DAY: int = 24 * 60 * 60
+
+# The answer stores per process id and path.
+_answer_stores: Dict[Tuple[int, str], "AnswerStore"] = {}
+
+
+@typechecked
+def get_prompt_fields(*, data: Dict) -> Dict[str, str]:
+    """Returns the normalised fields of the transaction that the prompt
+    contains, and that the answer is keyed on."""
+    return {
+        "transaction_code": str(data.get("transaction_code", "")),
+        "other_account": str(data.get("other_account", "")).strip(),
+        "other_party": normalise_text(text=str(data.get("other_party", ""))),
+        "description": normalise_text(text=str(data.get("description", ""))),
+    }
+
+
+@typechecked
+def get_answer_key(
+    *, model_hash: str, prompt_template_version: str, data: Dict
+) -> str:
+    """Returns the hash of the model, prompt template and the prompt fields
+    of the transaction."""
+    normalised_fields: List[str] = [
+        model_hash,
+        prompt_template_version,
+        *get_prompt_fields(data=data).values(),
+    ]
+    return hashlib.sha256(
+        "\x1f".join(normalised_fields).encode("utf-8")
+    ).hexdigest()
+
+
+def locked(method: Callable) -> Callable:
+    """Serialises the calls to a method of the answer store."""
+
+    @functools.wraps(method)
+    def locked_method(self: "AnswerStore", *args: Any, **kwargs: Any) -> Any:
+        with self.lock:
+            return method(self, *args, **kwargs)
+
+    return locked_method
+
+
+class AnswerStore:
+    """Content addressed store of LLM answers."""
+
+    def __init__(self, *, database_path: str) -> None:
+        self.database_path: str = database_path
+        self.lookups: int = 0
+        self.hits: int = 0
+        os.makedirs(os.path.dirname(database_path) or ".", exist_ok=True)
+        # The AI scheduler uses the store from its worker threads.
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            database_path, timeout=30, check_same_thread=False
+        )
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY,"
+                " model_hash TEXT, prompt_template_version TEXT, answer TEXT,"
+                " created_at REAL, last_used_at REAL, nr_of_hits INTEGER)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS model_hashes (path TEXT PRIMARY"
+                " KEY, size INTEGER, mtime_ns INTEGER, model_hash TEXT)"
+            )
+
+    @locked
+    def get_model_hash(self, *, filepath: str) -> str:
+        """Returns the hash of a model file, which is only computed again if
+        the size or modification time of the file changed."""
+        stat = os.stat(filepath)
+        path: str = os.path.abspath(filepath)
+        row = self.connection.execute(
+            "SELECT model_hash FROM model_hashes WHERE path = ? AND size = ?"
+            " AND mtime_ns = ?",
+            (path, stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        model_hash: str = hash_file(filepath=filepath)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO model_hashes VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, model_hash),
+            )
+        return model_hash
+
+    @locked
+    def get_answers(self, *, keys: List[str]) -> Dict[str, str]:
+        """Returns the stored answers of the keys that are in the store."""
+        answers: Dict[str, str] = {}
+        for key in keys:
+            row = self.connection.execute(
+                "SELECT answer FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                answers[key] = row[0]
+        self.lookups += len(keys)
+        self.hits += sum(1 for key in keys if key in answers)
+        if answers:
+            with self.connection:
+                self.connection.executemany(
+                    "UPDATE answers SET last_used_at = ?, nr_of_hits ="
+                    " nr_of_hits + 1 WHERE key = ?",
+                    [(time.time(), key) for key in answers],
+                )
+        return answers
+
+    @locked
+    def put_answers(
+        self,
+        *,
+        model_hash: str,
+        prompt_template_version: str,
+        answers: Dict[str, str],
+    ) -> None:
+        now: float = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, 0)",
+                [
+                    (key, model_hash, prompt_template_version, answer, now, now)
+                    for key, answer in answers.items()
+                ],
+            )
+
+    def get_hit_rate(self) -> float:
+        if not self.lookups:
+            return 0.0
+        return self.hits / self.lookups
+
+    @locked
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns the number of stored answers per model and prompt
+        template, and the hit rate of this process."""
+        rows = self.connection.execute(
+            "SELECT model_hash, prompt_template_version, COUNT(*),"
+            " SUM(nr_of_hits) FROM answers GROUP BY model_hash,"
+            " prompt_template_version ORDER BY model_hash,"
+            " prompt_template_version"
+        ).fetchall()
+        return {
+            "database_path": self.database_path,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.get_hit_rate(),
+            "answers": [
+                {
+                    "model_hash": model_hash,
+                    "prompt_template_version": prompt_template_version,
+                    "nr_of_answers": nr_of_answers,
+                    "nr_of_hits": nr_of_hits or 0,
+                }
+                for (
+                    model_hash,
+                    prompt_template_version,
+                    nr_of_answers,
+                    nr_of_hits,
+                ) in rows
+            ],
+        }
+
+    @locked
+    def prune(
+        self,
+        *,
+        older_than_days: Optional[float] = None,
+        model_hash: Optional[str] = None,
+        keep_prompt_template_version: Optional[str] = None,
+    ) -> int:
+        """Removes the answers that were not used for some days, of a model,
+        or of other prompt template versions, and returns how many."""
+        conditions: List[str] = []
+        parameters: List[Any] = []
+        if older_than_days is not None:
+            conditions.append("last_used_at < ?")
+            parameters.append(time.time() - older_than_days * SECONDS_PER_DAY)
+        if model_hash is not None:
+            conditions.append("model_hash = ?")
+            parameters.append(model_hash)
+        if keep_prompt_template_version is not None:
+            conditions.append("prompt_template_version != ?")
+            parameters.append(keep_prompt_template_version)
+        if not conditions:
+            raise ValueError("Specify which answers to prune.")
+        with self.connection:
+            where: str = " AND ".join(conditions)
+            cursor = self.connection.execute(
+                f"DELETE FROM answers WHERE {where}", parameters  # nosec
+            )
+        return cursor.rowcount
+
+    def iter_answers(self) -> Iterator[Dict[str, Any]]:
+        cursor = self.connection.execute(
+            "SELECT key, model_hash, prompt_template_version, answer,"
+            " created_at, last_used_at, nr_of_hits FROM answers ORDER BY"
+            " created_at, key"
+        )
+        columns: List[str] = [column[0] for column in cursor.description]
+        for row in cursor:
+            yield dict(zip(columns, row))
+
+
+@typechecked
+def get_default_answer_store_path() -> str:
+    return f"{get_cache_dir()}/{ANSWER_STORE_FILENAME}"
+
+
+@typechecked
+def get_answer_store(*, database_path: Optional[str] = None) -> AnswerStore:
+    """Returns the answer store of this process."""
+    if database_path is None:
+        database_path = get_default_answer_store_path()
+    key: Tuple[int, str] = (os.getpid(), database_path)
+    if key not in _answer_stores:
+        _answer_stores[key] = AnswerStore(database_path=database_path)
+    return _answer_stores[key]
+
+
+@typechecked
+def create_answer_store_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Inspects, prunes or exports the stored LLM answers."
+    )
+    parser.add_argument(
+        "--database-path",
+        type=str,
+        default=get_default_answer_store_path(),
+        help="Path to the sqlite file with the LLM answers.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Prints the number of answers.")
+
+    prune_parser = subparsers.add_parser("prune", help="Removes answers.")
+    prune_parser.add_argument(
+        "--older-than-days",
+        type=float,
+        help="Removes the answers that were not used for this many days.",
+    )
+    prune_parser.add_argument(
+        "--model-hash", type=str, help="Removes the answers of this model."
+    )
+    prune_parser.add_argument(
+        "--keep-prompt-template-version",
+        type=str,
+        help="Removes the answers of all other prompt template versions.",
+    )
+
+    export_parser = subparsers.add_parser(
+        "export", help="Writes the answers as JSON lines."
+    )
+    export_parser.add_argument(
+        "--output",
+        type=str,
+        help="Path to the output file, the default is stdout.",
+    )
+    return parser
+
+
+@typechecked
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = create_answer_store_arg_parser()
+    args: Any = parser.parse_args(argv)
+    answer_store = AnswerStore(database_path=args.database_path)
+    if args.command == "stats":
+        print(json.dumps(answer_store.get_stats(), indent=2))
+    elif args.command == "prune":
+        try:
+            nr_of_answers: int = answer_store.prune(
+                older_than_days=args.older_than_days,
+                model_hash=args.model_hash,
+                keep_prompt_template_version=args.keep_prompt_template_version,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Removed {nr_of_answers} answers.")
+    elif args.command == "export":
+        if args.output is None:
+            export_answers(answer_store=answer_store, output_file=sys.stdout)
+        else:
+            with open(args.output, "w", encoding="utf-8") as output_file:
+                export_answers(
+                    answer_store=answer_store, output_file=output_file
+                )
+
+
+def export_answers(*, answer_store: AnswerStore, output_file: Any) -> None:
+    for answer in answer_store.iter_answers():
+        output_file.write(json.dumps(answer, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Resolves the heavy AI dependencies and models lazily.
+
+Importing `gpt4all` or `transformers` takes seconds, and hledger-flow calls
+the preprocessor once per statement. So these packages are only imported, and
+the models only loaded (into the model pool), once an AI classifier actually
+runs.
+"""
+
+import importlib
+import os
+from functools import lru_cache
+from types import ModuleType
+from typing import Any
+
+from hledger_preprocessor.classification.ai_based.model_pool import (
+    get_model_pool,
+)
+from hledger_preprocessor.typechecking import typechecked
+
+# Maps the heavy module names to the pip package that provides them.
+HEAVY_MODULE_PACKAGES = {
+    "gpt4all": "gpt4all",
+    "transformers": "transformers",
+    "fasttext": "fasttext",
+}
+
+
+@lru_cache(maxsize=None)
+def import_heavy_module(module_name: str) -> ModuleType:
+    """Imports a heavy (AI) dependency on first use, and caches it."""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        package: str = HEAVY_MODULE_PACKAGES.get(module_name, module_name)
+        raise ImportError(
+            f"The AI classifier requires: {module_name}, install it with:"
+            f" pip install {package}"
+        ) from e
+
+
+@typechecked
+def get_local_model_filepath(
+    model_filename: str = "Meta-Llama-3.1-8B-Instruct-Q5_K_S.gguf",
+) -> str:
+    main_user_path = os.path.expanduser("~")
+    return f"{main_user_path}/.models/{model_filename}"
+
+
+def load_gpt4all_model(local_model_filepath: str) -> Any:
+    """Loads a local GPT4All model once per process."""
+
+    def load() -> Any:
+        assert os.path.exists(
+            local_model_filepath
+        ), f"File does not exist: {local_model_filepath}"
+        gpt4all = import_heavy_module("gpt4all")
+        return gpt4all.GPT4All(local_model_filepath)
+
+    return get_model_pool().get_model(name=local_model_filepath, load=load)
+
+
+def get_pipeline_name(*, task: str, model: str) -> str:
+    return f"{task}:{model}"
+
+
+def load_transformers_pipeline(task: str, model: str) -> Any:
+    """Loads a huggingface pipeline once per process."""
+
+    def load() -> Any:
+        transformers = import_heavy_module("transformers")
+        return transformers.pipeline(task, model=model)
+
+    return get_model_pool().get_model(
+        name=get_pipeline_name(task=task, model=model), load=load
+    )
@@ -0,0 +1,116 @@
+"""Keeps the loaded AI models of a process, and measures their use.
+
+Loading a local LLM or a transformers pipeline takes seconds, so each model is
+loaded once per process (and thus once per daemon), and shared by all
+classifiers that use it. Inference runs on batches of transactions, and the
+pool counts the loads, batches, items and durations per model, so that the
+throughput and latency of the AI classification can be reported.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+from hledger_preprocessor.typechecking import typechecked
+
+
+@dataclass
+class ModelStats:
+    nr_of_loads: int = 0
+    load_duration: float = 0.0
+    nr_of_batches: int = 0
+    nr_of_items: int = 0
+    inference_duration: float = 0.0
+
+    def get_throughput(self) -> float:
+        """Returns the number of items per second of inference."""
+        if not self.inference_duration:
+            return 0.0
+        return self.nr_of_items / self.inference_duration
+
+    def get_batch_latency(self) -> float:
+        """Returns the mean duration of a batch in seconds."""
+        if not self.nr_of_batches:
+            return 0.0
+        return self.inference_duration / self.nr_of_batches
+
+
+class ModelPool:
+    """Loads each model once, and runs batched inference on it."""
+
+    def __init__(self) -> None:
+        self.models: Dict[str, Any] = {}
+        self.stats: Dict[str, ModelStats] = {}
+        # The models are not assumed to be thread safe, so each model runs
+        # one batch at a time.
+        self.locks: Dict[str, threading.Lock] = {}
+        self.lock = threading.Lock()
+
+    def get_stats(self, *, name: str) -> ModelStats:
+        with self.lock:
+            return self.stats.setdefault(name, ModelStats())
+
+    def get_lock(self, *, name: str) -> threading.Lock:
+        with self.lock:
+            return self.locks.setdefault(name, threading.Lock())
+
+    def get_model(self, *, name: str, load: Callable[[], Any]) -> Any:
+        """Returns the model with the name, and loads it on first use."""
+        with self.get_lock(name=name):
+            if name not in self.models:
+                start: float = time.perf_counter()
+                self.models[name] = load()
+                stats: ModelStats = self.get_stats(name=name)
+                stats.nr_of_loads += 1
+                stats.load_duration += time.perf_counter() - start
+        return self.models[name]
+
+    def run_batch(
+        self,
+        *,
+        name: str,
+        inputs: List[Any],
+        infer: Callable[[List[Any]], List[Any]],
+    ) -> List[Any]:
+        """Runs the inference function on a batch of inputs, and records its
+        duration."""
+        if not inputs:
+            return []
+        with self.get_lock(name=name):
+            start: float = time.perf_counter()
+            outputs: List[Any] = list(infer(inputs))
+            duration: float = time.perf_counter() - start
+        if len(outputs) != len(inputs):
+            raise ValueError(
+                f"Model: {name} returned {len(outputs)} outputs for"
+                f" {len(inputs)} inputs."
+            )
+        stats: ModelStats = self.get_stats(name=name)
+        stats.nr_of_batches += 1
+        stats.nr_of_items += len(inputs)
+        stats.inference_duration += duration
+        return outputs
+
+    def format_stats(self) -> str:
+        lines: List[str] = [
+            f"{'model':<40} {'loads':>5} {'load s':>7} {'batches':>8}"
+            f" {'items':>7} {'items/s':>8} {'s/batch':>8}"
+        ]
+        for name, stats in sorted(self.stats.items()):
+            lines.append(
+                f"{name[-40:]:<40} {stats.nr_of_loads:>5}"
+                f" {stats.load_duration:>7.2f} {stats.nr_of_batches:>8}"
+                f" {stats.nr_of_items:>7} {stats.get_throughput():>8.2f}"
+                f" {stats.get_batch_latency():>8.3f}"
+            )
+        return "\n".join(lines)
+
+
+# The model pool of this process.
+_model_pool: ModelPool = ModelPool()
+
+
+@typechecked
+def get_model_pool() -> ModelPool:
+    return _model_pool
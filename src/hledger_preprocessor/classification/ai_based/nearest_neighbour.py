@@ -0,0 +1,309 @@
+"""Classifies transactions like the most similar previously classified ones.
+
+The logic classifications in the pre-processed .csv files form a labelled
+history. Each transaction is turned into a vector of hashed character n-grams
+of its counterparty and description, plus its direction and amount bucket.
+The vectors of the history are stored, L2 normalised, in a NumPy matrix that
+is persisted to disk. A batch of transactions is classified with a single
+matrix multiplication, which yields the cosine similarities to all labelled
+transactions, after which the top-k most similar transactions vote on the
+category.
+
+NumPy is imported lazily, like in the columnar mode.
+"""
+
+import argparse
+import csv
+import glob
+import math
+import os
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from hledger_preprocessor.amount import Amount
+from hledger_preprocessor.cache_dir import get_cache_dir
+from hledger_preprocessor.classification.classifier import (
+    UNCLASSIFIED_CATEGORY,
+    normalise_text,
+)
+from hledger_preprocessor.file_reading_and_writing import hash_file
+from hledger_preprocessor.helper import import_numpy
+from hledger_preprocessor.typechecking import typechecked
+
+NGRAM_SIZE: int = 3
+NR_OF_NGRAM_BUCKETS: int = 1 << 10
+# Amounts are bucketed per power of 2, up to 2**NR_OF_AMOUNT_BUCKETS.
+NR_OF_AMOUNT_BUCKETS: int = 24
+NR_OF_DIRECTIONS: int = 2
+DIMENSION: int = NR_OF_NGRAM_BUCKETS + NR_OF_AMOUNT_BUCKETS + NR_OF_DIRECTIONS
+# The weights of the amount and direction features, relative to the text.
+AMOUNT_WEIGHT: float = 0.5
+DIRECTION_WEIGHT: float = 1.0
+INDEX_FILENAME: str = "nearest_neighbour_index.npz"
+NUMPY_OPTION: str = "--ai-model nearest_neighbour"
+
+# The loaded models per index path, modification time and size.
+_nearest_neighbour_models: Dict[
+    Tuple[str, int, int], "NearestNeighbourModel"
+] = {}
+
+
+@typechecked
+def get_ngram_buckets(*, text: str) -> List[int]:
+    """Returns the hash buckets of the character n-grams of the text."""
+    padded_text: str = f" {text} "
+    return [
+        zlib.crc32(padded_text[start : start + NGRAM_SIZE].encode("utf-8"))
+        % NR_OF_NGRAM_BUCKETS
+        for start in range(max(1, len(padded_text) - NGRAM_SIZE + 1))
+    ]
+
+
+@typechecked
+def get_amount_bucket(*, amount: float) -> int:
+    if abs(amount) < 1:
+        return 0
+    return min(int(math.log2(abs(amount))) + 1, NR_OF_AMOUNT_BUCKETS - 1)
+
+
+@typechecked
+def parse_amount(*, amount: Any) -> float:
+    if isinstance(amount, Amount):
+        return amount.to_float()
+    try:
+        return float(amount)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def vectorise(*, datas: List[Dict]) -> Any:
+    """Returns the L2 normalised feature vectors of the transactions, as rows
+    of a float32 matrix."""
+    np = import_numpy(option=NUMPY_OPTION)
+    vectors = np.zeros((len(datas), DIMENSION), dtype=np.float32)
+    for row, data in enumerate(datas):
+        text: str = normalise_text(
+            text=f"{data.get('other_party', '')} {data.get('description', '')}"
+        )
+        np.add.at(vectors[row], get_ngram_buckets(text=text), 1.0)
+        vectors[
+            row,
+            NR_OF_NGRAM_BUCKETS
+            + get_amount_bucket(amount=parse_amount(amount=data.get("amount"))),
+        ] = AMOUNT_WEIGHT
+        is_credit: bool = data.get("transaction_code") == "Credit"
+        vectors[
+            row, NR_OF_NGRAM_BUCKETS + NR_OF_AMOUNT_BUCKETS + int(is_credit)
+        ] = DIRECTION_WEIGHT
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class NearestNeighbourIndex:
+    """Labelled transaction vectors in a single matrix."""
+
+    def __init__(self, *, vectors: Any, labels: List[str]) -> None:
+        self.vectors: Any = vectors
+        self.labels: List[str] = labels
+
+    @classmethod
+    def from_labelled_transactions(
+        cls, *, datas: List[Dict], labels: List[str]
+    ) -> "NearestNeighbourIndex":
+        return cls(vectors=vectorise(datas=datas), labels=list(labels))
+
+    def save(self, *, index_path: str) -> None:
+        np = import_numpy(option=NUMPY_OPTION)
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        tmp_path: str = f"{index_path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            vectors=self.vectors,
+            labels=np.array(self.labels, dtype=str),
+            dimension=np.array(DIMENSION),
+        )
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load(cls, *, index_path: str) -> "NearestNeighbourIndex":
+        np = import_numpy(option=NUMPY_OPTION)
+        with np.load(index_path, allow_pickle=False) as index_file:
+            if int(index_file["dimension"]) != DIMENSION:
+                raise ValueError(
+                    f"The index: {index_path} was built with other features,"
+                    " build it again."
+                )
+            return cls(
+                vectors=index_file["vectors"],
+                labels=[str(label) for label in index_file["labels"]],
+            )
+
+    def query(self, *, vectors: Any, k: int) -> Tuple[Any, Any]:
+        """Returns the indices and cosine similarities of the k most similar
+        labelled transactions of each vector, most similar first."""
+        np = import_numpy(option=NUMPY_OPTION)
+        k = min(k, len(self.labels))
+        similarities = vectors @ self.vectors.T
+        top_k = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_k_similarities = np.take_along_axis(similarities, top_k, axis=1)
+        order = np.argsort(-top_k_similarities, axis=1)
+        return (
+            np.take_along_axis(top_k, order, axis=1),
+            np.take_along_axis(top_k_similarities, order, axis=1),
+        )
+
+
+class NearestNeighbourModel:
+    """Suggests the category that the most similar labelled transactions
+    have, weighted by their similarity."""
+
+    name = "NearestNeighbourModel"
+
+    def __init__(
+        self,
+        *,
+        index: NearestNeighbourIndex,
+        k: int = 5,
+        min_similarity: float = 0.5,
+        fingerprint: str = "",
+    ) -> None:
+        self.index: NearestNeighbourIndex = index
+        self.k: int = k
+        self.min_similarity: float = min_similarity
+        self.fingerprint: str = fingerprint
+
+    def get_fingerprint(self) -> str:
+        return f"{self.fingerprint}:{self.k}:{self.min_similarity}"
+
+    def predict(self, data: Dict) -> Optional[str]:
+        return self.predict_batch([data])[0]
+
+    def predict_batch(self, datas: List[Dict]) -> List[Optional[str]]:
+        """Returns the suggested category per transaction, or None if no
+        labelled transaction is similar enough."""
+        if not datas or not self.index.labels:
+            return [None] * len(datas)
+        neighbours, similarities = self.index.query(
+            vectors=vectorise(datas=datas), k=self.k
+        )
+        predictions: List[Optional[str]] = []
+        for row_neighbours, row_similarities in zip(neighbours, similarities):
+            votes: Dict[str, float] = {}
+            for neighbour, similarity in zip(row_neighbours, row_similarities):
+                if similarity >= self.min_similarity:
+                    label: str = self.index.labels[neighbour]
+                    votes[label] = votes.get(label, 0.0) + float(similarity)
+            predictions.append(
+                max(votes, key=votes.__getitem__) if votes else None
+            )
+        return predictions
+
+
+@typechecked
+def get_default_index_path() -> str:
+    return f"{get_cache_dir()}/{INDEX_FILENAME}"
+
+
+@typechecked
+def get_nearest_neighbour_model(
+    *, index_path: Optional[str] = None
+) -> NearestNeighbourModel:
+    """Returns the model of the index, which is only loaded again if the
+    index file changed."""
+    if index_path is None:
+        index_path = get_default_index_path()
+    stat = os.stat(index_path)
+    key: Tuple[str, int, int] = (index_path, stat.st_mtime_ns, stat.st_size)
+    if key not in _nearest_neighbour_models:
+        _nearest_neighbour_models[key] = NearestNeighbourModel(
+            index=NearestNeighbourIndex.load(index_path=index_path),
+            fingerprint=hash_file(filepath=index_path),
+        )
+    return _nearest_neighbour_models[key]
+
+
+@typechecked
+def iter_labelled_transactions(
+    *, start_path: str, pre_processed_output_dir: str = "2-preprocessed"
+) -> Iterator[Tuple[Dict, str]]:
+    """Yields the pre-processed transactions that have a logic
+    classification, with that classification.
+
+    Transactions that no rule matched are not labelled, else the index would
+    suggest the unclassified category for similar transactions.
+    """
+    pattern: str = (
+        f"{start_path}/import/*/*/*/{pre_processed_output_dir}/*/*.csv"
+    )
+    for filepath in sorted(glob.glob(pattern)):
+        with open(filepath, encoding="utf-8", newline="") as csvfile:
+            for row in csv.DictReader(csvfile):
+                label: str = (row.get("logic_classification") or "").strip()
+                if label and label != UNCLASSIFIED_CATEGORY:
+                    yield row, label
+
+
+@typechecked
+def build_index(
+    *,
+    start_path: str,
+    index_path: str,
+    pre_processed_output_dir: str = "2-preprocessed",
+) -> int:
+    """Builds the index from the pre-processed .csv files, and returns the
+    number of labelled transactions."""
+    datas: List[Dict] = []
+    labels: List[str] = []
+    for data, label in iter_labelled_transactions(
+        start_path=start_path, pre_processed_output_dir=pre_processed_output_dir
+    ):
+        datas.append(data)
+        labels.append(label)
+    NearestNeighbourIndex.from_labelled_transactions(
+        datas=datas, labels=labels
+    ).save(index_path=index_path)
+    return len(labels)
+
+
+@typechecked
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Builds the nearest neighbour index from the logic"
+            " classifications in the pre-processed .csv files."
+        )
+    )
+    parser.add_argument(
+        "-s",
+        "--start-path",
+        type=str,
+        required=True,
+        help="Path to root of the finance repo/folder.",
+    )
+    parser.add_argument(
+        "-p",
+        "--pre-processed-output-dir",
+        type=str,
+        default="2-preprocessed",
+        help="The dir name containing the pre-processed csv files.",
+    )
+    parser.add_argument(
+        "--index-path",
+        type=str,
+        default=get_default_index_path(),
+        help="Path to the .npz file of the index.",
+    )
+    args: Any = parser.parse_args(argv)
+    nr_of_transactions: int = build_index(
+        start_path=args.start_path,
+        index_path=args.index_path,
+        pre_processed_output_dir=args.pre_processed_output_dir,
+    )
+    print(
+        f"Indexed {nr_of_transactions} classified transactions in:"
+        f" {args.index_path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""Schedules the AI classification next to the logic classification.
+
+The logic models classify each batch of transactions inline, while the AI
+models classify the batch in a bounded thread pool. Meanwhile, the next
+batches are read and classified by the logic models. The batches are yielded
+in their original order once their AI classification is done. If the AI
+models do not answer within the timeout of the batch, or fail, the batch
+falls back to the logic classification, so the AI never stalls the writing of
+the pre-processed .csv files for longer than the timeout. The timeout of a
+batch starts when a worker starts on it, not when it is queued, so batches
+that wait behind other batches do not time out.
+
+A call that timed out keeps running, and holds its worker. So once an AI
+model times out, the remaining batches do not wait for it, and use the logic
+classification right away, unless the model already classified them.
+"""
+
+import concurrent.futures
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from hledger_preprocessor.classification.classifier import (
+    UNCLASSIFIED_CATEGORY,
+    ClassificationCache,
+    classify_with_ai_model,
+    classify_with_logic_models,
+    predict_batch,
+    store_classifications,
+)
+from hledger_preprocessor.parser_logic_structure import Transaction
+
+
+@dataclass
+class StartedCall:
+    """Records when a worker starts on a submitted call."""
+
+    started: threading.Event = field(default_factory=threading.Event)
+    start_time: float = 0.0
+
+
+def run_started_call(
+    started_call: StartedCall, function: Callable, *args: Any
+) -> Any:
+    started_call.start_time = time.monotonic()
+    started_call.started.set()
+    return function(*args)
+
+
+@dataclass
+class PendingBatch:
+    transactions: List[Transaction]
+    # The transactions that were not in the cache, with their signature.
+    classified: List[Tuple[Transaction, Optional[str]]]
+    # The AI classification of the batch per AI model name.
+    futures: Dict[str, Future]
+    started_calls: Dict[str, StartedCall]
+    # The number of seconds the AI models get for the batch.
+    timeout: float
+
+
+class AIClassificationScheduler:
+    """Classifies transaction batches with the AI models in a bounded thread
+    pool, with a timeout per transaction."""
+
+    def __init__(
+        self,
+        *,
+        ai_models: List,
+        batch_size: int = 16,
+        max_workers: int = 1,
+        max_in_flight: int = 4,
+        timeout: float = 30.0,
+    ) -> None:
+        self.ai_models: List = ai_models
+        self.batch_size: int = batch_size
+        # The number of batches that wait for their AI classification.
+        self.max_in_flight: int = max_in_flight
+        # The number of seconds the AI models get per transaction.
+        self.timeout: float = timeout
+        self.nr_of_timeouts: int = 0
+        self.nr_of_failures: int = 0
+        # The AI models that timed out, which the remaining batches skip.
+        self.timed_out_models: Set[str] = set()
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ai_classification"
+        )
+
+    def __enter__(self) -> "AIClassificationScheduler":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stops the pool without waiting for AI classifications that timed
+        out."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def iter_classified_transactions(
+        self,
+        transactions: Iterable[Transaction],
+        logic_models: List,
+        cache: Optional[ClassificationCache] = None,
+    ) -> Iterator[Transaction]:
+        in_flight: Deque[PendingBatch] = deque()
+        transaction_iterator: Iterator[Transaction] = iter(transactions)
+        while batch := list(islice(transaction_iterator, self.batch_size)):
+            classified: List[Tuple[Transaction, Optional[str]]] = (
+                classify_with_logic_models(
+                    batch,
+                    self.ai_models,
+                    logic_models,
+                    cache=cache,
+                    use_ai_models=True,
+                )
+            )
+            in_flight.append(self.submit(batch=batch, classified=classified))
+            # Yield the finished batches, and wait for the oldest batch once
+            # too many batches are in flight.
+            while in_flight and (
+                len(in_flight) > self.max_in_flight
+                or all(
+                    future.done() for future in in_flight[0].futures.values()
+                )
+            ):
+                yield from self.complete(
+                    pending_batch=in_flight.popleft(), cache=cache
+                )
+        while in_flight:
+            yield from self.complete(
+                pending_batch=in_flight.popleft(), cache=cache
+            )
+
+    def submit(
+        self,
+        *,
+        batch: List[Transaction],
+        classified: List[Tuple[Transaction, Optional[str]]],
+    ) -> PendingBatch:
+        futures: Dict[str, Future] = {}
+        started_calls: Dict[str, StartedCall] = {}
+        if classified:
+            for ai_model in self.ai_models:
+                if ai_model.name in self.timed_out_models:
+                    continue
+                started_calls[ai_model.name] = StartedCall()
+                futures[ai_model.name] = self.executor.submit(
+                    run_started_call,
+                    started_calls[ai_model.name],
+                    predict_batch,
+                    classified,
+                    ai_model,
+                )
+        return PendingBatch(
+            transactions=batch,
+            classified=classified,
+            futures=futures,
+            started_calls=started_calls,
+            timeout=self.timeout * len(classified),
+        )
+
+    def complete(
+        self,
+        *,
+        pending_batch: PendingBatch,
+        cache: Optional[ClassificationCache] = None,
+    ) -> List[Transaction]:
+        """Waits for the AI classification of the batch until its timeout,
+        and falls back to the logic classification otherwise."""
+        is_complete: bool = True
+        for ai_model in self.ai_models:
+            if not pending_batch.classified:
+                continue
+            predictions: Optional[List[str]] = self.get_predictions(
+                pending_batch=pending_batch, ai_model=ai_model
+            )
+            if predictions is None:
+                predictions = get_logic_classifications(
+                    classified=pending_batch.classified
+                )
+                is_complete = False
+            classify_with_ai_model(
+                pending_batch.classified,
+                ai_model=ai_model,
+                predictions=predictions,
+            )
+        # Only memoize the answers of the AI models, not the fallbacks.
+        if is_complete:
+            store_classifications(pending_batch.classified, cache=cache)
+        return pending_batch.transactions
+
+    def get_predictions(
+        self, *, pending_batch: PendingBatch, ai_model: Any
+    ) -> Optional[List[str]]:
+        """Returns the AI classification of the batch, or None if the AI
+        model timed out, failed, or timed out on an earlier batch."""
+        future: Optional[Future] = pending_batch.futures.get(ai_model.name)
+        if future is None:
+            return None
+        if ai_model.name in self.timed_out_models and not future.done():
+            future.cancel()
+            return None
+        try:
+            predictions: List[str] = wait_for_result(
+                future=future,
+                started_call=pending_batch.started_calls[ai_model.name],
+                timeout=pending_batch.timeout,
+            )
+            return predictions
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            self.nr_of_timeouts += 1
+            self.timed_out_models.add(ai_model.name)
+            print(
+                f"AI model: {ai_model.name} timed out, using the logic"
+                " classification for the remaining transactions instead."
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            self.nr_of_failures += 1
+            print(
+                f"AI model: {ai_model.name} failed: {e!r}, using the logic"
+                " classification instead."
+            )
+        return None
+
+
+def wait_for_result(
+    *, future: Future, started_call: StartedCall, timeout: float
+) -> Any:
+    """Returns the result of the call, if it finishes within the timeout
+    after a worker started on it.
+
+    A call that still waits for a worker, e.g. behind a call that timed out
+    but keeps running, is cancelled if no worker starts on it within the
+    timeout.
+    """
+    if not started_call.started.wait(timeout=timeout):
+        if future.cancel():
+            raise concurrent.futures.TimeoutError()
+        # A worker started on the call in the meantime.
+        started_call.started.wait()
+    return future.result(
+        timeout=max(0.0, started_call.start_time + timeout - time.monotonic())
+    )
+
+
+def get_logic_classifications(
+    *, classified: List[Tuple[Transaction, Optional[str]]]
+) -> List[str]:
+    return [
+        next(
+            iter((txn.logic_classification or {}).values()),
+            UNCLASSIFIED_CATEGORY,
+        )
+        for txn, _ in classified
+    ]
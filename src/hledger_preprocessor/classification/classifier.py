@@ -1,35 +1,313 @@
-from typing import List
+"""Classifies transactions with the AI and logic based models.
 
+Optionally, the classifications are memoized per transaction signature: the
+direction, counterparty account, counterparty name and description, without
+the dates and reference numbers that differ between otherwise identical
+transactions. Recently used signatures are kept in memory, and all signatures
+are stored in a sqlite file, per fingerprint of the classification models.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from hledger_preprocessor.cache_dir import get_cache_dir
 from hledger_preprocessor.parser_logic_structure import Transaction
+from hledger_preprocessor.typechecking import typechecked
 
+CLASSIFICATION_CACHE_FILENAME: str = "classification_cache.sqlite"
+# The category of the transactions that no logic model could classify.
+UNCLASSIFIED_CATEGORY: str = "unclassified"
+# Dates like 02-01-2024, 2024/01/02 or 02.01.24 and times like 12:34(:56).
+DATE_PATTERN = re.compile(
+    r"\b\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}\b|\b\d{1,2}:\d{2}(:\d{2})?\b"
+)
+# Words that contain 4 or more digits, like reference and card numbers.
+REFERENCE_PATTERN = re.compile(r"\w*\d{4,}\w*")
+WHITESPACE_PATTERN = re.compile(r"\s+")
 
-# Function to classify transactions (AI and logic-based classifications)
-def classify_transactions(
-    transactions: List[Transaction], ai_models, logic_models
+# The AI and logic classifications of a transaction.
+CachedClassification = Tuple[Optional[Dict[str, str]], Optional[Dict[str, str]]]
+
+# The classification caches per process id, fingerprint and path. The process
+# id ensures forked workers do not share the sqlite connection of the parent.
+_classification_caches: Dict[Tuple[int, str, str], "ClassificationCache"] = {}
+
+
+@typechecked
+def normalise_text(*, text: str) -> str:
+    text = DATE_PATTERN.sub(" ", text.lower())
+    text = REFERENCE_PATTERN.sub("#", text)
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+def get_transaction_signature(*, transaction: Transaction) -> str:
+    """Returns a hash of the fields that determine how similar transactions
+    are classified."""
+    normalised_fields: List[str] = [
+        transaction.transaction_code,
+        transaction.account1.strip(),
+        normalise_text(text=transaction.other_party_name),
+        normalise_text(text=transaction.description),
+    ]
+    return hashlib.sha256(
+        "\x1f".join(normalised_fields).encode("utf-8")
+    ).hexdigest()
+
+
+class ClassificationCache:
+    """Memoizes the classifications per transaction signature, in an LRU
+    cache in memory and optionally in a sqlite file."""
+
+    def __init__(
+        self,
+        *,
+        fingerprint: str,
+        database_path: Optional[str] = None,
+        max_entries: int = 10000,
+    ) -> None:
+        self.fingerprint: str = fingerprint
+        self.max_entries: int = max_entries
+        self.entries: OrderedDict = OrderedDict()
+        self.pending: Dict[str, str] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.connection: Optional[sqlite3.Connection] = None
+        if database_path is not None:
+            os.makedirs(os.path.dirname(database_path) or ".", exist_ok=True)
+            self.connection = sqlite3.connect(database_path, timeout=30)
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS classifications (fingerprint"
+                    " TEXT, signature TEXT, classification TEXT, PRIMARY KEY"
+                    " (fingerprint, signature))"
+                )
+
+    def get(self, *, signature: str) -> Optional[CachedClassification]:
+        classification: Optional[CachedClassification] = self.entries.get(
+            signature
+        )
+        if classification is None and self.connection is not None:
+            row = self.connection.execute(
+                "SELECT classification FROM classifications WHERE"
+                " fingerprint = ? AND signature = ?",
+                (self.fingerprint, signature),
+            ).fetchone()
+            if row is not None:
+                ai_classification, logic_classification = json.loads(row[0])
+                classification = (ai_classification, logic_classification)
+                self.remember(
+                    signature=signature, classification=classification
+                )
+        if classification is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(signature)
+        self.hits += 1
+        return classification
+
+    def put(
+        self, *, signature: str, classification: CachedClassification
+    ) -> None:
+        self.remember(signature=signature, classification=classification)
+        if self.connection is not None:
+            self.pending[signature] = json.dumps(classification)
+
+    def remember(
+        self, *, signature: str, classification: CachedClassification
+    ) -> None:
+        self.entries[signature] = classification
+        self.entries.move_to_end(signature)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def flush(self) -> None:
+        """Stores the new classifications in the sqlite file."""
+        if self.connection is None or not self.pending:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO classifications VALUES (?, ?, ?)",
+                [
+                    (self.fingerprint, signature, classification)
+                    for signature, classification in self.pending.items()
+                ],
+            )
+        self.pending.clear()
+
+
+@typechecked
+def get_classification_cache(
+    *, fingerprint: str, database_path: Optional[str] = None
+) -> ClassificationCache:
+    """Returns the classification cache of this process for the fingerprint,
+    so that it stays warm across input files."""
+    if database_path is None:
+        database_path = f"{get_cache_dir()}/{CLASSIFICATION_CACHE_FILENAME}"
+    key: Tuple[int, str, str] = (os.getpid(), fingerprint, database_path)
+    if key not in _classification_caches:
+        _classification_caches[key] = ClassificationCache(
+            fingerprint=fingerprint, database_path=database_path
+        )
+    return _classification_caches[key]
+
+
+def classify_transaction(
+    txn: Transaction,
+    ai_models,
+    logic_models,
+    cache: Optional[ClassificationCache] = None,
 ):
-    for txn in transactions:
+    return classify_batch([txn], ai_models, logic_models, cache=cache)[0]
+
+
+def classify_batch(
+    transactions: List[Transaction],
+    ai_models,
+    logic_models,
+    cache: Optional[ClassificationCache] = None,
+    use_ai_models: bool = False,
+) -> List[Transaction]:
+    """Classifies the transactions with the logic models one at a time, and
+    with the AI models in a single batch per model."""
+    classified: List[Tuple[Transaction, Optional[str]]] = (
+        classify_with_logic_models(
+            transactions,
+            ai_models,
+            logic_models,
+            cache=cache,
+            use_ai_models=use_ai_models,
+        )
+    )
+    if use_ai_models:
         for ai_model in ai_models:
-            # AI-based classification (replace `ai_model.predict` with your actual model logic)
-            # ai_classification = ai_model.predict(
-            #     {
-            #         "bank": txn.bank,
-            #         "account_type": txn.account_type,
-            #         "date": txn.the_date.strftime("%Y-%m-%d"),
-            #         "account_owner": txn.account0,
-            #         "amount": txn.amount0,
-            #         "transaction_code": txn.transaction_code,
-            #         "other_account": txn.account1,
-            #         "other_party": txn.other_party_name,
-            #         "BIC": txn.BIC,
-            #         "description": txn.description,
-            #     }
-            # )
-            # txn.ai_classification = {ai_model.name: ai_classification}
-            txn.ai_classification = {ai_model.name: "filler"}
+            classify_with_ai_model(
+                classified,
+                ai_model=ai_model,
+                predictions=predict_batch(classified, ai_model=ai_model),
+            )
+    store_classifications(classified, cache=cache)
+    return transactions
+
+
+def classify_with_logic_models(
+    transactions: List[Transaction],
+    ai_models,
+    logic_models,
+    cache: Optional[ClassificationCache] = None,
+    use_ai_models: bool = False,
+) -> List[Tuple[Transaction, Optional[str]]]:
+    """Classifies the transactions that are not in the cache with the logic
+    models, and returns them with their signature."""
+    classified: List[Tuple[Transaction, Optional[str]]] = []
+    for txn in transactions:
+        signature: Optional[str] = None
+        if cache is not None:
+            signature = get_transaction_signature(transaction=txn)
+            cached: Optional[CachedClassification] = cache.get(
+                signature=signature
+            )
+            if cached is not None:
+                ai_classification, logic_classification = cached
+                txn.ai_classification = copy_classification(ai_classification)
+                txn.logic_classification = copy_classification(
+                    logic_classification
+                )
+                continue
+
+        if not use_ai_models:
+            for ai_model in ai_models:
+                txn.ai_classification = {ai_model.name: "filler"}
 
         for logic_model in logic_models:
 
             logic_classification = logic_model.classify(transaction=txn)
             txn.logic_classification = {logic_model.name: logic_classification}
+        classified.append((txn, signature))
+    return classified
+
+
+def predict_batch(
+    classified: List[Tuple[Transaction, Optional[str]]], ai_model
+) -> List[str]:
+    if not classified:
+        return []
+    return ai_model.predict_batch(
+        [txn.to_dict_without_classification() for txn, _ in classified]
+    )
+
+
+def classify_with_ai_model(
+    classified: List[Tuple[Transaction, Optional[str]]],
+    ai_model,
+    predictions: List[str],
+) -> None:
+    for (txn, _), prediction in zip(classified, predictions):
+        txn.ai_classification = {ai_model.name: prediction}
+
+
+def store_classifications(
+    classified: List[Tuple[Transaction, Optional[str]]],
+    cache: Optional[ClassificationCache] = None,
+) -> None:
+    if cache is None:
+        return
+    for txn, signature in classified:
+        # The signature is only computed when there is a cache.
+        if signature is None:
+            continue
+        # Classifications that the rules could not make are not memoized, so
+        # rules that are added later still reach these transactions.
+        if not {None, UNCLASSIFIED_CATEGORY} & set(
+            (txn.logic_classification or {}).values()
+        ):
+            cache.put(
+                signature=signature,
+                classification=(
+                    copy_classification(txn.ai_classification),
+                    copy_classification(txn.logic_classification),
+                ),
+            )
+
+
+def copy_classification(
+    classification: Optional[Dict[str, str]],
+) -> Optional[Dict[str, str]]:
+    if classification is None:
+        return None
+    return dict(classification)
+
+
+# Function to classify transactions (AI and logic-based classifications)
+def classify_transactions(
+    transactions: List[Transaction], ai_models, logic_models
+):
+    for txn in transactions:
+        classify_transaction(txn, ai_models, logic_models)
 
     return transactions
+
+
+def iter_classified_transactions(
+    transactions: Iterable[Transaction],
+    ai_models,
+    logic_models,
+    cache: Optional[ClassificationCache] = None,
+    ai_scheduler=None,
+) -> Iterator[Transaction]:
+    """Classifies the transactions as they stream through the pipeline, one
+    at a time, or in batches by the AI scheduler if the AI models are
+    used."""
+    if ai_scheduler is None:
+        for txn in transactions:
+            yield classify_transaction(
+                txn, ai_models, logic_models, cache=cache
+            )
+        return
+    yield from ai_scheduler.iter_classified_transactions(
+        transactions, logic_models, cache=cache
+    )
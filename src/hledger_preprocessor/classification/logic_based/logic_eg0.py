@@ -1,14 +1,74 @@
-from hledger_preprocessor.classification.helper import dict_contains_string
+import hashlib
+import inspect
+from typing import Dict, List, Optional
+
+from hledger_preprocessor.classification.classifier import UNCLASSIFIED_CATEGORY
+from hledger_preprocessor.classification.logic_based import private_logic
 from hledger_preprocessor.classification.logic_based.private_logic import (
     private_credit_classification,
+    private_credit_rules,
     private_debit_classification,
+    private_debit_rules,
+)
+from hledger_preprocessor.classification.rule_engine import (
+    CompiledRuleSet,
+    SubstringRule,
+)
+from hledger_preprocessor.classification.rule_file import (
+    RuleFileClassifier,
+    load_rule_file_classifier,
 )
 from hledger_preprocessor.parser_logic_structure import Transaction
+from hledger_preprocessor.preprocessing_manifest import get_model_source
+
+debit_rules: List[SubstringRule] = [
+    SubstringRule(substr="IKEA BV", category="house:furniture:Ikea"),
+    SubstringRule(substr="Eko Plaza", category="groceries:eko_plaza"),
+]
+credit_rules: List[SubstringRule] = [
+    SubstringRule(substr="IKEA BV", category="refund:furniture:Ikea"),
+]
 
 
 class ExampleLogicModel:
     name = "ExampleLogicModel"
 
+    def __init__(self) -> None:
+        # Compile all substring rules once, the first matching rule wins.
+        self.debit_rule_set = CompiledRuleSet(debit_rules + private_debit_rules)
+        self.credit_rule_set = CompiledRuleSet(
+            credit_rules + private_credit_rules
+        )
+        self.rule_file_classifier: Optional[RuleFileClassifier] = None
+        # Whether to wait for the user to add a rule for an unclassified
+        # transaction, instead of deferring it to the review file.
+        self.ask_for_rules: bool = False
+
+    def use_rules_file(self, *, filepath: Optional[str]) -> None:
+        """Consults the rules of the (declarative) rule file first, or stops
+        using a rule file if filepath is None."""
+        if filepath is None:
+            self.rule_file_classifier = None
+        else:
+            self.rule_file_classifier = load_rule_file_classifier(
+                filepath=filepath
+            )
+
+    def get_fingerprint(self) -> str:
+        """Returns a hash of the classification rules, which live in the
+        source code of this and the private logic module."""
+        fingerprint = hashlib.sha256()
+        for source in [
+            get_model_source(model=self),
+            inspect.getsource(private_logic),
+        ]:
+            fingerprint.update(source.encode("utf-8"))
+        if self.rule_file_classifier is not None:
+            fingerprint.update(
+                self.rule_file_classifier.file_hash.encode("utf-8")
+            )
+        return fingerprint.hexdigest()
+
     def classify(self, transaction: Transaction) -> str:
         if transaction is None:
             raise ValueError("Transaction cannot be None.")
@@ -20,45 +80,48 @@ class ExampleLogicModel:
         else:
             raise ValueError(f"Unknown transaction_code for:{transaction}")
 
+    def classify_with_rules_file(
+        self, *, transaction: Transaction, tnx_dict: Dict
+    ) -> Optional[str]:
+        if self.rule_file_classifier is None:
+            return None
+        return self.rule_file_classifier.classify(
+            transaction_code=transaction.transaction_code, tnx_dict=tnx_dict
+        )
+
     def classify_debit(self, transaction: Transaction) -> str:
 
         tnx_dict = transaction.to_dict_without_classification()
-        if dict_contains_string(
-            d=tnx_dict, substr="IKEA BV", case_sensitive=False
-        ):
-            return "house:furniture:Ikea"
-        if dict_contains_string(
-            d=tnx_dict, substr="Eko Plaza", case_sensitive=False
-        ):
-            return "groceries:eko_plaza"
-        if (
-            private_debit_classification(
-                transaction=transaction, tnx_dict=tnx_dict
-            )
-            is not None
-        ):
-            return private_debit_classification(
+        classification: Optional[str] = self.classify_with_rules_file(
+            transaction=transaction, tnx_dict=tnx_dict
+        )
+        if classification is None:
+            classification = self.debit_rule_set.classify(tnx_dict=tnx_dict)
+        if classification is None:
+            classification = private_debit_classification(
                 transaction=transaction, tnx_dict=tnx_dict
             )
-        else:
-            print("\n Please add a rule for expense (and run again):")
-            input(transaction)
+        if classification is None:
+            if self.ask_for_rules:
+                print("\n Please add a rule for expense (and run again):")
+                input(transaction)
+            classification = UNCLASSIFIED_CATEGORY
+        return classification
 
     def classify_credit(self, transaction: Transaction) -> str:
         tnx_dict = transaction.to_dict_without_classification()
-        if dict_contains_string(
-            d=tnx_dict, substr="IKEA BV", case_sensitive=False
-        ):
-            return "refund:furniture:Ikea"
-        if (
-            private_credit_classification(
-                transaction=transaction, tnx_dict=tnx_dict
-            )
-            is not None
-        ):
-            return private_credit_classification(
+        classification: Optional[str] = self.classify_with_rules_file(
+            transaction=transaction, tnx_dict=tnx_dict
+        )
+        if classification is None:
+            classification = self.credit_rule_set.classify(tnx_dict=tnx_dict)
+        if classification is None:
+            classification = private_credit_classification(
                 transaction=transaction, tnx_dict=tnx_dict
             )
-        else:
-            print("\n Please add a rule for income (and run again):")
-            input(transaction)
+        if classification is None:
+            if self.ask_for_rules:
+                print("\n Please add a rule for income (and run again):")
+                input(transaction)
+            classification = UNCLASSIFIED_CATEGORY
+        return classification
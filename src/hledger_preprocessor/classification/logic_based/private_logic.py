@@ -1,8 +1,14 @@
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 from hledger_preprocessor.classification.helper import dict_contains_string
+from hledger_preprocessor.classification.rule_engine import SubstringRule
 from hledger_preprocessor.parser_logic_structure import Transaction
 
+# Substring rules are checked first, in order, e.g.:
+# SubstringRule(substr="Albert Heijn", category="groceries:albert_heijn"),
+private_debit_rules: List[SubstringRule] = []
+private_credit_rules: List[SubstringRule] = []
+
 
 def private_debit_classification(
     *, transaction: Transaction, tnx_dict: Dict
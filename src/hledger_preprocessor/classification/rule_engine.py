@@ -0,0 +1,175 @@
+"""Compiles substring classification rules into a single automaton.
+
+Checking each rule with `dict_contains_string` lower-cases and searches every
+field of the transaction once per rule. Instead, all patterns are compiled
+into an Aho-Corasick automaton, which finds the patterns that occur in a
+transaction in a single scan over its (pre-normalised) fields. That makes the
+classification cost roughly independent of the number of rules. The first
+rule in the list that matches wins, like in a chain of if statements.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from hledger_preprocessor.typechecking import typechecked
+
+# Separates the fields in the haystack, so that no pattern matches across
+# two fields.
+FIELD_SEPARATOR: str = "\x00"
+
+# Pattern index that represents: no pattern found.
+NO_MATCH: int = -1
+
+
+@dataclass(frozen=True)
+class SubstringRule:
+    """Classifies a transaction as the category if any of its fields contains
+    the substring."""
+
+    substr: str
+    category: str
+    case_sensitive: bool = False
+
+
+class AhoCorasickAutomaton:
+    """Finds the first (lowest index) pattern that occurs in a text, in a
+    single pass over the text."""
+
+    def __init__(self, patterns: List[str]) -> None:
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # The lowest pattern index that ends in the state, or in any state
+        # reachable through its fail links.
+        self.first_pattern: List[int] = [NO_MATCH]
+        for pattern_index, pattern in enumerate(patterns):
+            self.add_pattern(pattern=pattern, pattern_index=pattern_index)
+        self.build_fail_links()
+
+    def add_pattern(self, *, pattern: str, pattern_index: int) -> None:
+        state: int = 0
+        for char in pattern:
+            next_state: Optional[int] = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.first_pattern.append(NO_MATCH)
+            state = next_state
+        self.first_pattern[state] = self.lowest(
+            self.first_pattern[state], pattern_index
+        )
+
+    def build_fail_links(self) -> None:
+        queue: deque = deque(self.goto[0].values())
+        while queue:
+            state: int = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                fail_state: int = self.fail[state]
+                while fail_state and char not in self.goto[fail_state]:
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.goto[fail_state].get(char, 0)
+                self.first_pattern[next_state] = self.lowest(
+                    self.first_pattern[next_state],
+                    self.first_pattern[self.fail[next_state]],
+                )
+                queue.append(next_state)
+        # Patterns that end in the root (the empty pattern) match any text.
+        for state in range(1, len(self.goto)):
+            self.first_pattern[state] = self.lowest(
+                self.first_pattern[state], self.first_pattern[0]
+            )
+
+    @staticmethod
+    def lowest(pattern_index: int, other_pattern_index: int) -> int:
+        if pattern_index == NO_MATCH:
+            return other_pattern_index
+        if other_pattern_index == NO_MATCH:
+            return pattern_index
+        return min(pattern_index, other_pattern_index)
+
+    def find_first_pattern(self, text: str) -> int:
+        """Returns the lowest index of the patterns that occur in the text,
+        or NO_MATCH."""
+        goto: List[Dict[str, int]] = self.goto
+        fail: List[int] = self.fail
+        first_pattern: List[int] = self.first_pattern
+        best: int = first_pattern[0]
+        state: int = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found: int = first_pattern[state]
+            if found != NO_MATCH and (best == NO_MATCH or found < best):
+                best = found
+                if best == 0:
+                    break
+        return best
+
+
+class CompiledRuleSet:
+    """Classifies transactions with an ordered list of substring rules."""
+
+    def __init__(self, rules: List[SubstringRule]) -> None:
+        self.rules: List[SubstringRule] = list(rules)
+        # Maps the pattern index of each automaton to the rule index.
+        self.case_sensitive_rule_indices: List[int] = [
+            index
+            for index, rule in enumerate(self.rules)
+            if rule.case_sensitive
+        ]
+        self.case_insensitive_rule_indices: List[int] = [
+            index
+            for index, rule in enumerate(self.rules)
+            if not rule.case_sensitive
+        ]
+        self.case_sensitive_automaton = AhoCorasickAutomaton(
+            [
+                self.rules[index].substr
+                for index in self.case_sensitive_rule_indices
+            ]
+        )
+        self.case_insensitive_automaton = AhoCorasickAutomaton(
+            [
+                self.rules[index].substr.lower()
+                for index in self.case_insensitive_rule_indices
+            ]
+        )
+
+    def match(self, *, haystack: str) -> Optional[SubstringRule]:
+        """Returns the first rule whose substring occurs in the haystack."""
+        rule_index: int = NO_MATCH
+        if self.case_sensitive_rule_indices:
+            pattern_index: int = (
+                self.case_sensitive_automaton.find_first_pattern(haystack)
+            )
+            if pattern_index != NO_MATCH:
+                rule_index = self.case_sensitive_rule_indices[pattern_index]
+        if self.case_insensitive_rule_indices:
+            pattern_index = self.case_insensitive_automaton.find_first_pattern(
+                haystack.lower()
+            )
+            if pattern_index != NO_MATCH:
+                rule_index = AhoCorasickAutomaton.lowest(
+                    rule_index,
+                    self.case_insensitive_rule_indices[pattern_index],
+                )
+        if rule_index == NO_MATCH:
+            return None
+        return self.rules[rule_index]
+
+    def classify(self, *, tnx_dict: Dict[str, Any]) -> Optional[str]:
+        rule: Optional[SubstringRule] = self.match(
+            haystack=build_haystack(d=tnx_dict)
+        )
+        if rule is None:
+            return None
+        return rule.category
+
+
+@typechecked
+def build_haystack(*, d: Dict) -> str:
+    """Joins the values of the dict into a single text to search in."""
+    return FIELD_SEPARATOR.join(str(value) for value in d.values())
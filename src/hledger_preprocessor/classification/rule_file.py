@@ -0,0 +1,362 @@
+"""Loads declarative classification rules from a .csv rule file.
+
+Instead of adding Python `if` statements to `private_logic.py`, rules can be
+written in a .csv file with the columns:
+
+```csv
+field,match_type,pattern,direction,category,priority,case_sensitive
+other_account,exact,NL00TRIO0123456789,debit,savings:transfer,10,
+other_party,prefix,Albert Heijn,debit,groceries:albert_heijn,0,
+description,substring,salaris,credit,income:salary,0,false
+```
+
+- field: a field of the transaction, e.g. other_party or description.
+- match_type: exact, prefix or substring.
+- direction: debit, credit or any.
+- priority: rules with a higher priority win, ties go to the first rule in
+  the file.
+- case_sensitive: optional, false by default.
+
+Exact and prefix matches ignore the whitespace around the field value and the
+pattern, because bank exports often pad the counterparty fields.
+
+The rules are compiled into one index per field and match type: a hash map
+for exact matches, a trie for prefixes and an Aho-Corasick automaton for
+substrings. The compiled rules are cached on disk, keyed by the hash of the
+rule file, so that they are only recompiled when the rule file changes.
+"""
+
+import csv
+import os
+import pickle  # nosec
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from hledger_preprocessor.cache_dir import get_cache_dir
+from hledger_preprocessor.classification.rule_engine import (
+    NO_MATCH,
+    AhoCorasickAutomaton,
+)
+from hledger_preprocessor.file_reading_and_writing import hash_file
+from hledger_preprocessor.typechecking import typechecked
+
+# Increase when the compiled (pickled) representation changes.
+RULE_FILE_FORMAT_VERSION: str = "2"
+
+REQUIRED_COLUMNS: List[str] = [
+    "field",
+    "match_type",
+    "pattern",
+    "direction",
+    "category",
+    "priority",
+]
+MATCH_TYPES: List[str] = ["exact", "prefix", "substring"]
+# Maps the rule directions to the transaction codes they apply to.
+DIRECTION_TRANSACTION_CODES: Dict[str, List[str]] = {
+    "debit": ["Debet"],
+    "credit": ["Credit"],
+    "any": ["Debet", "Credit"],
+}
+RULE_FIELDS: List[str] = [
+    "account_holder",
+    "bank",
+    "account_type",
+    "date",
+    "account_owner",
+    "amount",
+    "transaction_code",
+    "other_party",
+    "other_account",
+    "BIC",
+    "description",
+    "balance",
+]
+
+# The compiled rule files of this process, per rule file hash.
+_loaded_rule_files: Dict[str, "RuleFileClassifier"] = {}
+
+
+@dataclass(frozen=True)
+class FileRule:
+    field: str
+    match_type: str
+    pattern: str
+    direction: str
+    category: str
+    priority: int
+    case_sensitive: bool
+    line_nr: int
+
+
+class PrefixTrie:
+    """Finds the first (lowest index) pattern that is a prefix of a text."""
+
+    def __init__(self, patterns: List[str]) -> None:
+        self.children: List[Dict[str, int]] = [{}]
+        self.first_pattern: List[int] = [NO_MATCH]
+        for pattern_index, pattern in enumerate(patterns):
+            state: int = 0
+            for char in pattern:
+                next_state: Optional[int] = self.children[state].get(char)
+                if next_state is None:
+                    next_state = len(self.children)
+                    self.children[state][char] = next_state
+                    self.children.append({})
+                    self.first_pattern.append(NO_MATCH)
+                state = next_state
+            if self.first_pattern[state] == NO_MATCH:
+                self.first_pattern[state] = pattern_index
+
+    def find_first_pattern(self, text: str) -> int:
+        best: int = self.first_pattern[0]
+        state: int = 0
+        for char in text:
+            next_state: Optional[int] = self.children[state].get(char)
+            if next_state is None:
+                break
+            state = next_state
+            found: int = self.first_pattern[state]
+            if found != NO_MATCH and (best == NO_MATCH or found < best):
+                best = found
+        return best
+
+
+class FieldIndex:
+    """Indexes the rules of a single field, match type and case
+    sensitivity."""
+
+    def __init__(
+        self,
+        *,
+        field: str,
+        match_type: str,
+        case_sensitive: bool,
+        patterns: List[str],
+        ranks: List[int],
+    ) -> None:
+        self.field: str = field
+        self.match_type: str = match_type
+        self.case_sensitive: bool = case_sensitive
+        # Maps the pattern index to the rank of its rule.
+        self.ranks: List[int] = ranks
+        if not case_sensitive:
+            patterns = [pattern.lower() for pattern in patterns]
+        if match_type != "substring":
+            patterns = [pattern.strip() for pattern in patterns]
+        self.exact_patterns: Dict[str, int] = {}
+        self.prefix_trie: Optional[PrefixTrie] = None
+        self.automaton: Optional[AhoCorasickAutomaton] = None
+        if match_type == "exact":
+            for pattern_index, pattern in enumerate(patterns):
+                self.exact_patterns.setdefault(pattern, pattern_index)
+        elif match_type == "prefix":
+            self.prefix_trie = PrefixTrie(patterns)
+        else:
+            self.automaton = AhoCorasickAutomaton(patterns)
+
+    def find_first_rank(self, *, value: str) -> int:
+        if not self.case_sensitive:
+            value = value.lower()
+        if self.match_type != "substring":
+            value = value.strip()
+        if self.match_type == "exact":
+            pattern_index: int = self.exact_patterns.get(value, NO_MATCH)
+        elif self.match_type == "prefix":
+            assert self.prefix_trie is not None
+            pattern_index = self.prefix_trie.find_first_pattern(value)
+        else:
+            assert self.automaton is not None
+            pattern_index = self.automaton.find_first_pattern(value)
+        if pattern_index == NO_MATCH:
+            return NO_MATCH
+        return self.ranks[pattern_index]
+
+
+class IndexedRuleSet:
+    """Classifies transactions with the rules of a single direction."""
+
+    def __init__(self, rules: List[FileRule]) -> None:
+        # The rank of a rule is its position in this list, lowest wins.
+        self.rules: List[FileRule] = sorted(
+            rules, key=lambda rule: (-rule.priority, rule.line_nr)
+        )
+        grouped: Dict[Tuple[str, str, bool], List[int]] = {}
+        for rank, rule in enumerate(self.rules):
+            grouped.setdefault(
+                (rule.field, rule.match_type, rule.case_sensitive), []
+            ).append(rank)
+        self.field_indices: List[FieldIndex] = [
+            FieldIndex(
+                field=field,
+                match_type=match_type,
+                case_sensitive=case_sensitive,
+                patterns=[self.rules[rank].pattern for rank in ranks],
+                ranks=ranks,
+            )
+            for (field, match_type, case_sensitive), ranks in grouped.items()
+        ]
+
+    def match(self, *, tnx_dict: Dict) -> Optional[FileRule]:
+        best: int = NO_MATCH
+        for field_index in self.field_indices:
+            rank: int = field_index.find_first_rank(
+                value=str(tnx_dict.get(field_index.field, ""))
+            )
+            best = AhoCorasickAutomaton.lowest(best, rank)
+        if best == NO_MATCH:
+            return None
+        return self.rules[best]
+
+
+class RuleFileClassifier:
+    """Classifies transactions with the compiled rules of a rule file."""
+
+    def __init__(self, *, rules: List[FileRule], file_hash: str) -> None:
+        self.file_hash: str = file_hash
+        self.rule_sets: Dict[str, IndexedRuleSet] = {
+            transaction_code: IndexedRuleSet(
+                [
+                    rule
+                    for rule in rules
+                    if transaction_code
+                    in DIRECTION_TRANSACTION_CODES[rule.direction]
+                ]
+            )
+            for transaction_code in DIRECTION_TRANSACTION_CODES["any"]
+        }
+
+    def classify(
+        self, *, transaction_code: str, tnx_dict: Dict
+    ) -> Optional[str]:
+        rule_set: Optional[IndexedRuleSet] = self.rule_sets.get(
+            transaction_code
+        )
+        if rule_set is None:
+            return None
+        rule: Optional[FileRule] = rule_set.match(tnx_dict=tnx_dict)
+        if rule is None:
+            return None
+        return rule.category
+
+
+@typechecked
+def parse_rule_file(*, filepath: str) -> List[FileRule]:
+    """Reads the rules from a rule file, and raises a ValueError if a rule is
+    invalid. Empty rows and rows that start with # are skipped."""
+    rules: List[FileRule] = []
+    with open(filepath, encoding="utf-8-sig", newline="") as rule_file:
+        reader = csv.DictReader(rule_file)
+        missing_columns: List[str] = [
+            column
+            for column in REQUIRED_COLUMNS
+            if column not in (reader.fieldnames or [])
+        ]
+        if missing_columns:
+            raise ValueError(
+                f"Rule file: {filepath} misses the columns: {missing_columns}"
+            )
+        for row in reader:
+            values: List[str] = [
+                value.strip()
+                for value in row.values()
+                if isinstance(value, str)
+            ]
+            if not any(values) or (row["field"] or "").startswith("#"):
+                continue
+            rules.append(
+                parse_rule(
+                    row=row,
+                    location=f"{filepath}:{reader.line_num}",
+                    line_nr=reader.line_num,
+                )
+            )
+    return rules
+
+
+@typechecked
+def parse_rule(*, row: Dict, location: str, line_nr: int) -> FileRule:
+    if any(row[column] is None for column in REQUIRED_COLUMNS):
+        raise ValueError(f"{location}: the rule misses columns.")
+    field: str = row["field"].strip()
+    match_type: str = row["match_type"].strip().lower()
+    direction: str = row["direction"].strip().lower()
+    priority: str = (row["priority"] or "").strip()
+    case_sensitive: str = (row.get("case_sensitive") or "").strip().lower()
+    if field not in RULE_FIELDS:
+        raise ValueError(f"{location}: unknown field: {field}")
+    if match_type not in MATCH_TYPES:
+        raise ValueError(f"{location}: unknown match_type: {match_type}")
+    if direction not in DIRECTION_TRANSACTION_CODES:
+        raise ValueError(f"{location}: unknown direction: {direction}")
+    if not row["pattern"] or not row["category"].strip():
+        raise ValueError(f"{location}: the pattern and category are required.")
+    if priority and not priority.lstrip("-").isdigit():
+        raise ValueError(f"{location}: priority is not an integer: {priority}")
+    if case_sensitive not in ["", "true", "false"]:
+        raise ValueError(
+            f"{location}: case_sensitive is not true or false: {case_sensitive}"
+        )
+    return FileRule(
+        field=field,
+        match_type=match_type,
+        pattern=row["pattern"],
+        direction=direction,
+        category=row["category"].strip(),
+        priority=int(priority or 0),
+        case_sensitive=case_sensitive == "true",
+        line_nr=line_nr,
+    )
+
+
+@typechecked
+def get_compiled_rules_path(*, cache_dir: str, file_hash: str) -> str:
+    return f"{cache_dir}/{RULE_FILE_FORMAT_VERSION}-{file_hash}.pickle"
+
+
+@typechecked
+def load_rule_file_classifier(
+    *, filepath: str, cache_dir: Optional[str] = None
+) -> RuleFileClassifier:
+    """Returns the compiled rules of the rule file, from memory or the disk
+    cache if the rule file did not change."""
+    file_hash: str = hash_file(filepath=filepath)
+    if file_hash in _loaded_rule_files:
+        return _loaded_rule_files[file_hash]
+
+    if cache_dir is None:
+        cache_dir = f"{get_cache_dir()}/compiled_rules"
+    compiled_rules_path: str = get_compiled_rules_path(
+        cache_dir=cache_dir, file_hash=file_hash
+    )
+    classifier: Optional[RuleFileClassifier] = None
+    if os.path.isfile(compiled_rules_path):
+        try:
+            with open(compiled_rules_path, "rb") as compiled_rules_file:
+                classifier = pickle.load(compiled_rules_file)  # nosec
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            classifier = None
+    if not isinstance(classifier, RuleFileClassifier):
+        classifier = RuleFileClassifier(
+            rules=parse_rule_file(filepath=filepath), file_hash=file_hash
+        )
+        store_compiled_rules(
+            classifier=classifier, compiled_rules_path=compiled_rules_path
+        )
+    _loaded_rule_files[file_hash] = classifier
+    return classifier
+
+
+@typechecked
+def store_compiled_rules(
+    *, classifier: RuleFileClassifier, compiled_rules_path: str
+) -> None:
+    """Writes the compiled rules atomically, so that parallel workers never
+    read a partially written cache file."""
+    cache_dir: str = os.path.dirname(compiled_rules_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    file_descriptor, tmp_path = tempfile.mkstemp(dir=cache_dir)
+    with os.fdopen(file_descriptor, "wb") as compiled_rules_file:
+        pickle.dump(classifier, compiled_rules_file)
+    os.replace(tmp_path, compiled_rules_path)
@@ -0,0 +1,274 @@
+"""Collects the transactions that no classification rule matches.
+
+Instead of asking for a rule per transaction, which blocks the whole run, the
+logic models classify such transactions as `unclassified`. The collector
+counts them per transaction signature, so a counterparty that occurs a
+hundred times is reviewed once, and writes them to a review file per account
+type directory. After the run, the review file can be worked through in one
+interactive session, which appends the answers to the .csv rule file.
+"""
+
+import csv
+import glob
+import os
+from dataclasses import asdict, dataclass, fields
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from hledger_preprocessor.classification.classifier import (
+    UNCLASSIFIED_CATEGORY,
+    get_transaction_signature,
+)
+from hledger_preprocessor.classification.rule_file import REQUIRED_COLUMNS
+from hledger_preprocessor.parser_logic_structure import Transaction
+from hledger_preprocessor.preprocessing_manifest import locked_manifest
+from hledger_preprocessor.typechecking import typechecked
+
+REVIEW_FILENAME: str = "unclassified_transactions.csv"
+# Maps the transaction codes to the rule file directions.
+TRANSACTION_CODE_DIRECTIONS: Dict[str, str] = {
+    "Debet": "debit",
+    "Credit": "credit",
+}
+
+
+@dataclass
+class UnclassifiedEntry:
+    """The unclassified transactions of an input file with one signature."""
+
+    input_file: str
+    signature: str
+    count: int
+    transaction_code: str
+    other_account: str
+    other_party: str
+    description: str
+
+
+REVIEW_COLUMNS: List[str] = [field.name for field in fields(UnclassifiedEntry)]
+
+
+class UnclassifiedCollector:
+    """Counts the unclassified transactions of an input file per
+    signature."""
+
+    def __init__(self, *, input_file: str) -> None:
+        self.input_file: str = input_file
+        self.entries: Dict[str, UnclassifiedEntry] = {}
+        self.nr_of_transactions: int = 0
+
+    def iter_collected(
+        self, transactions: Iterable[Transaction]
+    ) -> Iterator[Transaction]:
+        """Yields the transactions, and records the unclassified ones."""
+        for transaction in transactions:
+            if is_unclassified(transaction=transaction):
+                self.add(transaction=transaction)
+            yield transaction
+
+    def add(self, *, transaction: Transaction) -> None:
+        self.nr_of_transactions += 1
+        signature: str = get_transaction_signature(transaction=transaction)
+        entry: Optional[UnclassifiedEntry] = self.entries.get(signature)
+        if entry is None:
+            self.entries[signature] = UnclassifiedEntry(
+                input_file=self.input_file,
+                signature=signature,
+                count=1,
+                transaction_code=transaction.transaction_code,
+                other_account=transaction.account1,
+                other_party=transaction.other_party_name,
+                description=transaction.description,
+            )
+        else:
+            entry.count += 1
+
+
+@typechecked
+def is_unclassified(*, transaction: Transaction) -> bool:
+    """Returns True if no logic model found a classification."""
+    classifications: List[Optional[str]] = list(
+        (transaction.logic_classification or {}).values()
+    )
+    return not classifications or all(
+        classification in [None, UNCLASSIFIED_CATEGORY]
+        for classification in classifications
+    )
+
+
+@typechecked
+def get_review_path(*, account_type_path: str) -> str:
+    return f"{account_type_path}/{REVIEW_FILENAME}"
+
+
+@typechecked
+def load_review_file(*, review_path: str) -> List[UnclassifiedEntry]:
+    if not os.path.isfile(review_path):
+        return []
+    with open(review_path, encoding="utf-8", newline="") as review_file:
+        return [
+            UnclassifiedEntry(
+                input_file=row["input_file"],
+                signature=row["signature"],
+                count=int(row["count"]),
+                transaction_code=row["transaction_code"],
+                other_account=row["other_account"],
+                other_party=row["other_party"],
+                description=row["description"],
+            )
+            for row in csv.DictReader(review_file)
+        ]
+
+
+@typechecked
+def update_review_file(
+    *,
+    account_type_path: str,
+    input_file: str,
+    entries: List[UnclassifiedEntry],
+) -> None:
+    """Replaces the entries of the input file in the review file of the
+    account type, and removes the review file once it is empty."""
+    review_path: str = get_review_path(account_type_path=account_type_path)
+    with locked_manifest(account_type_path=account_type_path):
+        review_entries: List[UnclassifiedEntry] = [
+            entry
+            for entry in load_review_file(review_path=review_path)
+            if entry.input_file != input_file
+        ] + entries
+        if not review_entries:
+            if os.path.isfile(review_path):
+                os.remove(review_path)
+            return
+        review_entries.sort(
+            key=lambda entry: (entry.input_file, -entry.count, entry.signature)
+        )
+        with open(
+            f"{review_path}.tmp", mode="w", encoding="utf-8", newline=""
+        ) as review_file:
+            writer = csv.DictWriter(review_file, fieldnames=REVIEW_COLUMNS)
+            writer.writeheader()
+            for entry in review_entries:
+                writer.writerow(asdict(entry))
+        os.replace(f"{review_path}.tmp", review_path)
+
+
+@typechecked
+def get_review_paths(*, start_path: str) -> List[str]:
+    return sorted(glob.glob(f"{start_path}/import/*/*/*/{REVIEW_FILENAME}"))
+
+
+@typechecked
+def merge_review_entries(
+    *, entries: List[UnclassifiedEntry]
+) -> List[UnclassifiedEntry]:
+    """Returns one entry per signature over all input files, with the total
+    count, most frequent first."""
+    merged: Dict[str, UnclassifiedEntry] = {}
+    for entry in entries:
+        if entry.signature in merged:
+            merged[entry.signature].count += entry.count
+        else:
+            merged[entry.signature] = UnclassifiedEntry(**asdict(entry))
+    return sorted(
+        merged.values(), key=lambda entry: (-entry.count, entry.signature)
+    )
+
+
+@typechecked
+def create_rule_row(
+    *, entry: UnclassifiedEntry, category: str
+) -> Dict[str, str]:
+    """Returns a rule file row that matches the counterparty of the entry,
+    or its description if it has no counterparty."""
+    field, pattern = "other_party", entry.other_party.strip()
+    if not pattern:
+        field, pattern = "description", entry.description.strip()
+    return {
+        "field": field,
+        "match_type": "exact",
+        "pattern": pattern,
+        "direction": TRANSACTION_CODE_DIRECTIONS.get(
+            entry.transaction_code, "any"
+        ),
+        "category": category,
+        "priority": "0",
+    }
+
+
+@typechecked
+def get_rule_key(*, row: Dict[str, str]) -> Tuple[str, str, str]:
+    return (row["field"], row["pattern"].lower(), row["direction"])
+
+
+@typechecked
+def append_rules(*, rules_file: str, rows: List[Dict[str, str]]) -> None:
+    write_header: bool = (
+        not os.path.isfile(rules_file) or os.path.getsize(rules_file) == 0
+    )
+    with open(rules_file, mode="a", encoding="utf-8", newline="") as rule_file:
+        writer = csv.DictWriter(rule_file, fieldnames=REQUIRED_COLUMNS)
+        if write_header:
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+@typechecked
+def review_unclassified_transactions(
+    *,
+    start_path: str,
+    rules_file: str,
+    ask: Callable[[str], str] = input,
+) -> int:
+    """Asks a category per unique unclassified transaction, appends the
+    answers to the rule file, and returns the number of added rules."""
+    entries: List[UnclassifiedEntry] = merge_review_entries(
+        entries=[
+            entry
+            for review_path in get_review_paths(start_path=start_path)
+            for entry in load_review_file(review_path=review_path)
+        ]
+    )
+    if not entries:
+        print("There are no unclassified transactions to review.")
+        return 0
+    print(
+        f"Reviewing {len(entries)} unique unclassified transactions, enter a"
+        " category, nothing to skip, or q to stop."
+    )
+    rows: List[Dict[str, str]] = []
+    # The field, pattern and direction of the rules that were added, which
+    # also classify the remaining entries of the same counterparty.
+    answered: Set[Tuple[str, str, str]] = set()
+    for entry in entries:
+        rule_key: Tuple[str, str, str] = get_rule_key(
+            row=create_rule_row(entry=entry, category=UNCLASSIFIED_CATEGORY)
+        )
+        if rule_key in answered:
+            continue
+        print(
+            f"\n{entry.count}x {entry.transaction_code}"
+            f" {entry.other_party!r} ({entry.other_account}):"
+            f" {entry.description!r}"
+        )
+        category: str = ask("Category: ").strip()
+        if category.lower() == "q":
+            break
+        if category:
+            rows.append(create_rule_row(entry=entry, category=category))
+            answered.add(rule_key)
+    if rows:
+        append_rules(rules_file=rules_file, rows=rows)
+        print(
+            f"Added {len(rows)} rules to: {rules_file}, run again to apply"
+            " them."
+        )
+    return len(rows)
@@ -0,0 +1,238 @@
+"""Parses whole Triodos statements into NumPy columns.
+
+For bulk backfills of full account exports, parsing each row separately is
+the bottleneck. With `--columnar`, the statement is read into one array per
+column instead. The dates are parsed into `datetime64[D]` and the amounts
+into int64 cents with vectorized string operations, and the years and the
+order of the transactions per year are computed in bulk. A `Transaction` is
+only created when the classifiers ask for the next transaction, so the
+transactions are never all held in memory as objects.
+
+Rows that do not have the usual layout (e.g. D-M-YYYY dates or amounts
+without 2 decimals) fall back to the row-wise parsers, so the columnar mode
+produces the same transactions as the streaming mode.
+
+NumPy is imported lazily, so that the streaming mode does not need it.
+"""
+
+import contextlib
+import csv
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Union
+
+from hledger_preprocessor.amount import Amount
+from hledger_preprocessor.file_reading_and_writing import open_input_csv
+from hledger_preprocessor.helper import (
+    import_numpy,
+    parse_dd_mm_yyyy_date,
+    parse_european_amount_cents,
+)
+from hledger_preprocessor.profiling import (
+    NULL_PROFILER,
+    NullStageProfiler,
+    StageProfiler,
+)
+from hledger_preprocessor.triodos_logic import TriodosTransaction
+from hledger_preprocessor.typechecking import typechecked
+
+NR_OF_COLUMNS: int = 9
+DATE_COLUMN: int = 0
+AMOUNT_COLUMN: int = 2
+TRANSACTION_CODE_COLUMN: int = 3
+BALANCE_COLUMN: int = 8
+# The positions of YYYY-MM-DD in a DD-MM-YYYY date.
+ISO_DATE_POSITIONS: List[int] = [6, 7, 8, 9, 2, 3, 4, 5, 0, 1]
+
+
+def parse_dates(*, date_strings: Any) -> Any:
+    """Returns the DD-MM-YYYY dates as datetime64[D]."""
+    np = import_numpy(option="--columnar")
+    dates = np.empty(len(date_strings), dtype="datetime64[D]")
+    if not len(date_strings):
+        return dates
+    characters = date_strings.astype("U10").view("U1").reshape(-1, 10)
+    has_fixed_layout = (
+        (np.char.str_len(date_strings) == 10)
+        & (characters[:, 2] == "-")
+        & (characters[:, 5] == "-")
+    )
+    iso_dates = (
+        np.ascontiguousarray(
+            characters[has_fixed_layout][:, ISO_DATE_POSITIONS]
+        )
+        .view("U10")
+        .ravel()
+    )
+    try:
+        dates[has_fixed_layout] = iso_dates.astype("datetime64[D]")
+    except ValueError:
+        # Let the row-wise parser report the invalid date.
+        has_fixed_layout[:] = False
+    for index in np.flatnonzero(~has_fixed_layout):
+        dates[index] = np.datetime64(
+            parse_dd_mm_yyyy_date(str(date_strings[index])).date(), "D"
+        )
+    return dates
+
+
+def parse_amounts(*, amount_strings: Any) -> Any:
+    """Returns the European formatted amounts as int64 cents."""
+    np = import_numpy(option="--columnar")
+    cents = np.empty(len(amount_strings), dtype=np.int64)
+    if not len(amount_strings):
+        return cents
+    has_fixed_layout = (
+        (
+            np.char.rfind(amount_strings, ",")
+            == np.char.str_len(amount_strings) - 3
+        )
+        & (np.char.count(amount_strings, ",") == 1)
+        & (np.char.find(amount_strings, "_") == -1)
+    )
+    digits = np.char.replace(
+        np.char.replace(amount_strings[has_fixed_layout], ".", ""), ",", ""
+    )
+    try:
+        cents[has_fixed_layout] = digits.astype(np.int64)
+    except ValueError:
+        # Let the row-wise parser report the invalid amount.
+        has_fixed_layout[:] = False
+    for index in np.flatnonzero(~has_fixed_layout):
+        cents[index] = parse_european_amount_cents(str(amount_strings[index]))
+    return cents
+
+
+class ColumnarStatement:
+    """The transactions of a statement as columns, in chronological order
+    (from the bottom row to the top row)."""
+
+    def __init__(
+        self,
+        *,
+        rows: List[List[str]],
+        account_holder: str,
+        bank: str,
+        account_type: str,
+    ) -> None:
+        np = import_numpy(option="--columnar")
+        for row in rows:
+            if len(row) != NR_OF_COLUMNS:
+                raise ValueError(
+                    f"Expected {NR_OF_COLUMNS} columns, got {len(row)}: {row}"
+                )
+        self.account_holder: str = account_holder
+        self.bank: str = bank
+        self.account_type: str = account_type
+        # Bank statements list their newest transaction first.
+        rows = rows[::-1]
+        self.dates = parse_dates(
+            date_strings=np.array([row[DATE_COLUMN] for row in rows], dtype=str)
+        )
+        self.amounts = parse_amounts(
+            amount_strings=np.array(
+                [row[AMOUNT_COLUMN] for row in rows], dtype=str
+            )
+        )
+        self.balances = parse_amounts(
+            amount_strings=np.array(
+                [row[BALANCE_COLUMN] for row in rows], dtype=str
+            )
+        )
+        self.years = self.dates.astype("datetime64[Y]").astype(np.int64) + 1970
+        # Each unique date is converted to a datetime once.
+        unique_dates, date_indices = np.unique(self.dates, return_inverse=True)
+        self.date_indices: List[int] = date_indices.tolist()
+        self.unique_datetimes: List[datetime] = [
+            datetime(day.year, day.month, day.day)
+            for day in unique_dates.tolist()
+        ]
+        # The text columns stay Python strings, a fixed width NumPy string
+        # array would pad every description to the longest one.
+        self.rows: List[List[str]] = rows
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def get_transaction(self, index: int) -> TriodosTransaction:
+        row: List[str] = self.rows[index]
+        return TriodosTransaction(
+            account_holder=self.account_holder,
+            bank=self.bank,
+            account_type=self.account_type,
+            nr_in_batch=index + 1,
+            the_date=self.unique_datetimes[self.date_indices[index]],
+            # Intern the values that repeat across rows, to share their memory.
+            account0=sys.intern(row[1]),
+            amount0=Amount(cents=int(self.amounts[index])),
+            transaction_code=sys.intern(row[3]),
+            other_party_name=row[4],
+            account1=row[5],
+            BIC=sys.intern(row[6]),
+            description=row[7],
+            balance0=Amount(cents=int(self.balances[index])),
+        )
+
+    def get_indices_per_year(self) -> Dict[int, Any]:
+        """Returns the indices of the transactions per year, in chronological
+        order of the years and the transactions."""
+        np = import_numpy(option="--columnar")
+        order = np.argsort(self.years, kind="stable")
+        years, starts = np.unique(self.years[order], return_index=True)
+        return {
+            int(year): indices
+            for year, indices in zip(years, np.split(order, starts[1:]))
+        }
+
+    def iter_transactions(self) -> Iterator[TriodosTransaction]:
+        """Yields the transactions per year, and creates each transaction
+        when it is asked for."""
+        for indices in self.get_indices_per_year().values():
+            for index in indices.tolist():
+                yield self.get_transaction(index)
+
+
+@typechecked
+def read_columnar_statement(
+    *,
+    input_csv_filepath: str,
+    account_holder: str,
+    bank: str,
+    account_type: str,
+    profiler: Union[StageProfiler, NullStageProfiler] = NULL_PROFILER,
+) -> ColumnarStatement:
+    with contextlib.ExitStack() as exit_stack:
+        # Opening the file detects its encoding.
+        with profiler.stage("detect"):
+            lines: Iterator[str] = exit_stack.enter_context(
+                open_input_csv(input_csv_filepath=input_csv_filepath)
+            )
+        rows: List[List[str]] = [
+            row
+            for row in csv.reader(profiler.iter_stage("decode", lines))
+            if row
+        ]
+    return ColumnarStatement(
+        rows=rows,
+        account_holder=account_holder,
+        bank=bank,
+        account_type=account_type,
+    )
+
+
+def iter_columnar_transactions(
+    *,
+    input_csv_filepath: str,
+    account_holder: str,
+    bank: str,
+    account_type: str,
+    profiler: Union[StageProfiler, NullStageProfiler] = NULL_PROFILER,
+) -> Iterator[TriodosTransaction]:
+    """Yields the transactions of the input .csv file, parsed in bulk."""
+    yield from read_columnar_statement(
+        input_csv_filepath=input_csv_filepath,
+        account_holder=account_holder,
+        bank=bank,
+        account_type=account_type,
+        profiler=profiler,
+    ).iter_transactions()
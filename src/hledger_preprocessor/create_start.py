@@ -3,7 +3,7 @@ import shutil
 from datetime import datetime
 from typing import Tuple
 
-from typeguard import typechecked
+from hledger_preprocessor.typechecking import typechecked
 
 
 @typechecked
@@ -0,0 +1,163 @@
+"""Runs the preprocessor as a long-lived, local daemon.
+
+hledger-flow calls the `preprocess` and `createRules` scripts once per input
+file. Instead of starting a new Python interpreter (and re-importing and
+re-building the parsers and classification models) for each file, the daemon
+keeps them warm and serves the requests of the `hledger_preprocessor_client`
+over a Unix domain socket. Requests are handled one at a time, because each
+request changes the working directory and redirects the output of the
+process.
+"""
+
+import argparse
+import io
+import json
+import os
+import socketserver
+import sys
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Any, Dict, List, Tuple
+
+from hledger_preprocessor.__main__ import create_models, run
+from hledger_preprocessor.arg_parser import create_arg_parser, verify_args
+from hledger_preprocessor.daemon_client import (
+    daemon_is_running,
+    get_default_socket_path,
+    send_request,
+)
+from hledger_preprocessor.typechecking import typechecked
+
+
+class PreprocessorRequestHandler(socketserver.StreamRequestHandler):
+    """Handles a single JSON request line from a client."""
+
+    def handle(self) -> None:
+        request: Dict[str, Any] = json.loads(self.rfile.readline())
+        daemon: PreprocessorDaemon = self.server  # type: ignore[assignment]
+        response: Dict[str, Any] = daemon.handle_json_request(request=request)
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class PreprocessorDaemon(socketserver.UnixStreamServer):
+    """Unix domain socket server that keeps the classification models
+    warm."""
+
+    def __init__(self, *, socket_path: str) -> None:
+        self.socket_path: str = socket_path
+        self.should_stop: bool = False
+        self.ai_models, self.logic_models = create_models()
+        remove_stale_socket(socket_path=socket_path)
+        # Only allow the current user to connect to the socket.
+        previous_umask: int = os.umask(0o177)
+        try:
+            super().__init__(socket_path, PreprocessorRequestHandler)
+        finally:
+            os.umask(previous_umask)
+
+    def handle_json_request(self, *, request: Dict[str, Any]) -> Dict[str, Any]:
+        command: str = request.get("command", "run")
+        if command == "ping":
+            return {"exit_code": 0, "output": ""}
+        if command == "stop":
+            self.should_stop = True
+            return {"exit_code": 0, "output": "Stopping daemon.\n"}
+        if command == "run":
+            exit_code, output = self.run_cli_args(
+                argv=request["argv"], cwd=request["cwd"]
+            )
+            return {"exit_code": exit_code, "output": output}
+        return {"exit_code": 2, "output": f"Unknown command: {command}\n"}
+
+    def run_cli_args(self, *, argv: List[str], cwd: str) -> Tuple[int, str]:
+        """Runs the preprocessor like `main()` would, from the working
+        directory of the client, and captures its output."""
+        output = io.StringIO()
+        previous_cwd: str = os.getcwd()
+        previous_stdin = sys.stdin
+        # The daemon has no terminal, so prompts read an empty input.
+        sys.stdin = io.StringIO("")
+        exit_code: int = 0
+        try:
+            os.chdir(cwd)
+            with redirect_stdout(output), redirect_stderr(output):
+                try:
+                    args: Any = verify_args(
+                        parser=create_arg_parser(), argv=argv
+                    )
+                    run(
+                        args=args,
+                        ai_models=self.ai_models,
+                        logic_models=self.logic_models,
+                    )
+                except SystemExit as e:
+                    exit_code = e.code if isinstance(e.code, int) else 1
+                except Exception:  # pylint: disable=broad-exception-caught
+                    traceback.print_exc()
+                    exit_code = 1
+        finally:
+            os.chdir(previous_cwd)
+            sys.stdin = previous_stdin
+        return exit_code, output.getvalue()
+
+    def serve_until_stopped(self) -> None:
+        try:
+            while not self.should_stop:
+                self.handle_request()
+        finally:
+            self.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+@typechecked
+def remove_stale_socket(*, socket_path: str) -> None:
+    """Removes the socket file of a daemon that is no longer running."""
+    if daemon_is_running(socket_path=socket_path):
+        raise RuntimeError(f"A daemon is already running at: {socket_path}")
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+
+@typechecked
+def create_daemon_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Keeps the hledger preprocessor warm for the"
+            " hledger_preprocessor_client."
+        )
+    )
+    parser.add_argument(
+        "--socket-path",
+        type=str,
+        default=get_default_socket_path(),
+        help="Path to the Unix domain socket of the daemon.",
+    )
+    parser.add_argument(
+        "--stop",
+        action="store_true",
+        help="Stops the daemon that is running at the socket path.",
+    )
+    return parser
+
+
+@typechecked
+def main() -> None:
+    args: Any = create_daemon_arg_parser().parse_args()
+    if args.stop:
+        response: Dict[str, Any] = send_request(
+            socket_path=args.socket_path, request={"command": "stop"}
+        )
+        print(response["output"], end="")
+        return
+
+    daemon = PreprocessorDaemon(socket_path=args.socket_path)
+    print(f"Serving hledger_preprocessor at: {args.socket_path}")
+    try:
+        daemon.serve_until_stopped()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
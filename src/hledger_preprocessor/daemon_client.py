@@ -0,0 +1,81 @@
+"""Thin client that forwards the CLI args to a running preprocessor daemon.
+
+The client takes exactly the same arguments as `hledger_preprocessor`. It only
+imports the standard library, so that it starts fast. If no daemon is running,
+it falls back to running the preprocessor in the current process.
+"""
+
+import json
+import os
+import socket
+import sys
+from typing import Any, Dict, List, Optional
+
+SOCKET_PATH_ENV_VAR: str = "HLEDGER_PREPROCESSOR_SOCKET"
+SOCKET_FILENAME: str = "hledger_preprocessor.sock"
+
+
+def get_default_socket_path() -> str:
+    """Returns the socket path, which is private to the current user."""
+    if os.environ.get(SOCKET_PATH_ENV_VAR):
+        return os.environ[SOCKET_PATH_ENV_VAR]
+    runtime_dir: Optional[str] = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, SOCKET_FILENAME)
+    return f"/tmp/hledger_preprocessor-{os.getuid()}.sock"  # nosec
+
+
+def send_request(
+    *, socket_path: str, request: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Sends a single JSON request line to the daemon, and returns the JSON
+    response line."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with client.makefile("rb") as response_file:
+            response_line: bytes = response_file.readline()
+    if not response_line:
+        raise ConnectionError(f"No response from daemon at: {socket_path}")
+    return json.loads(response_line)
+
+
+def daemon_is_running(*, socket_path: str) -> bool:
+    if not os.path.exists(socket_path):
+        return False
+    try:
+        send_request(socket_path=socket_path, request={"command": "ping"})
+    except OSError:
+        return False
+    return True
+
+
+def forward_args(*, socket_path: str, argv: List[str]) -> int:
+    """Lets the daemon run the preprocessor with the CLI args, prints its
+    output and returns its exit code."""
+    response: Dict[str, Any] = send_request(
+        socket_path=socket_path,
+        request={"command": "run", "argv": argv, "cwd": os.getcwd()},
+    )
+    sys.stdout.write(response["output"])
+    sys.stdout.flush()
+    return int(response["exit_code"])
+
+
+def main() -> None:
+    socket_path: str = get_default_socket_path()
+    argv: List[str] = sys.argv[1:]
+    try:
+        exit_code: int = forward_args(socket_path=socket_path, argv=argv)
+    except (FileNotFoundError, ConnectionRefusedError):
+        # No daemon is running, so run the preprocessor in this process.
+        # pylint: disable=import-outside-toplevel
+        from hledger_preprocessor.__main__ import main as local_main
+
+        local_main()
+        return
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""Detects transactions that also occur in other input files of an account.
+
+Bank exports overlap, e.g. a quarterly export next to the monthly ones. Each
+account type directory therefore contains an SQLite index of the fingerprints
+(date, amount, direction, counterparty account, description and balance) of
+the transactions of its input files. Before an input file is preprocessed,
+its fingerprints replace the ones it had in the index, and the fingerprints
+that an earlier indexed input file already contains are its duplicates. So a
+new statement is checked against the whole history without reading the older
+statements again, and the statement that was indexed first keeps the shared
+transactions. The index also stores the hash of each input file, so that the
+preprocessing manifest can process a file again once an input file that
+contained its dropped duplicates changed or was deleted.
+
+Indexing the whole input file before it is processed, within one database
+transaction, also makes parallel workers agree on which file keeps a shared
+transaction.
+"""
+
+import csv
+import hashlib
+import os
+import sqlite3
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from hledger_preprocessor.file_reading_and_writing import open_input_csv
+from hledger_preprocessor.helper import (
+    parse_dd_mm_yyyy_date,
+    parse_european_amount_cents,
+)
+from hledger_preprocessor.parser_logic_structure import Transaction
+from hledger_preprocessor.typechecking import typechecked
+
+INDEX_FILENAME: str = "transaction_fingerprints.sqlite"
+DUPLICATE_MODES: List[str] = ["report", "drop", "off"]
+
+
+def get_fingerprint(
+    *,
+    iso_date: str,
+    amount_cents: int,
+    transaction_code: str,
+    other_account: str,
+    description: str,
+    balance_cents: int,
+) -> str:
+    """Returns the hash of the fields that identify a transaction.
+
+    This runs on every row, so it is not typechecked.
+    """
+    return hashlib.blake2b(
+        "\x1f".join(
+            [
+                iso_date,
+                str(amount_cents),
+                transaction_code,
+                other_account.strip(),
+                " ".join(description.split()),
+                str(balance_cents),
+            ]
+        ).encode("utf-8"),
+        digest_size=16,
+    ).hexdigest()
+
+
+def get_transaction_fingerprint(transaction: Transaction) -> str:
+    return get_fingerprint(
+        iso_date=transaction.the_date.strftime("%Y-%m-%d"),
+        amount_cents=transaction.amount0.cents,
+        transaction_code=transaction.transaction_code,
+        other_account=transaction.account1,
+        description=transaction.description,
+        balance_cents=transaction.balance0.cents,
+    )
+
+
+def get_row_fingerprint(row: List[str]) -> str:
+    """Returns the fingerprint of a Triodos row, which equals the fingerprint
+    of the transaction that is parsed from it."""
+    return get_fingerprint(
+        iso_date=parse_dd_mm_yyyy_date(row[0]).strftime("%Y-%m-%d"),
+        amount_cents=parse_european_amount_cents(row[2]),
+        transaction_code=row[3],
+        other_account=row[5],
+        description=row[7],
+        balance_cents=parse_european_amount_cents(row[8]),
+    )
+
+
+@typechecked
+def read_input_fingerprints(*, input_csv_filepath: str) -> Set[str]:
+    with open_input_csv(input_csv_filepath=input_csv_filepath) as lines:
+        return {get_row_fingerprint(row) for row in csv.reader(lines) if row}
+
+
+class FingerprintIndex:
+    """The fingerprints of the transactions of the input files of an account
+    type directory."""
+
+    def __init__(self, *, account_type_path: str) -> None:
+        self.account_type_path: str = account_type_path
+        self.connection = sqlite3.connect(
+            f"{account_type_path}/{INDEX_FILENAME}", timeout=60
+        )
+        with self.connection:
+            # The order of the ids is the order in which the input files were
+            # first indexed.
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS input_files (id INTEGER PRIMARY"
+                " KEY AUTOINCREMENT, input_file TEXT UNIQUE, input_hash TEXT)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints (fingerprint TEXT,"
+                " input_file TEXT, PRIMARY KEY (fingerprint, input_file))"
+                " WITHOUT ROWID"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS fingerprints_per_input_file ON"
+                " fingerprints (input_file)"
+            )
+
+    def __enter__(self) -> "FingerprintIndex":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.connection.close()
+
+    def remove_missing_input_files(self) -> None:
+        """Removes the fingerprints of the input files that were deleted."""
+        input_files: List[str] = [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT input_file FROM input_files"
+            )
+        ]
+        missing_input_files: List[Tuple[str]] = [
+            (input_file,)
+            for input_file in input_files
+            if not os.path.isfile(f"{self.account_type_path}/{input_file}")
+        ]
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM fingerprints WHERE input_file = ?",
+                missing_input_files,
+            )
+            self.connection.executemany(
+                "DELETE FROM input_files WHERE input_file = ?",
+                missing_input_files,
+            )
+
+    def index_input_file(
+        self, *, input_file: str, input_hash: str, fingerprints: Set[str]
+    ) -> Dict[str, str]:
+        """Replaces the fingerprints of the input file, and returns the ones
+        that an earlier indexed input file contains, with that input file."""
+        with self.connection:
+            # Block the other writers until the input file is indexed.
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute(
+                "INSERT OR IGNORE INTO input_files (input_file) VALUES (?)",
+                (input_file,),
+            )
+            self.connection.execute(
+                "UPDATE input_files SET input_hash = ? WHERE input_file = ?",
+                (input_hash, input_file),
+            )
+            self.connection.execute(
+                "DELETE FROM fingerprints WHERE input_file = ?", (input_file,)
+            )
+            self.connection.executemany(
+                "INSERT INTO fingerprints VALUES (?, ?)",
+                [(fingerprint, input_file) for fingerprint in fingerprints],
+            )
+            rows = self.connection.execute(
+                "SELECT own.fingerprint, MIN(other_file.id),"
+                " other_file.input_file FROM fingerprints AS own JOIN"
+                " fingerprints AS other ON other.fingerprint ="
+                " own.fingerprint AND other.input_file != own.input_file"
+                " JOIN input_files AS other_file ON other_file.input_file ="
+                " other.input_file JOIN input_files AS own_file ON"
+                " own_file.input_file = own.input_file WHERE own.input_file ="
+                " ? AND other_file.id < own_file.id GROUP BY own.fingerprint",
+                (input_file,),
+            ).fetchall()
+        return {fingerprint: other_file for fingerprint, _, other_file in rows}
+
+    def get_input_hashes(self, *, input_files: Set[str]) -> Dict[str, str]:
+        """Returns the hash of the input files when they were indexed."""
+        return {
+            input_file: input_hash
+            for input_file, input_hash in self.connection.execute(
+                "SELECT input_file, input_hash FROM input_files"
+            )
+            if input_file in input_files
+        }
+
+
+class DuplicateFilter:
+    """Reports, or drops, the transactions of an input file that an earlier
+    indexed input file already contains."""
+
+    def __init__(
+        self,
+        *,
+        duplicates: Dict[str, str],
+        drop: bool,
+        owner_hashes: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.duplicates: Dict[str, str] = duplicates
+        self.drop: bool = drop
+        # The input hash of each input file that contains the duplicates.
+        self.owner_hashes: Dict[str, str] = owner_hashes or {}
+        self.found: List[Tuple[Transaction, str]] = []
+
+    def iter_filtered(
+        self, transactions: Iterable[Transaction]
+    ) -> Iterator[Transaction]:
+        for transaction in transactions:
+            if self.duplicates:
+                other_file = self.duplicates.get(
+                    get_transaction_fingerprint(transaction)
+                )
+                if other_file is not None:
+                    self.found.append((transaction, other_file))
+                    if self.drop:
+                        continue
+            yield transaction
+
+    def format_report(self, *, input_file: str) -> str:
+        lines: List[str] = [
+            f"{len(self.found)} transactions of {input_file} also occur in"
+            + (" other input files, and were dropped:" if self.drop else ":")
+        ]
+        for transaction, other_file in self.found:
+            lines.append(
+                f"  {transaction.the_date.strftime('%Y-%m-%d')}"
+                f" {transaction.transaction_code} {transaction.amount0}"
+                f" {transaction.other_party_name}: {transaction.description}"
+                f" (also in {other_file})"
+            )
+        return "\n".join(lines)
+
+
+@typechecked
+def create_duplicate_filter(
+    *,
+    account_type_path: str,
+    input_file: str,
+    input_csv_filepath: str,
+    input_hash: str,
+    mode: str,
+) -> DuplicateFilter:
+    """Indexes the input file, and returns the filter of its duplicates."""
+    with FingerprintIndex(account_type_path=account_type_path) as index:
+        index.remove_missing_input_files()
+        duplicates: Dict[str, str] = index.index_input_file(
+            input_file=input_file,
+            input_hash=input_hash,
+            fingerprints=read_input_fingerprints(
+                input_csv_filepath=input_csv_filepath
+            ),
+        )
+        owner_hashes: Dict[str, str] = index.get_input_hashes(
+            input_files=set(duplicates.values())
+        )
+    return DuplicateFilter(
+        duplicates=duplicates, drop=mode == "drop", owner_hashes=owner_hashes
+    )
@@ -3,9 +3,8 @@
 import os
 from argparse import Namespace
 
-from typeguard import typechecked
-
 from hledger_preprocessor.helper import assert_bank_to_account_args_are_valid
+from hledger_preprocessor.typechecking import typechecked
 
 
 @typechecked
@@ -1,9 +1,42 @@
 """Handles file reading and writing."""
 
+import codecs
+import csv
+import hashlib
 import os
+from contextlib import contextmanager
+from types import TracebackType
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Type,
+    Union,
+)
 
 import chardet
-from typeguard import typechecked
+
+from hledger_preprocessor.parser_logic_structure import Transaction
+from hledger_preprocessor.profiling import (
+    NULL_PROFILER,
+    NullStageProfiler,
+    StageProfiler,
+)
+from hledger_preprocessor.typechecking import typechecked
+
+# Number of bytes at the start of a file that are used to detect its encoding.
+ENCODING_SAMPLE_SIZE: int = 64 * 1024
+ENCODING_DETECTION_CHUNK_SIZE: int = 4 * 1024
+# Number of bytes that are decoded at a time.
+DECODING_CHUNK_SIZE: int = 64 * 1024
+
+# Maps the sha256 of a sample to its detected encoding.
+_detected_encodings: Dict[str, str] = {}
 
 
 @typechecked
@@ -17,29 +50,285 @@ def assert_file_exists(*, filepath: str) -> None:
         raise FileNotFoundError(f"File does not exist: {filepath}")
 
 
+@typechecked
+def hash_file(*, filepath: str, chunk_size: int = 1 << 20) -> str:
+    """Returns the sha256 of the file content, read in chunks."""
+    file_hash = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+@typechecked
+def detect_sample_encoding(*, sample: bytes) -> str:
+    """Detects the encoding of a sample of a file, by feeding it to chardet
+    incrementally until chardet is confident.
+
+    The detected encoding only depends on the sample, so it is cached on the
+    hash of the sample.
+    """
+    sample_hash: str = hashlib.sha256(sample).hexdigest()
+    if sample_hash not in _detected_encodings:
+        detector = chardet.UniversalDetector()
+        for start in range(0, len(sample), ENCODING_DETECTION_CHUNK_SIZE):
+            detector.feed(sample[start : start + ENCODING_DETECTION_CHUNK_SIZE])
+            if detector.done:
+                break
+        detector.close()
+        encoding: str = str(detector.result["encoding"] or "utf-8")
+        # Utf-8 decodes ascii identically, and also supports non-ascii
+        # characters beyond the sample.
+        if codecs.lookup(encoding).name == "ascii":
+            encoding = "utf-8"
+        _detected_encodings[sample_hash] = encoding
+    return _detected_encodings[sample_hash]
+
+
+@typechecked
+def clear_encoding_cache() -> None:
+    """Forgets the detected encodings, e.g. to measure the detection."""
+    _detected_encodings.clear()
+
+
 @typechecked
 def detect_file_encoding(file_path: str) -> str:
     with open(file_path, "rb") as file:
-        raw_data = file.read()
-    result = chardet.detect(raw_data)
-    return str(result["encoding"])
+        sample: bytes = file.read(ENCODING_SAMPLE_SIZE)
+    return detect_sample_encoding(sample=sample)
 
 
-@typechecked
-def convert_input_csv_encoding(
-    input_csv_filepath: str, output_encoding: str
-) -> None:
+@contextmanager
+def open_input_csv(*, input_csv_filepath: str) -> Iterator[Iterator[str]]:
+    """Opens the input .csv file as a stream of decoded lines for
+    `csv.reader`.
 
-    detected_encoding = detect_file_encoding(input_csv_filepath)
-    # Read the file with the detected encoding and save it as UTF-8
+    The encoding is detected from the buffered start of the file, without
+    reading it twice. The input file itself is never modified.
+    """
     with open(
-        input_csv_filepath,
-        encoding=detected_encoding,
-        errors="replace",
-    ) as infile:
-        content = infile.read()
+        input_csv_filepath, "rb", buffering=ENCODING_SAMPLE_SIZE
+    ) as binary_file:
+        sample: bytes = binary_file.read(ENCODING_SAMPLE_SIZE)
+        # The sample is still buffered, so seeking back does not read it
+        # again.
+        binary_file.seek(0)
+        yield iter_decoded_lines(
+            binary_file=binary_file,
+            encoding=detect_sample_encoding(sample=sample),
+        )
+
+
+@typechecked
+def get_fallback_encoding(*, sample: bytes, encoding: str) -> str:
+    """Returns the encoding of a part of a file that the detected encoding
+    can not decode, e.g. because its first non-ascii bytes lie beyond the
+    sample the encoding was detected from.
+
+    Falls back to cp1252, the most common encoding of bank exports that are
+    not utf-8.
+    """
+    fallback_encoding: str = detect_sample_encoding(sample=sample)
+    if codecs.lookup(fallback_encoding).name in [
+        codecs.lookup(encoding).name,
+        "utf-8",
+    ]:
+        return "cp1252"
+    try:
+        sample.decode(fallback_encoding)
+    except UnicodeDecodeError:
+        return "cp1252"
+    return fallback_encoding
+
 
+def get_decoding(*, encoding: str) -> str:
+    if codecs.lookup(encoding).name == "utf-8":
+        # Also removes the byte order mark, if the file starts with one.
+        return "utf-8-sig"
+    return encoding
+
+
+def iter_decoded_lines(
+    *,
+    binary_file: BinaryIO,
+    encoding: str,
+    chunk_size: int = DECODING_CHUNK_SIZE,
+) -> Iterator[str]:
+    """Decodes a binary file incrementally, and yields its lines including
+    their line endings.
+
+    Only a single chunk and the last incomplete line are kept in memory, so
+    the memory usage does not depend on the file size. The file is decoded
+    strictly. If a chunk can not be decoded, the rest of the file is decoded
+    with the encoding of that chunk instead.
+    """
+    decoder = codecs.getincrementaldecoder(get_decoding(encoding=encoding))()
+    incomplete_line: str = ""
+    is_first_chunk: bool = True
+    for chunk in iter(lambda: binary_file.read(chunk_size), b""):
+        undecoded_bytes: bytes = decoder.getstate()[0]
+        try:
+            text: str = decoder.decode(chunk)
+        except UnicodeDecodeError:
+            # The incomplete line was decoded, so it encodes to its bytes.
+            chunk = incomplete_line.encode(encoding) + undecoded_bytes + chunk
+            if is_first_chunk and chunk.startswith(codecs.BOM_UTF8):
+                chunk = chunk[len(codecs.BOM_UTF8) :]
+            encoding = get_fallback_encoding(sample=chunk, encoding=encoding)
+            decoder = codecs.getincrementaldecoder(encoding)()
+            incomplete_line = ""
+            text = decoder.decode(chunk)
+        is_first_chunk = False
+        lines: List[str] = (incomplete_line + text).split("\n")
+        incomplete_line = lines.pop()
+        for line in lines:
+            yield f"{line}\n"
+    incomplete_line += decoder.decode(b"", final=True)
+    if incomplete_line:
+        yield incomplete_line
+
+
+@contextmanager
+def open_input_csv_reversed(
+    *, input_csv_filepath: str
+) -> Iterator[Iterator[str]]:
+    """Opens the input .csv file as a stream of decoded lines for
+    `csv.reader`, from the last line to the first line.
+
+    Bank statements list their newest transaction first, so this allows
+    processing the transactions in chronological order without reading the
+    whole file into memory. Quoted fields that span multiple lines can not be
+    parsed in this order, `iter_reversed_rows` falls back to forward parsing
+    for them.
+    """
     with open(
-        input_csv_filepath, mode="w", encoding=output_encoding
-    ) as outfile:
-        outfile.write(content)
+        input_csv_filepath, "rb", buffering=ENCODING_SAMPLE_SIZE
+    ) as binary_file:
+        sample: bytes = binary_file.read(ENCODING_SAMPLE_SIZE)
+        # The sample is still buffered, so seeking back does not read it
+        # again.
+        binary_file.seek(0)
+        yield iter_reversed_lines(
+            binary_file=binary_file,
+            encoding=detect_sample_encoding(sample=sample),
+        )
+
+
+def iter_reversed_lines(
+    *,
+    binary_file: BinaryIO,
+    encoding: str,
+    chunk_size: int = DECODING_CHUNK_SIZE,
+) -> Iterator[str]:
+    """Reads a binary file backwards in chunks, and yields its decoded lines
+    in reverse order, including their line endings.
+
+    Only a single chunk and the last incomplete line are kept in memory. That
+    requires that a newline byte always is a newline character, which holds
+    for utf-8 and the single byte encodings. Other encodings (e.g. utf-16)
+    are decoded forwards, and reversed in memory. The lines are decoded
+    strictly. If a line can not be decoded, it and the lines before it are
+    decoded with the encoding of its chunk instead.
+    """
+    if "\n".encode(encoding) != b"\n":
+        yield from reversed(
+            list(iter_decoded_lines(binary_file=binary_file, encoding=encoding))
+        )
+        return
+
+    position: int = binary_file.seek(0, os.SEEK_END)
+    # The part of a line whose start lies in a chunk that is not read yet.
+    incomplete_line: bytes = b""
+    is_last_line: bool = True
+    while position > 0:
+        read_size: int = min(chunk_size, position)
+        position -= read_size
+        binary_file.seek(position)
+        chunk: bytes = binary_file.read(read_size) + incomplete_line
+        lines: List[bytes] = chunk.split(b"\n")
+        incomplete_line = lines.pop(0)
+        for line in reversed(lines):
+            if is_last_line:
+                # The last line has no line ending.
+                is_last_line = False
+                if not line:
+                    continue
+            else:
+                line += b"\n"
+            try:
+                yield line.decode(get_decoding(encoding=encoding))
+            except UnicodeDecodeError:
+                encoding = get_fallback_encoding(
+                    sample=chunk, encoding=encoding
+                )
+                yield line.decode(encoding)
+    if not is_last_line:
+        incomplete_line += b"\n"
+    if incomplete_line:
+        try:
+            yield incomplete_line.decode(get_decoding(encoding=encoding))
+        except UnicodeDecodeError:
+            encoding = get_fallback_encoding(
+                sample=incomplete_line, encoding=encoding
+            )
+            yield incomplete_line.decode(encoding)
+
+
+class YearRoutedCsvWriter:
+    """Writes each transaction to the pre-processed .csv file of its year.
+
+    The transactions are routed in a single pass, the .csv file of a year is
+    opened when its first transaction arrives.
+    """
+
+    def __init__(
+        self,
+        *,
+        get_output_filepath: Callable[[int], str],
+        profiler: Union[StageProfiler, NullStageProfiler] = NULL_PROFILER,
+    ) -> None:
+        self.get_output_filepath: Callable[[int], str] = get_output_filepath
+        self.profiler: Union[StageProfiler, NullStageProfiler] = profiler
+        self.output_filepaths: Dict[int, str] = {}
+        self.outfiles: Dict[int, TextIO] = {}
+        self.writers: Dict[int, Any] = {}
+
+    def write(self, *, transaction: Transaction) -> None:
+        row: Dict[str, Any] = transaction.to_dict()
+        with self.profiler.stage("partition"):
+            year: int = transaction.get_year()
+            writer = self.writers.get(year)
+        if writer is None:
+            writer = self.open_year(year=year, fieldnames=list(row.keys()))
+        writer.writerow(row)
+
+    def open_year(self, *, year: int, fieldnames: List[str]) -> Any:
+        output_filepath: str = self.get_output_filepath(year)
+        outfile: TextIO = open(  # pylint: disable=consider-using-with
+            output_filepath, mode="w", encoding="utf-8", newline=""
+        )
+        writer = csv.DictWriter(
+            outfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL
+        )
+        writer.writeheader()
+        self.output_filepaths[year] = output_filepath
+        self.outfiles[year] = outfile
+        self.writers[year] = writer
+        return writer
+
+    def close(self) -> None:
+        for outfile in self.outfiles.values():
+            outfile.close()
+        self.outfiles.clear()
+        self.writers.clear()
+
+    def __enter__(self) -> "YearRoutedCsvWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
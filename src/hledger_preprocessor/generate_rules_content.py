@@ -3,9 +3,8 @@ hledger."""
 
 from dataclasses import dataclass
 
-from typeguard import typechecked
-
 from hledger_preprocessor.parser_logic_structure import ParserSettings
+from hledger_preprocessor.typechecking import typechecked
 
 
 @dataclass
@@ -2,8 +2,30 @@
 
 from argparse import Namespace
 from datetime import datetime
+from types import ModuleType
+from typing import Dict
 
-from typeguard import typechecked
+from hledger_preprocessor.typechecking import typechecked
+
+# The number of parsed dates that are memoized, a statement of a few years
+# contains only a few thousand unique dates.
+MAX_NR_OF_PARSED_DATES: int = 1 << 14
+
+# Maps the DD-MM-YYYY date strings to their parsed dates.
+_parsed_dates: Dict[str, datetime] = {}
+
+
+def import_numpy(*, option: str) -> ModuleType:
+    """Imports NumPy on first use, so that only the options that vectorise
+    their work need it."""
+    try:
+        # pylint: disable=import-outside-toplevel
+        import numpy
+    except ImportError as e:
+        raise ImportError(
+            f"{option} requires numpy, install it with: pip install numpy"
+        ) from e
+    return numpy
 
 
 @typechecked
@@ -18,6 +40,69 @@ def parse_date(date_string: str, date_format: str = "%d-%m-%Y") -> datetime:
         ) from e
 
 
+def parse_dd_mm_yyyy_date(date_string: str) -> datetime:
+    """Parses a DD-MM-YYYY date by slicing its fixed layout, and memoizes the
+    result, because the same dates repeat on many rows. Other layouts, like
+    D-M-YYYY, fall back to `parse_date`.
+
+    This runs on every row, so it is not typechecked.
+    """
+    parsed_date = _parsed_dates.get(date_string)
+    if parsed_date is not None:
+        return parsed_date
+    if (
+        len(date_string) == 10
+        and date_string[2] == "-"
+        and date_string[5] == "-"
+        and date_string[:2].isdigit()
+        and date_string[3:5].isdigit()
+        and date_string[6:].isdigit()
+    ):
+        parsed_date = datetime(
+            int(date_string[6:]), int(date_string[3:5]), int(date_string[:2])
+        )
+    else:
+        parsed_date = parse_date(date_string)
+    if len(_parsed_dates) >= MAX_NR_OF_PARSED_DATES:
+        _parsed_dates.clear()
+    _parsed_dates[date_string] = parsed_date
+    return parsed_date
+
+
+def parse_european_amount_cents(amount_string: str) -> int:
+    """Parses a European formatted amount, like -1.234,56, into an exact
+    number of cents.
+
+    This runs on every row, so it is not typechecked.
+    """
+    # Fast path for the common layout with 2 decimals, int() checks the sign
+    # and digits.
+    if (
+        amount_string[-3:-2] == ","
+        and amount_string.count(",") == 1
+        and "_" not in amount_string
+    ):
+        try:
+            return int(amount_string.replace(".", "").replace(",", ""))
+        except ValueError:
+            pass
+    text: str = amount_string.strip()
+    sign: int = 1
+    if text.startswith(("-", "+")):
+        sign = -1 if text[0] == "-" else 1
+        text = text[1:]
+    whole, _, fraction = text.partition(",")
+    whole = whole.replace(".", "")
+    if (
+        not (whole or fraction)
+        or (whole and not whole.isdigit())
+        or (fraction and not fraction.isdigit())
+        or len(fraction) > 2
+    ):
+        raise ValueError(f"Invalid European amount: {amount_string!r}")
+    return sign * (int(whole or "0") * 100 + int(fraction.ljust(2, "0")))
+
+
 @typechecked
 def format_date_to_iso(
     date_string: str,
@@ -2,7 +2,8 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Dict, List, Protocol, Union
 
-from typeguard import typechecked
+from hledger_preprocessor.amount import Amount
+from hledger_preprocessor.typechecking import typechecked
 
 
 class ParserSettings(Protocol):
@@ -13,11 +14,11 @@ class ParserSettings(Protocol):
 
 @dataclass
 class Transaction(Protocol):
-    def to_dict(self) -> Dict[str, Union[int, float, str, datetime]]: ...
+    def to_dict(self) -> Dict[str, Union[int, Amount, str, datetime]]: ...
 
     def to_dict_without_classification(
         self,
-    ) -> Dict[str, Union[int, float, str, datetime]]: ...
+    ) -> Dict[str, Union[int, Amount, str, datetime]]: ...
 
     def get_year(self) -> int: ...
 
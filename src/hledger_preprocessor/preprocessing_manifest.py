@@ -0,0 +1,177 @@
+"""Keeps track of which input files are already preprocessed.
+
+Each account type directory contains a manifest that records, per input file,
+the hash of its content, the parser version, the fingerprint of the
+classification rules, the duplicates mode and the pre-processed output files.
+If none of those changed, and the outputs still exist, the input file is
+skipped. An input file whose duplicates were dropped is also processed again
+once an input file that contained those duplicates changed or was deleted.
+"""
+
+import fcntl
+import hashlib
+import inspect
+import json
+import os
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from types import ModuleType
+from typing import Any, Dict, Iterator, List, Optional
+
+from hledger_preprocessor import __version__
+from hledger_preprocessor.triodos_logic import PARSER_VERSION
+from hledger_preprocessor.typechecking import typechecked
+
+MANIFEST_FILENAME: str = "preprocessing_manifest.json"
+
+
+@dataclass
+class ManifestEntry:
+    input_hash: str
+    parser_version: str
+    rules_fingerprint: str
+    outputs: List[str]
+    duplicates_mode: str = "off"
+    # The input hash of each input file that contained the dropped
+    # duplicates.
+    duplicate_owners: Dict[str, str] = field(default_factory=dict)
+
+
+@typechecked
+def get_parser_version() -> str:
+    return f"{__version__}:{PARSER_VERSION}"
+
+
+@typechecked
+def get_rules_fingerprint(*, models: List, use_ai_models: bool = False) -> str:
+    """Returns a hash of the classification models and their rules.
+
+    Models can provide their own fingerprint through `get_fingerprint()`,
+    otherwise the source code of the module of the model is used.
+    """
+    fingerprint = hashlib.sha256()
+    if use_ai_models:
+        fingerprint.update(b"use_ai_models")
+    for model in models:
+        fingerprint.update(model.name.encode("utf-8"))
+        if hasattr(model, "get_fingerprint"):
+            fingerprint.update(model.get_fingerprint().encode("utf-8"))
+        else:
+            fingerprint.update(get_model_source(model=model).encode("utf-8"))
+    return fingerprint.hexdigest()
+
+
+def get_model_source(*, model: Any) -> str:
+    """Returns the source code of the module of the model, or the name of its
+    class if the source is not available, e.g. for a class that was defined
+    interactively."""
+    module: Optional[ModuleType] = inspect.getmodule(model)
+    if module is not None:
+        try:
+            return inspect.getsource(module)
+        except (OSError, TypeError):
+            pass
+    return f"{type(model).__module__}.{type(model).__qualname__}"
+
+
+@typechecked
+def get_manifest_path(*, account_type_path: str) -> str:
+    return f"{account_type_path}/{MANIFEST_FILENAME}"
+
+
+@typechecked
+def get_manifest_key(*, account_type_path: str, filepath: str) -> str:
+    """Returns the path of a file relative to the account type directory."""
+    return os.path.relpath(
+        os.path.abspath(filepath), os.path.abspath(account_type_path)
+    )
+
+
+@typechecked
+def load_manifest(*, account_type_path: str) -> Dict[str, ManifestEntry]:
+    manifest_path: str = get_manifest_path(account_type_path=account_type_path)
+    if not os.path.isfile(manifest_path):
+        return {}
+    with open(manifest_path, encoding="utf-8") as manifest_file:
+        content: Dict[str, Any] = json.load(manifest_file)
+    return {key: ManifestEntry(**entry) for key, entry in content.items()}
+
+
+@typechecked
+def is_up_to_date(
+    *,
+    account_type_path: str,
+    input_key: str,
+    expected_entry: ManifestEntry,
+) -> bool:
+    """Returns True if the input file was already preprocessed with the same
+    content, parser and rules, and its outputs still exist."""
+    manifest: Dict[str, ManifestEntry] = load_manifest(
+        account_type_path=account_type_path
+    )
+    entry = manifest.get(input_key)
+    if entry is None:
+        return False
+    return (
+        entry.input_hash == expected_entry.input_hash
+        and entry.parser_version == expected_entry.parser_version
+        and entry.rules_fingerprint == expected_entry.rules_fingerprint
+        and entry.duplicates_mode == expected_entry.duplicates_mode
+        and all(
+            os.path.isfile(f"{account_type_path}/{output}")
+            for output in entry.outputs
+        )
+        and all(
+            os.path.isfile(f"{account_type_path}/{owner}")
+            and owner in manifest
+            and manifest[owner].input_hash == owner_hash
+            for owner, owner_hash in entry.duplicate_owners.items()
+        )
+    )
+
+
+@contextmanager
+def locked_manifest(*, account_type_path: str) -> Iterator[None]:
+    """Prevents parallel workers from overwriting each other's updates."""
+    lock_path: str = (
+        f"{get_manifest_path(account_type_path=account_type_path)}.lock"
+    )
+    with open(lock_path, mode="w", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@typechecked
+def update_manifest(
+    *, account_type_path: str, input_key: str, entry: ManifestEntry
+) -> None:
+    """Stores the entry of the input file, and removes the outputs that the
+    input file no longer produces."""
+    with locked_manifest(account_type_path=account_type_path):
+        manifest: Dict[str, ManifestEntry] = load_manifest(
+            account_type_path=account_type_path
+        )
+        previous_entry = manifest.get(input_key)
+        if previous_entry is not None:
+            for output in set(previous_entry.outputs) - set(entry.outputs):
+                stale_output_path: str = f"{account_type_path}/{output}"
+                if os.path.isfile(stale_output_path):
+                    os.remove(stale_output_path)
+        manifest[input_key] = entry
+
+        manifest_path: str = get_manifest_path(
+            account_type_path=account_type_path
+        )
+        with open(
+            f"{manifest_path}.tmp", mode="w", encoding="utf-8"
+        ) as manifest_file:
+            json.dump(
+                {key: asdict(value) for key, value in manifest.items()},
+                manifest_file,
+                indent=2,
+                sort_keys=True,
+            )
+        os.replace(f"{manifest_path}.tmp", manifest_path)
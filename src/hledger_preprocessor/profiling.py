@@ -0,0 +1,254 @@
+"""Measures the wall time, CPU time and peak memory per pipeline stage.
+
+The stages of the pipeline are chained generators, so pulling a transaction
+out of the classifier runs the parser, which runs the decoder. The profiler
+therefore keeps a stack of active stages per thread, and attributes to each
+stage only the time that its nested stages did not use. The peak memory of a
+stage is the peak of the memory that `tracemalloc` traced during the stage,
+relative to the start of the stage, including its nested stages. Memory is
+traced for the whole process, so the peaks of stages that overlap with AI
+classification threads are approximate.
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from hledger_preprocessor.typechecking import typechecked
+
+
+@dataclass
+class StageStats:
+    nr_of_calls: int = 0
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    peak_memory: int = 0
+
+
+@dataclass
+class ActiveStage:
+    name: str
+    start_wall_time: float
+    start_cpu_time: float
+    start_memory: int
+    peak_memory: int
+    # The time used by the nested stages.
+    child_wall_time: float = 0.0
+    child_cpu_time: float = 0.0
+
+
+class NullStageProfiler:
+    """Profiler that measures nothing, used when --profile is off."""
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def stage(self, name: str) -> Any:  # pylint: disable=unused-argument
+        return contextlib.nullcontext()
+
+    def iter_stage(self, name: str, iterable: Iterable) -> Iterable:
+        # pylint: disable=unused-argument
+        return iterable
+
+    def profile_model(self, model: Any) -> Any:
+        return model
+
+
+NULL_PROFILER: NullStageProfiler = NullStageProfiler()
+
+
+class StageProfiler:
+    """Measures the exclusive wall time, CPU time and peak memory of nested
+    stages, and optionally runs cProfile."""
+
+    def __init__(
+        self, *, trace_memory: bool = True, use_cprofile: bool = False
+    ) -> None:
+        self.trace_memory: bool = trace_memory
+        self.stats: Dict[str, StageStats] = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.cprofile: Optional[cProfile.Profile] = (
+            cProfile.Profile() if use_cprofile else None
+        )
+        self.started_tracemalloc: bool = False
+        self.start_wall_time: float = 0.0
+        self.start_cpu_time: float = 0.0
+        self.wall_time: float = 0.0
+        self.cpu_time: float = 0.0
+
+    def __enter__(self) -> "StageProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        self.start_wall_time = time.perf_counter()
+        self.start_cpu_time = time.process_time()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+
+    def stop(self) -> None:
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        self.wall_time = time.perf_counter() - self.start_wall_time
+        self.cpu_time = time.process_time() - self.start_cpu_time
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    def get_active_stages(self) -> List[ActiveStage]:
+        if not hasattr(self.local, "active_stages"):
+            self.local.active_stages = []
+        return self.local.active_stages
+
+    def get_traced_memory(self) -> List[int]:
+        """Returns the current and peak traced memory, and resets the
+        peak."""
+        if not tracemalloc.is_tracing():
+            return [0, 0]
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        return [current, peak]
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        active_stages: List[ActiveStage] = self.get_active_stages()
+        current_memory, peak_memory = self.get_traced_memory()
+        if active_stages:
+            active_stages[-1].peak_memory = max(
+                active_stages[-1].peak_memory, peak_memory
+            )
+        active_stage = ActiveStage(
+            name=name,
+            start_wall_time=time.perf_counter(),
+            start_cpu_time=time.thread_time(),
+            start_memory=current_memory,
+            peak_memory=current_memory,
+        )
+        active_stages.append(active_stage)
+        try:
+            yield
+        finally:
+            wall_time: float = (
+                time.perf_counter() - active_stage.start_wall_time
+            )
+            cpu_time: float = time.thread_time() - active_stage.start_cpu_time
+            active_stages.pop()
+            _, peak_memory = self.get_traced_memory()
+            active_stage.peak_memory = max(
+                active_stage.peak_memory, peak_memory
+            )
+            with self.lock:
+                stats: StageStats = self.stats.setdefault(name, StageStats())
+                stats.nr_of_calls += 1
+                stats.wall_time += wall_time - active_stage.child_wall_time
+                stats.cpu_time += cpu_time - active_stage.child_cpu_time
+                stats.peak_memory = max(
+                    stats.peak_memory,
+                    active_stage.peak_memory - active_stage.start_memory,
+                )
+            if active_stages:
+                parent: ActiveStage = active_stages[-1]
+                parent.child_wall_time += wall_time
+                parent.child_cpu_time += cpu_time
+                parent.peak_memory = max(
+                    parent.peak_memory, active_stage.peak_memory
+                )
+
+    def iter_stage(self, name: str, iterable: Iterable) -> Iterator:
+        """Yields the items of the iterable, and attributes the time it takes
+        to produce each item to the stage."""
+        iterator: Iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item: Any = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def profile_model(self, model: Any) -> "ProfiledModel":
+        return ProfiledModel(model=model, profiler=self)
+
+    def get_report(self, **metadata: Any) -> Dict[str, Any]:
+        return {
+            **metadata,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "stages": {
+                name: asdict(stats)
+                for name, stats in sorted(self.stats.items())
+            },
+        }
+
+    def format_stats(self) -> str:
+        lines: List[str] = [
+            f"{'stage':<32} {'calls':>8} {'wall s':>9} {'cpu s':>9}"
+            f" {'peak MiB':>9}"
+        ]
+        for name, stats in sorted(
+            self.stats.items(), key=lambda item: -item[1].wall_time
+        ):
+            lines.append(
+                f"{name[-32:]:<32} {stats.nr_of_calls:>8}"
+                f" {stats.wall_time:>9.4f} {stats.cpu_time:>9.4f}"
+                f" {stats.peak_memory / 2**20:>9.2f}"
+            )
+        lines.append(
+            f"{'total':<32} {'':>8} {self.wall_time:>9.4f}"
+            f" {self.cpu_time:>9.4f}"
+        )
+        return "\n".join(lines)
+
+
+class ProfiledModel:
+    """Attributes the classifications of a model to the stage:
+    classify:<model name>."""
+
+    def __init__(self, *, model: Any, profiler: StageProfiler) -> None:
+        self.model: Any = model
+        self.profiler: StageProfiler = profiler
+        self.name: str = model.name
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+    def classify(self, transaction: Any) -> Any:
+        with self.profiler.stage(f"classify:{self.name}"):
+            return self.model.classify(transaction=transaction)
+
+    def predict_batch(self, datas: List[Dict]) -> List[Any]:
+        with self.profiler.stage(f"classify:{self.name}"):
+            return self.model.predict_batch(datas)
+
+
+@typechecked
+def write_profile_report(
+    *, profile_dir: str, name: str, profiler: StageProfiler, report: Dict
+) -> str:
+    """Writes the JSON report, and the cProfile statistics if cProfile ran,
+    and returns the path of the report."""
+    os.makedirs(profile_dir, exist_ok=True)
+    report_path: str = (
+        f"{profile_dir}/{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{name}"
+    )
+    with open(f"{report_path}.json", mode="w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2, sort_keys=True)
+    if profiler.cprofile is not None:
+        profiler.cprofile.dump_stats(f"{report_path}.prof")
+    return f"{report_path}.json"
@@ -0,0 +1,132 @@
+"""Parses the transactions of a Triodos input .csv file row by row."""
+
+import contextlib
+import csv
+from typing import Iterable, Iterator, List, Union
+
+from hledger_preprocessor.file_reading_and_writing import (
+    open_input_csv,
+    open_input_csv_reversed,
+)
+from hledger_preprocessor.parser_logic_structure import Transaction
+from hledger_preprocessor.profiling import (
+    NULL_PROFILER,
+    NullStageProfiler,
+    StageProfiler,
+)
+from hledger_preprocessor.triodos_logic import parse_triodos_transaction
+from hledger_preprocessor.typechecking import typechecked
+
+
+@typechecked
+def process_transactions(
+    rows: List[List[str]],
+    account_holder: str,
+    bank: str,
+    account_type: str,
+) -> List[Transaction]:
+    transactions: List[Transaction] = []
+    for index, row in enumerate(
+        reversed(rows), start=1
+    ):  # Process rows from bottom to top
+        transaction = parse_triodos_transaction(
+            row,
+            index,
+            account_holder=account_holder,
+            bank=bank,
+            account_type=account_type,
+        )
+        transactions.append(transaction)
+    return transactions
+
+
+def iter_reversed_rows(
+    *,
+    input_csv_filepath: str,
+    profiler: Union[StageProfiler, NullStageProfiler] = NULL_PROFILER,
+) -> Iterator[List[str]]:
+    """Yields the rows of the input .csv file, from the bottom row to the top
+    row.
+
+    The lines are parsed backwards, one at a time. A line with an odd number
+    of quotes ends a quoted field that spans several lines, which can not be
+    parsed backwards. The remaining rows are then parsed forwards instead,
+    and reversed in memory.
+    """
+    nr_of_rows: int = 0
+    unbalanced_lines: List[str] = []
+
+    def iter_balanced_lines(lines: Iterable[str]) -> Iterator[str]:
+        for line in lines:
+            if line.count('"') % 2:
+                unbalanced_lines.append(line)
+                return
+            yield line
+
+    with contextlib.ExitStack() as exit_stack:
+        # Opening the file detects its encoding.
+        with profiler.stage("detect"):
+            reversed_lines: Iterator[str] = exit_stack.enter_context(
+                open_input_csv_reversed(input_csv_filepath=input_csv_filepath)
+            )
+        for row in csv.reader(
+            iter_balanced_lines(profiler.iter_stage("decode", reversed_lines))
+        ):
+            if row:
+                nr_of_rows += 1
+                yield row
+    if not unbalanced_lines:
+        return
+
+    with open_input_csv(input_csv_filepath=input_csv_filepath) as lines:
+        rows: List[List[str]] = [
+            row
+            for row in csv.reader(profiler.iter_stage("decode", lines))
+            if row
+        ]
+    # The rows below the multi-line field were already yielded.
+    yield from reversed(rows[: len(rows) - nr_of_rows])
+
+
+def iter_input_transactions(
+    *,
+    input_csv_filepath: str,
+    account_holder: str,
+    bank: str,
+    account_type: str,
+    profiler: Union[StageProfiler, NullStageProfiler] = NULL_PROFILER,
+) -> Iterator[Transaction]:
+    """Parses the transactions of the input .csv file one at a time, from the
+    bottom row to the top row."""
+    for index, row in enumerate(
+        iter_reversed_rows(
+            input_csv_filepath=input_csv_filepath, profiler=profiler
+        ),
+        start=1,
+    ):
+        yield parse_triodos_transaction(
+            row,
+            index,
+            account_holder=account_holder,
+            bank=bank,
+            account_type=account_type,
+        )
+
+
+@typechecked
+def parse_encoded_input_csv(
+    input_csv_filepath: str,
+    account_holder: str,
+    bank: str,
+    account_type: str,
+) -> List[Transaction]:
+    transactions: List[Transaction] = list(
+        iter_input_transactions(
+            input_csv_filepath=input_csv_filepath,
+            account_holder=account_holder,
+            bank=bank,
+            account_type=account_type,
+        )
+    )
+
+    return transactions
@@ -1,13 +1,20 @@
 """Contains the logic for preprocessing Triodos .csv files to prepare them for
 hledger."""
 
+import sys
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Dict, List, Optional, Union
 
-from typeguard import typechecked
+from hledger_preprocessor.amount import Amount
+from hledger_preprocessor.helper import (
+    parse_dd_mm_yyyy_date,
+    parse_european_amount_cents,
+)
+from hledger_preprocessor.typechecking import typechecked
 
-from hledger_preprocessor.helper import parse_date
+# Increase when the pre-processed output of the same input changes.
+PARSER_VERSION: str = "2"
 
 
 class TriodosParserSettings:
@@ -34,7 +41,7 @@ class TriodosParserSettings:
         return True
 
 
-@dataclass
+@dataclass(slots=True)
 class TriodosTransaction:
     account_holder: str
     bank: str
@@ -42,26 +49,27 @@ class TriodosTransaction:
     nr_in_batch: int
     the_date: datetime
     account0: str
-    amount0: float
+    amount0: Amount
     transaction_code: str
     other_party_name: str
     account1: str
     BIC: str
     description: str
-    balance0: float
+    balance0: Amount
     ai_classification: Optional[Dict[str, str]] = None
     logic_classification: Optional[Dict[str, str]] = None
 
     @typechecked
-    def to_dict(self) -> Dict[str, Union[int, float, str, datetime]]:
-        base_dict: Dict[str, Union[int, float, str, datetime]] = (
+    def to_dict(self) -> Dict[str, Union[int, Amount, str, datetime]]:
+        base_dict: Dict[str, Union[int, Amount, str, datetime]] = (
             self.to_dict_without_classification()
         )
         if self.ai_classification is not None:
             # TODO: determine how to collapse/select/choose the AI model that is exported.
-            base_dict["ai_classification"] = self.ai_classification[
-                "ExampleAIModel"
-            ]
+            base_dict["ai_classification"] = self.ai_classification.get(
+                "ExampleAIModel",
+                next(iter(self.ai_classification.values()), None),
+            )
         else:
             base_dict["ai_classification"] = None
 
@@ -76,7 +84,7 @@ class TriodosTransaction:
 
     def to_dict_without_classification(
         self,
-    ) -> Dict[str, Union[int, float, str, datetime]]:
+    ) -> Dict[str, Union[int, Amount, str, datetime]]:
         return {
             "nr_in_batch": self.nr_in_batch,
             "account_holder": self.account_holder,
@@ -94,7 +102,7 @@ class TriodosTransaction:
         }
 
     def get_year(self) -> int:
-        return int(self.the_date.strftime("%Y"))
+        return self.the_date.year
 
 
 @typechecked
@@ -124,15 +132,14 @@ def parse_triodos_transaction(
         bank=bank,
         account_type=account_type,
         nr_in_batch=nr_in_batch,
-        the_date=parse_date(date_string),
-        account0=account0,
-        # amount0 = float(amount0.replace(',', '.')),
-        amount0=float(amount0.replace(".", "").replace(",", ".")),
-        transaction_code=transaction_code,
+        the_date=parse_dd_mm_yyyy_date(date_string),
+        # Intern the values that repeat across rows, to share their memory.
+        account0=sys.intern(account0),
+        amount0=Amount(cents=parse_european_amount_cents(amount0)),
+        transaction_code=sys.intern(transaction_code),
         other_party_name=other_party_name,
         account1=account1,
-        BIC=BIC,
+        BIC=sys.intern(BIC),
         description=description,
-        # balance0 = float(balance0.replace(',', '.'))
-        balance0=float(balance0.replace(".", "").replace(",", ".")),
+        balance0=Amount(cents=parse_european_amount_cents(balance0)),
     )
@@ -0,0 +1,41 @@
+"""Provides the `@typechecked` decorator, which can be disabled in production.
+
+typeguard checks every argument and return value of a decorated function on
+every call, including the contents of whole lists of transactions. That is
+useful during development, but costs time on every row in production. Set:
+`HLEDGER_PREPROCESSOR_TYPECHECK=0` before running the preprocessor to disable
+the typeguard instrumentation when the modules are imported.
+"""
+
+import os
+from typing import Any, Callable, TypeVar
+
+TYPECHECK_ENV_VAR: str = "HLEDGER_PREPROCESSOR_TYPECHECK"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def typechecking_is_enabled() -> bool:
+    return os.environ.get(TYPECHECK_ENV_VAR, "1").strip().lower() not in {
+        "0",
+        "false",
+        "no",
+        "off",
+    }
+
+
+def _no_typecheck(func: F) -> F:
+    """Returns the function without typeguard instrumentation."""
+    return func
+
+
+_decorator: Callable[[Any], Any] = _no_typecheck
+if typechecking_is_enabled():
+    from typeguard import typechecked as _decorator
+
+
+def typechecked(func: F) -> F:
+    """Instruments the function with typeguard, unless it is disabled. This
+    only runs when the function is defined, not when it is called."""
+    instrumented_func: F = _decorator(func)
+    return instrumented_func
@@ -0,0 +1,76 @@
+"""Contains the fixtures that several tests share."""
+
+import csv
+import os
+from typing import List
+
+from hledger_preprocessor.triodos_logic import (
+    TriodosTransaction,
+    parse_triodos_transaction,
+)
+
+TRIODOS_ROWS = [
+    [
+        "02-01-2024",
+        "NL12TRIO0123456789",
+        "12,50",
+        "Debet",
+        "Eko Plaza",
+        "NL99INGB0001234567",
+        "BIC",
+        "Groceries",
+        "987,50",
+    ],
+    [
+        "30-12-2023",
+        "NL12TRIO0123456789",
+        "1.000,00",
+        "Credit",
+        "IKEA BV",
+        "NL99INGB0001234567",
+        "BIC",
+        "Refund",
+        "1.000,00",
+    ],
+]
+
+
+def write_statement(*, start_path: str, account: str, filename: str) -> str:
+    year_path: str = f"{start_path}/import/{account}/1-in/2024"
+    os.makedirs(year_path, exist_ok=True)
+    filepath: str = f"{year_path}/{filename}"
+    with open(filepath, mode="w", encoding="utf-8", newline="") as csvfile:
+        csv.writer(csvfile).writerows(TRIODOS_ROWS)
+    return filepath
+
+
+class CountingLogicModel:
+    name = "ExampleLogicModel"
+
+    def __init__(self, *, classification: str = "groceries") -> None:
+        self.classification: str = classification
+        self.nr_of_calls: int = 0
+
+    def classify(self, transaction: TriodosTransaction) -> str:
+        self.nr_of_calls += 1
+        return self.classification
+
+
+def create_transaction(*, date: str, description: str) -> TriodosTransaction:
+    row: List[str] = list(TRIODOS_ROWS[0])
+    row[0] = date
+    row[7] = description
+    return parse_triodos_transaction(
+        row,
+        nr_in_batch=1,
+        account_holder="alice",
+        bank="triodos",
+        account_type="checking",
+    )
+
+
+class EchoLLM:
+    """Stands in for a GPT4All model, and answers with the prompt length."""
+
+    def generate(self, prompt: str) -> str:
+        return f" category:{len(prompt)} "
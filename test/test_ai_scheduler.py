@@ -0,0 +1,198 @@
+"""Tests whether the AI classification runs in batches next to the logic
+classification, and falls back to the logic classification if it is slow."""
+
+import threading
+import time
+import unittest
+from test.helpers import CountingLogicModel, create_transaction
+from typing import Dict, List
+
+from hledger_preprocessor.classification.ai_scheduler import (
+    AIClassificationScheduler,
+)
+from hledger_preprocessor.classification.classifier import (
+    ClassificationCache,
+    iter_classified_transactions,
+)
+from hledger_preprocessor.triodos_logic import TriodosTransaction
+
+
+class BatchCountingAIModel:
+    name = "ExampleAIModel"
+
+    def __init__(self) -> None:
+        self.batch_sizes: List[int] = []
+
+    def predict_batch(self, datas: List[Dict]) -> List[str]:
+        self.batch_sizes.append(len(datas))
+        return [data["description"] for data in datas]
+
+
+class BlockingAIModel(BatchCountingAIModel):
+    """Only answers the batches that contain a description with: fast."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.release = threading.Event()
+
+    def predict_batch(self, datas: List[Dict]) -> List[str]:
+        if not any("fast" in data["description"] for data in datas):
+            self.release.wait()
+        return super().predict_batch(datas)
+
+
+class SlowAIModel(BatchCountingAIModel):
+    """Takes a fixed number of seconds per transaction."""
+
+    def __init__(self, *, seconds_per_transaction: float) -> None:
+        super().__init__()
+        self.seconds_per_transaction: float = seconds_per_transaction
+
+    def predict_batch(self, datas: List[Dict]) -> List[str]:
+        time.sleep(self.seconds_per_transaction * len(datas))
+        return super().predict_batch(datas)
+
+
+class FailingAIModel(BatchCountingAIModel):
+    def predict_batch(self, datas: List[Dict]) -> List[str]:
+        raise RuntimeError("model crashed")
+
+
+def create_transactions(*, descriptions: List[str]) -> List[TriodosTransaction]:
+    return [
+        create_transaction(date="02-01-2024", description=description)
+        for description in descriptions
+    ]
+
+
+class Test_ai_scheduler(unittest.TestCase):
+    """Object used to test the AI classification scheduler."""
+
+    def classify(
+        self,
+        *,
+        ai_model: BatchCountingAIModel,
+        transactions: List[TriodosTransaction],
+        **scheduler_kwargs,
+    ) -> List[TriodosTransaction]:
+        with AIClassificationScheduler(
+            ai_models=[ai_model], **scheduler_kwargs
+        ) as ai_scheduler:
+            classified = list(
+                iter_classified_transactions(
+                    iter(transactions),
+                    [ai_model],
+                    [CountingLogicModel()],
+                    ai_scheduler=ai_scheduler,
+                )
+            )
+        self.ai_scheduler = ai_scheduler
+        return classified
+
+    def test_transactions_are_classified_in_batches_in_order(self):
+        ai_model = BatchCountingAIModel()
+        classified = self.classify(
+            ai_model=ai_model,
+            transactions=create_transactions(
+                descriptions=[f"d{index}" for index in range(7)]
+            ),
+            batch_size=3,
+            max_workers=2,
+            max_in_flight=2,
+        )
+        self.assertEqual(sorted(ai_model.batch_sizes), [1, 3, 3])
+        self.assertEqual(
+            [txn.ai_classification["ExampleAIModel"] for txn in classified],
+            [f"d{index}" for index in range(7)],
+        )
+        self.assertEqual(
+            classified[0].logic_classification,
+            {"ExampleLogicModel": "groceries"},
+        )
+
+    def test_slow_batches_fall_back_to_logic_classification(self):
+        ai_model = BlockingAIModel()
+        cache = ClassificationCache(fingerprint="a")
+        with AIClassificationScheduler(
+            ai_models=[ai_model],
+            batch_size=2,
+            max_workers=2,
+            max_in_flight=1,
+            timeout=0.05,
+        ) as ai_scheduler:
+            classified = list(
+                ai_scheduler.iter_classified_transactions(
+                    create_transactions(
+                        descriptions=["slow a", "slow b", "fast c", "fast d"]
+                    ),
+                    [CountingLogicModel()],
+                    cache=cache,
+                )
+            )
+        ai_model.release.set()
+        self.assertEqual(
+            [txn.ai_classification["ExampleAIModel"] for txn in classified],
+            ["groceries", "groceries", "fast c", "fast d"],
+        )
+        self.assertEqual(ai_scheduler.nr_of_timeouts, 1)
+        # The fallbacks are not memoized, the AI answers are.
+        self.assertEqual(len(cache.entries), 2)
+
+    def test_timeout_starts_when_the_batch_starts(self):
+        # Each batch takes 0.1s of its 0.5s timeout, but the 8th batch in the
+        # queue of the single worker only finishes after 0.8s.
+        ai_model = SlowAIModel(seconds_per_transaction=0.05)
+        classified = self.classify(
+            ai_model=ai_model,
+            transactions=create_transactions(
+                descriptions=[f"d{index}" for index in range(16)]
+            ),
+            batch_size=2,
+            max_workers=1,
+            max_in_flight=8,
+            timeout=0.25,
+        )
+        self.assertEqual(self.ai_scheduler.nr_of_timeouts, 0)
+        self.assertEqual(
+            [txn.ai_classification["ExampleAIModel"] for txn in classified],
+            [f"d{index}" for index in range(16)],
+        )
+
+    def test_later_batches_do_not_wait_for_a_timed_out_model(self):
+        # Each batch gets 0.4s, so waiting for all 10 batches takes 4s.
+        ai_model = BlockingAIModel()
+        start_time: float = time.monotonic()
+        classified = self.classify(
+            ai_model=ai_model,
+            transactions=create_transactions(
+                descriptions=[f"slow {index}" for index in range(40)]
+            ),
+            batch_size=4,
+            max_workers=1,
+            max_in_flight=4,
+            timeout=0.1,
+        )
+        duration: float = time.monotonic() - start_time
+        ai_model.release.set()
+        self.assertLess(duration, 1.0)
+        self.assertEqual(self.ai_scheduler.nr_of_timeouts, 1)
+        self.assertEqual(
+            {txn.ai_classification["ExampleAIModel"] for txn in classified},
+            {"groceries"},
+        )
+        self.assertEqual(len(classified), 40)
+
+    def test_failing_models_fall_back_to_logic_classification(self):
+        classified = self.classify(
+            ai_model=FailingAIModel(),
+            transactions=create_transactions(descriptions=["a", "b"]),
+        )
+        self.assertEqual(
+            [txn.ai_classification["ExampleAIModel"] for txn in classified],
+            ["groceries", "groceries"],
+        )
+        self.assertEqual(self.ai_scheduler.nr_of_failures, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
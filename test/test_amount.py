@@ -0,0 +1,61 @@
+"""Tests whether the amounts are exact, and are written with 2 decimals."""
+
+import csv
+import io
+import unittest
+
+from hledger_preprocessor.amount import Amount
+from hledger_preprocessor.triodos_logic import parse_triodos_transaction
+
+
+class Test_amount(unittest.TestCase):
+    """Object used to test the integer cent amounts."""
+
+    def test_str(self):
+        for cents, expected in [
+            (0, "0.00"),
+            (5, "0.05"),
+            (-5, "-0.05"),
+            (-123456, "-1234.56"),
+            (444300, "4443.00"),
+        ]:
+            with self.subTest(cents=cents):
+                self.assertEqual(str(Amount(cents=cents)), expected)
+
+    def test_arithmetic_is_exact(self):
+        total = Amount(cents=10) + Amount(cents=20)
+        self.assertEqual(total, Amount(cents=30))
+        self.assertEqual(str(total - Amount(cents=31)), "-0.01")
+        self.assertEqual(-total, Amount(cents=-30))
+        with self.assertRaises(ValueError):
+            total + Amount(cents=1, currency="USD")  # pylint: disable=W0106
+
+    def test_csv_output(self):
+        transaction = parse_triodos_transaction(
+            [
+                "01-02-2024",
+                "NL12",
+                "4.443,00",
+                "Debet",
+                "Eko Plaza",
+                "NL34",
+                "BIC",
+                "Groceries",
+                "-0,10",
+            ],
+            1,
+            "alice",
+            "triodos",
+            "checking",
+        )
+        row = transaction.to_dict()
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=list(row.keys()))
+        writer.writerow(row)
+        values = next(csv.DictReader(io.StringIO(output.getvalue()), list(row)))
+        self.assertEqual(values["amount"], "4443.00")
+        self.assertEqual(values["balance"], "-0.10")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+"""Tests whether the LLM is only asked about transactions it did not answer
+before, and whether the stored answers can be pruned and exported."""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from test.helpers import EchoLLM, create_transaction
+from typing import Dict, List
+from unittest import mock
+
+from hledger_preprocessor.cache_dir import CACHE_DIR_ENV_VAR
+from hledger_preprocessor.classification.ai_based.ai_eg0 import ExampleAIModel
+from hledger_preprocessor.classification.ai_based.answer_store import (
+    AnswerStore,
+    get_answer_key,
+    get_answer_store,
+    main,
+)
+from hledger_preprocessor.classification.ai_based.model_pool import (
+    get_model_pool,
+)
+
+
+class CountingLLM(EchoLLM):
+    def __init__(self) -> None:
+        self.prompts: List[str] = []
+
+    def generate(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        return super().generate(prompt)
+
+
+class Test_answer_store(unittest.TestCase):
+    """Object used to test the LLM answer store."""
+
+    def setUp(self):
+        self.tmp_dir: str = tempfile.mkdtemp()
+        self.database_path: str = f"{self.tmp_dir}/answers.sqlite"
+        self.model_filepath: str = f"{self.tmp_dir}/model.gguf"
+        with open(self.model_filepath, "wb") as model_file:
+            model_file.write(b"weights")
+
+    def get_datas(self, *, descriptions: List[str]) -> List[Dict]:
+        return [
+            create_transaction(
+                date=f"{day + 1:02d}-01-2024", description=description
+            ).to_dict_without_classification()
+            for day, description in enumerate(descriptions)
+        ]
+
+    def test_model_is_only_asked_new_transactions(self):
+        llm = CountingLLM()
+        get_model_pool().models[self.model_filepath] = llm
+        ai_model = ExampleAIModel(local_model_filepath=self.model_filepath)
+        try:
+            with mock.patch.dict(os.environ, {CACHE_DIR_ENV_VAR: self.tmp_dir}):
+                answer_store: AnswerStore = get_answer_store()
+                first = ai_model.predict_batch(
+                    self.get_datas(
+                        descriptions=["Huur", "Huur", "Salaris 654321"]
+                    )
+                )
+                # Other dates and reference numbers reuse the answers.
+                second = ai_model.predict_batch(
+                    self.get_datas(
+                        descriptions=["Salaris 123456", "Huur", "Energie"]
+                    )
+                )
+                ai_model.prompt_template_version += "-next"
+                ai_model.predict_batch(self.get_datas(descriptions=["Huur"]))
+        finally:
+            del get_model_pool().models[self.model_filepath]
+        self.assertEqual(first[0], first[1])
+        self.assertEqual(second[:2], [first[2], first[0]])
+        # Huur and Salaris, Energie, and Huur for the new prompt template.
+        self.assertEqual(len(llm.prompts), 4)
+        self.assertEqual((answer_store.lookups, answer_store.hits), (7, 2))
+        # The prompts only contain the fields the answers are keyed on.
+        for prompt in llm.prompts:
+            self.assertNotIn("2024", prompt)
+            self.assertNotIn("amount", prompt)
+
+    def test_model_hash_is_reused_until_the_file_changes(self):
+        answer_store = AnswerStore(database_path=self.database_path)
+        model_hash: str = answer_store.get_model_hash(
+            filepath=self.model_filepath
+        )
+        self.assertEqual(
+            answer_store.get_model_hash(filepath=self.model_filepath),
+            model_hash,
+        )
+        with open(self.model_filepath, "ab") as model_file:
+            model_file.write(b" v2")
+        self.assertNotEqual(
+            answer_store.get_model_hash(filepath=self.model_filepath),
+            model_hash,
+        )
+
+    def test_cli_stats_prune_and_export(self):
+        answer_store = AnswerStore(database_path=self.database_path)
+        for prompt_template_version in ["1", "2"]:
+            answer_store.put_answers(
+                model_hash="m",
+                prompt_template_version=prompt_template_version,
+                answers={
+                    get_answer_key(
+                        model_hash="m",
+                        prompt_template_version=prompt_template_version,
+                        data=data,
+                    ): "rent"
+                    for data in self.get_datas(descriptions=["Huur"])
+                },
+            )
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(["--database-path", self.database_path, "stats"])
+        stats = json.loads(output.getvalue())
+        self.assertEqual(len(stats["answers"]), 2)
+
+        export_path: str = f"{self.tmp_dir}/answers.jsonl"
+        with redirect_stdout(io.StringIO()):
+            main(
+                [
+                    "--database-path",
+                    self.database_path,
+                    "prune",
+                    "--keep-prompt-template-version",
+                    "2",
+                ]
+            )
+            main(
+                [
+                    "--database-path",
+                    self.database_path,
+                    "export",
+                    "--output",
+                    export_path,
+                ]
+            )
+        with open(export_path, encoding="utf-8") as export_file:
+            answers = [json.loads(line) for line in export_file]
+        self.assertEqual(
+            [
+                (answer["prompt_template_version"], answer["answer"])
+                for answer in answers
+            ],
+            [("2", "rent")],
+        )
+        self.assertTrue(os.path.isfile(self.database_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
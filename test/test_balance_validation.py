@@ -0,0 +1,98 @@
+"""Tests whether the balance chain over all statements of an account is
+validated, and whether its breaks are located."""
+
+import csv
+import importlib.util
+import os
+import tempfile
+import unittest
+from typing import Dict, List
+
+from hledger_preprocessor.benchmarking.synthetic_statements import (
+    SyntheticStatementSettings,
+    generate_rows,
+)
+
+NUMPY_IS_INSTALLED: bool = importlib.util.find_spec("numpy") is not None
+
+
+def write_statements(
+    *, start_path: str, rows_per_year: Dict[int, List[List[str]]]
+) -> None:
+    for year, rows in rows_per_year.items():
+        year_path: str = (
+            f"{start_path}/import/alice/triodos/checking/1-in/{year}"
+        )
+        os.makedirs(year_path, exist_ok=True)
+        with open(
+            f"{year_path}/statement.csv", mode="w", encoding="utf-8", newline=""
+        ) as csvfile:
+            csv.writer(csvfile).writerows(rows)
+
+
+def split_on_years(*, rows: List[List[str]]) -> Dict[int, List[List[str]]]:
+    rows_per_year: Dict[int, List[List[str]]] = {}
+    for row in rows:
+        rows_per_year.setdefault(int(row[0][-4:]), []).append(row)
+    return rows_per_year
+
+
+@unittest.skipUnless(NUMPY_IS_INSTALLED, "requires numpy")
+class Test_balance_validation(unittest.TestCase):
+    """Object used to test the running balance validation."""
+
+    def setUp(self):
+        self.start_path: str = tempfile.mkdtemp()
+        self.rows: List[List[str]] = generate_rows(
+            settings=SyntheticStatementSettings(
+                nr_of_rows=400, first_year=2020, nr_of_years=3
+            )
+        )
+
+    def validate(self):
+        # pylint: disable=import-outside-toplevel
+        from hledger_preprocessor.balance_validation import (
+            validate_account_balances,
+        )
+
+        return validate_account_balances(start_path=self.start_path)
+
+    def test_complete_history_has_no_breaks(self):
+        write_statements(
+            start_path=self.start_path,
+            rows_per_year=split_on_years(rows=self.rows),
+        )
+        self.assertEqual(self.validate(), [])
+
+    def test_missing_row_is_located(self):
+        rows_per_year = split_on_years(rows=self.rows)
+        # Remove the row above the 3rd row from the top of 2021, so the 3rd
+        # row from the top no longer follows from the row below it.
+        missing_row: List[str] = rows_per_year[2021].pop(3)
+        write_statements(
+            start_path=self.start_path, rows_per_year=rows_per_year
+        )
+        balance_breaks = self.validate()
+        self.assertEqual(len(balance_breaks), 1)
+        balance_break = balance_breaks[0]
+        self.assertEqual(balance_break.account, "alice:triodos:checking")
+        self.assertTrue(balance_break.input_file.endswith("2021/statement.csv"))
+        self.assertEqual(balance_break.row_nr, 3)
+        sign: str = "-" if missing_row[3] == "Debet" else ""
+        self.assertEqual(
+            str(balance_break.get_difference()),
+            sign + missing_row[2].replace(".", "").replace(",", "."),
+        )
+
+    def test_overlapping_statements_break(self):
+        rows_per_year = split_on_years(rows=self.rows)
+        # The 2021 statement also contains the newest rows of 2020.
+        rows_per_year[2021] = rows_per_year[2021] + rows_per_year[2020][:2]
+        write_statements(
+            start_path=self.start_path, rows_per_year=rows_per_year
+        )
+        self.assertGreater(len(self.validate()), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""Tests whether --all preprocesses the input statements of all accounts."""
+
+import os
+import tempfile
+import unittest
+from test.helpers import write_statement
+from unittest.mock import patch
+
+from hledger_preprocessor import main
+from hledger_preprocessor.batch_processing import get_input_statements
+
+
+class Test_batch_processing(unittest.TestCase):
+    """Object used to test the whole-tree batch mode."""
+
+    def setUp(self):
+        self.start_path: str = tempfile.mkdtemp()
+        write_statement(
+            start_path=self.start_path,
+            account="alice/triodos/checking",
+            filename="a.csv",
+        )
+        write_statement(
+            start_path=self.start_path,
+            account="bob/triodos/savings",
+            filename="b.csv",
+        )
+
+    def test_get_input_statements(self):
+        statements = get_input_statements(start_path=self.start_path)
+        self.assertEqual(
+            [statement.get_account() for statement in statements],
+            ["alice:triodos:checking", "bob:triodos:savings"],
+        )
+
+    def test_all_writes_outputs_and_rules(self):
+        for jobs in ["1", "2"]:
+            cli_args = [
+                "hledger_preprocessor",
+                "--all",
+                "--start-path",
+                self.start_path,
+                "--jobs",
+                jobs,
+            ]
+            with patch("sys.argv", cli_args):
+                main()
+
+            for account, filename in [
+                ("alice/triodos/checking", "a.csv"),
+                ("bob/triodos/savings", "b.csv"),
+            ]:
+                account_path: str = f"{self.start_path}/import/{account}"
+                rules_filename: str = "-".join(account.split("/")[1:])
+                with self.subTest(account=account, jobs=jobs):
+                    self.assertTrue(
+                        os.path.isfile(
+                            f"{account_path}/2-preprocessed/2023/{filename}"
+                        )
+                    )
+                    self.assertTrue(
+                        os.path.isfile(
+                            f"{account_path}/2-preprocessed/2024/{filename}"
+                        )
+                    )
+                    self.assertTrue(
+                        os.path.isfile(f"{account_path}/{rules_filename}.rules")
+                    )
+
+
+if __name__ == "__main__":
+    unittest.main()
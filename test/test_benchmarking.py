@@ -0,0 +1,89 @@
+"""Tests whether the synthetic statements are valid Triodos statements, and
+whether the benchmark suite times every stage and detects regressions."""
+
+import tempfile
+import unittest
+
+from hledger_preprocessor.benchmarking.benchmark_suite import (
+    STAGES,
+    find_regressions,
+    run_benchmarks,
+)
+from hledger_preprocessor.benchmarking.synthetic_statements import (
+    SyntheticStatementSettings,
+    format_european_amount,
+    write_synthetic_statement,
+)
+from hledger_preprocessor.statement_parsing import parse_encoded_input_csv
+
+
+class Test_benchmarking(unittest.TestCase):
+    """Object used to test the benchmark suite."""
+
+    def test_format_european_amount(self):
+        self.assertEqual(
+            format_european_amount(cents=123456789), "1.234.567,89"
+        )
+        self.assertEqual(format_european_amount(cents=-5), "-0,05")
+
+    def test_synthetic_statement_is_parsed(self):
+        for encoding in ["utf-8", "latin-1", "utf-16"]:
+            with self.subTest(encoding=encoding):
+                settings = SyntheticStatementSettings(
+                    nr_of_rows=300,
+                    first_year=2021,
+                    nr_of_years=2,
+                    nr_of_counterparties=5,
+                    encoding=encoding,
+                )
+                filepath: str = f"{tempfile.mkdtemp()}/statement.csv"
+                write_synthetic_statement(filepath=filepath, settings=settings)
+                transactions = parse_encoded_input_csv(
+                    filepath, "alice", "triodos", "checking"
+                )
+                self.assertEqual(len(transactions), 300)
+                self.assertEqual(
+                    {transaction.get_year() for transaction in transactions},
+                    {2021, 2022},
+                )
+                self.assertLessEqual(
+                    len(
+                        {
+                            transaction.other_party_name
+                            for transaction in transactions
+                        }
+                    ),
+                    5,
+                )
+                self.assertIn(
+                    "Bäckerei Müller",
+                    {
+                        transaction.other_party_name
+                        for transaction in transactions
+                    },
+                )
+                # The oldest transaction comes first after parsing.
+                self.assertLessEqual(
+                    transactions[0].the_date, transactions[-1].the_date
+                )
+
+    def test_run_benchmarks_times_all_stages(self):
+        timings = run_benchmarks(
+            settings=SyntheticStatementSettings(nr_of_rows=50),
+            nr_of_rules=20,
+            repeat=1,
+        )
+        self.assertEqual([timing.stage for timing in timings], STAGES)
+        self.assertTrue(all(timing.best > 0 for timing in timings))
+
+    def test_find_regressions(self):
+        baseline = {"stages": {"parse": {"best": 1.0}, "write": {"best": 1.0}}}
+        current = {"stages": {"parse": {"best": 1.5}, "write": {"best": 1.1}}}
+        self.assertEqual(
+            find_regressions(baseline=baseline, current=current, threshold=0.2),
+            ["parse"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
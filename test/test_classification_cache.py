@@ -0,0 +1,147 @@
+"""Tests whether classifications are memoized per normalised transaction
+signature, and invalidated when the models change."""
+
+import tempfile
+import unittest
+from test.helpers import CountingLogicModel, create_transaction
+
+from hledger_preprocessor.classification.classifier import (
+    UNCLASSIFIED_CATEGORY,
+    ClassificationCache,
+    classify_transaction,
+    get_transaction_signature,
+)
+
+
+class Test_classification_cache(unittest.TestCase):
+    """Object used to test the classification cache."""
+
+    def setUp(self):
+        self.database_path: str = f"{tempfile.mkdtemp()}/cache.sqlite"
+
+    def test_signature_ignores_dates_and_references(self):
+        self.assertEqual(
+            get_transaction_signature(
+                transaction=create_transaction(
+                    date="02-01-2024",
+                    description="Betaling 02-01-2024 12:30 ref 123456789",
+                )
+            ),
+            get_transaction_signature(
+                transaction=create_transaction(
+                    date="03-02-2024",
+                    description="betaling  03-02-2024 08:00 ref 987654321",
+                )
+            ),
+        )
+        self.assertNotEqual(
+            get_transaction_signature(
+                transaction=create_transaction(
+                    date="02-01-2024", description="Huur"
+                )
+            ),
+            get_transaction_signature(
+                transaction=create_transaction(
+                    date="02-01-2024", description="Salaris"
+                )
+            ),
+        )
+
+    def test_repeated_transactions_skip_the_models(self):
+        logic_model = CountingLogicModel()
+        cache = ClassificationCache(fingerprint="a", max_entries=2)
+        for day in range(1, 11):
+            transaction = create_transaction(
+                date=f"{day:02d}-01-2024", description=f"Pas 1234{day:02d}"
+            )
+            classify_transaction(transaction, [], [logic_model], cache=cache)
+            self.assertEqual(
+                transaction.logic_classification,
+                {"ExampleLogicModel": "groceries"},
+            )
+        self.assertEqual(logic_model.nr_of_calls, 1)
+        self.assertEqual((cache.hits, cache.misses), (9, 1))
+
+    def test_lru_eviction(self):
+        cache = ClassificationCache(fingerprint="a", max_entries=2)
+        for signature in ["x", "y", "x", "z"]:
+            cache.put(signature=signature, classification=(None, {"m": "c"}))
+        self.assertEqual(list(cache.entries), ["x", "z"])
+
+    def test_unclassified_transactions_are_not_cached(self):
+        for classification in [None, UNCLASSIFIED_CATEGORY]:
+            with self.subTest(classification=classification):
+                logic_model = CountingLogicModel()
+                logic_model.classification = classification
+                cache = ClassificationCache(
+                    fingerprint="a", database_path=self.database_path
+                )
+                for _ in range(2):
+                    classify_transaction(
+                        create_transaction(
+                            date="02-01-2024", description="Unknown"
+                        ),
+                        [],
+                        [logic_model],
+                        cache=cache,
+                    )
+                cache.flush()
+                self.assertEqual(logic_model.nr_of_calls, 2)
+                self.assertEqual(cache.entries, {})
+
+    def test_persistent_tier_is_keyed_on_fingerprint(self):
+        transaction = create_transaction(date="02-01-2024", description="Huur")
+        cache = ClassificationCache(
+            fingerprint="a", database_path=self.database_path
+        )
+        classify_transaction(
+            transaction, [], [CountingLogicModel()], cache=cache
+        )
+        cache.flush()
+
+        # A new process with the same models reads the sqlite file.
+        logic_model = CountingLogicModel(classification="other")
+        classify_transaction(
+            transaction,
+            [],
+            [logic_model],
+            cache=ClassificationCache(
+                fingerprint="a", database_path=self.database_path
+            ),
+        )
+        self.assertEqual(logic_model.nr_of_calls, 0)
+        self.assertEqual(
+            transaction.logic_classification, {"ExampleLogicModel": "groceries"}
+        )
+
+        # Changed rules or models do not use the stored classifications.
+        classify_transaction(
+            transaction,
+            [],
+            [logic_model],
+            cache=ClassificationCache(
+                fingerprint="b", database_path=self.database_path
+            ),
+        )
+        self.assertEqual(logic_model.nr_of_calls, 1)
+        self.assertEqual(
+            transaction.logic_classification, {"ExampleLogicModel": "other"}
+        )
+
+        # The stored classifications of the earlier rules or models are kept.
+        classify_transaction(
+            transaction,
+            [],
+            [logic_model],
+            cache=ClassificationCache(
+                fingerprint="a", database_path=self.database_path
+            ),
+        )
+        self.assertEqual(logic_model.nr_of_calls, 1)
+        self.assertEqual(
+            transaction.logic_classification, {"ExampleLogicModel": "groceries"}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Tests whether the columnar ingestion yields the same transactions as the
+row-wise parser."""
+
+import csv
+import importlib.util
+import tempfile
+import unittest
+
+from hledger_preprocessor.benchmarking.synthetic_statements import (
+    SyntheticStatementSettings,
+    write_synthetic_statement,
+)
+from hledger_preprocessor.statement_parsing import parse_encoded_input_csv
+
+NUMPY_IS_INSTALLED: bool = importlib.util.find_spec("numpy") is not None
+
+
+@unittest.skipUnless(NUMPY_IS_INSTALLED, "requires numpy")
+class Test_columnar_ingestion(unittest.TestCase):
+    """Object used to test the columnar ingestion."""
+
+    def get_sort_key(self, transaction):
+        return (transaction.get_year(), transaction.nr_in_batch)
+
+    def test_same_transactions_as_row_wise_parser(self):
+        # pylint: disable=import-outside-toplevel
+        from hledger_preprocessor.columnar_ingestion import (
+            iter_columnar_transactions,
+        )
+
+        filepath: str = f"{tempfile.mkdtemp()}/statement.csv"
+        write_synthetic_statement(
+            filepath=filepath,
+            settings=SyntheticStatementSettings(
+                nr_of_rows=500, nr_of_years=3, encoding="latin-1"
+            ),
+        )
+        # Rows with a layout that the vectorized parsers do not handle.
+        with open(filepath, mode="a", encoding="latin-1", newline="") as f:
+            csv.writer(f).writerows(
+                [
+                    [
+                        "2-1-2020",
+                        "NL12",
+                        "12",
+                        "Credit",
+                        "Café",
+                        "NL34",
+                        "BIC",
+                        "Short date",
+                        "1.000.012,5",
+                    ]
+                ]
+            )
+        expected = parse_encoded_input_csv(
+            filepath, "alice", "triodos", "checking"
+        )
+        columnar = list(
+            iter_columnar_transactions(
+                input_csv_filepath=filepath,
+                account_holder="alice",
+                bank="triodos",
+                account_type="checking",
+            )
+        )
+        self.assertEqual(len(columnar), 501)
+        self.assertEqual(
+            sorted(columnar, key=self.get_sort_key),
+            sorted(expected, key=self.get_sort_key),
+        )
+        # The transactions are grouped per year, oldest year first.
+        years = [transaction.get_year() for transaction in columnar]
+        self.assertEqual(years, sorted(years))
+
+    def test_invalid_amount_raises(self):
+        # pylint: disable=import-outside-toplevel
+        import numpy
+
+        from hledger_preprocessor.columnar_ingestion import parse_amounts
+
+        with self.assertRaises(ValueError):
+            parse_amounts(amount_strings=numpy.array(["1,00", "1,0x"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
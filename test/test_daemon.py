@@ -0,0 +1,65 @@
+"""Tests whether the daemon runs the CLI args that the client forwards."""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from hledger_preprocessor.daemon import PreprocessorDaemon
+from hledger_preprocessor.daemon_client import (
+    daemon_is_running,
+    forward_args,
+    send_request,
+)
+
+
+class Test_daemon(unittest.TestCase):
+    """Object used to test the daemon and its client over a Unix socket."""
+
+    def setUp(self):
+        self.tmp_dir: str = tempfile.mkdtemp()
+        self.socket_path: str = f"{self.tmp_dir}/test.sock"
+        self.daemon = PreprocessorDaemon(socket_path=self.socket_path)
+        self.thread = threading.Thread(target=self.daemon.serve_until_stopped)
+        self.thread.start()
+
+    def tearDown(self):
+        send_request(socket_path=self.socket_path, request={"command": "stop"})
+        self.thread.join(timeout=10)
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_socket_is_private(self):
+        self.assertTrue(daemon_is_running(socket_path=self.socket_path))
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o077, 0)
+
+    def test_generate_rules_through_daemon(self):
+        account_type_path: str = f"{self.tmp_dir}/import/holder/bank/checking"
+        os.makedirs(account_type_path)
+        exit_code: int = forward_args(
+            socket_path=self.socket_path,
+            argv=[
+                "--start-path",
+                self.tmp_dir,
+                "--generate-rules",
+                "--account-holder",
+                "holder",
+                "--bank",
+                "bank",
+                "--account-type",
+                "checking",
+            ],
+        )
+        self.assertEqual(exit_code, 0)
+        self.assertTrue(
+            os.path.isfile(f"{account_type_path}/bank-checking.rules")
+        )
+
+    def test_invalid_args_return_error_code(self):
+        exit_code: int = forward_args(
+            socket_path=self.socket_path, argv=["--bank", "bank"]
+        )
+        self.assertNotEqual(exit_code, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
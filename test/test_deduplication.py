@@ -0,0 +1,143 @@
+"""Tests whether the transactions that overlapping input files share are
+detected with the fingerprint index, and dropped on request."""
+
+import csv
+import os
+import tempfile
+import unittest
+from test.helpers import TRIODOS_ROWS, write_statement
+from unittest.mock import patch
+
+from hledger_preprocessor import main
+from hledger_preprocessor.deduplication import (
+    INDEX_FILENAME,
+    FingerprintIndex,
+    get_row_fingerprint,
+    get_transaction_fingerprint,
+)
+from hledger_preprocessor.triodos_logic import parse_triodos_transaction
+
+ACCOUNT: str = "alice/triodos/checking"
+
+
+class Test_deduplication(unittest.TestCase):
+    """Object used to test the cross-file duplicate detection."""
+
+    def setUp(self):
+        self.start_path: str = tempfile.mkdtemp()
+        self.account_type_path: str = f"{self.start_path}/import/{ACCOUNT}"
+        write_statement(
+            start_path=self.start_path, account=ACCOUNT, filename="a.csv"
+        )
+
+    def run_all(self, *extra_args: str) -> None:
+        cli_args = [
+            "hledger_preprocessor",
+            "--all",
+            "--start-path",
+            self.start_path,
+            "--jobs",
+            "1",
+            *extra_args,
+        ]
+        with patch("sys.argv", cli_args):
+            main()
+
+    def read_output(self, *, year: int, filename: str):
+        filepath: str = (
+            f"{self.account_type_path}/2-preprocessed/{year}/{filename}"
+        )
+        if not os.path.isfile(filepath):
+            return []
+        with open(filepath, encoding="utf-8", newline="") as csvfile:
+            return list(csv.DictReader(csvfile))
+
+    def test_row_and_transaction_fingerprints_are_equal(self):
+        for row in TRIODOS_ROWS:
+            transaction = parse_triodos_transaction(
+                row, 1, "alice", "triodos", "checking"
+            )
+            self.assertEqual(
+                get_row_fingerprint(row),
+                get_transaction_fingerprint(transaction),
+            )
+
+    def test_earlier_indexed_file_keeps_shared_transactions(self):
+        with FingerprintIndex(
+            account_type_path=self.account_type_path
+        ) as index:
+            self.assertEqual(
+                index.index_input_file(
+                    input_file="a", input_hash="1", fingerprints={"x", "y"}
+                ),
+                {},
+            )
+            self.assertEqual(
+                index.index_input_file(
+                    input_file="b", input_hash="2", fingerprints={"y", "z"}
+                ),
+                {"y": "a"},
+            )
+            # Indexing a file again replaces its own fingerprints, and keeps
+            # the order in which the files were first indexed.
+            self.assertEqual(
+                index.index_input_file(
+                    input_file="a", input_hash="3", fingerprints={"y"}
+                ),
+                {},
+            )
+            self.assertEqual(
+                index.index_input_file(
+                    input_file="b", input_hash="2", fingerprints={"y", "z"}
+                ),
+                {"y": "a"},
+            )
+            self.assertEqual(
+                index.get_input_hashes(input_files={"a"}), {"a": "3"}
+            )
+
+    def test_overlapping_statement_is_deduplicated(self):
+        self.run_all("--duplicates", "report")
+        # A later export that contains the same 2 transactions, and 1 new one.
+        filepath: str = write_statement(
+            start_path=self.start_path, account=ACCOUNT, filename="q.csv"
+        )
+        new_row = list(TRIODOS_ROWS[0])
+        new_row[0] = "03-01-2024"
+        new_row[8] = "975,00"
+        with open(filepath, mode="a", encoding="utf-8", newline="") as csvfile:
+            csv.writer(csvfile).writerow(new_row)
+
+        self.run_all("--duplicates", "report")
+        self.assertEqual(len(self.read_output(year=2024, filename="q.csv")), 2)
+
+        # Switching the mode processes the unchanged input files again.
+        self.run_all("--duplicates", "drop")
+        self.assertEqual(
+            [
+                row["date"]
+                for row in self.read_output(year=2024, filename="q.csv")
+            ],
+            ["2024-01-03"],
+        )
+        self.assertEqual(self.read_output(year=2023, filename="q.csv"), [])
+        # The first statement keeps its transactions when it is reprocessed.
+        self.assertEqual(len(self.read_output(year=2024, filename="a.csv")), 1)
+        self.assertEqual(len(self.read_output(year=2023, filename="a.csv")), 1)
+
+        # Once the first statement is deleted, the later one is processed
+        # again, and keeps them.
+        os.remove(f"{self.account_type_path}/1-in/2024/a.csv")
+        self.run_all("--duplicates", "drop")
+        self.assertEqual(len(self.read_output(year=2024, filename="q.csv")), 2)
+        self.assertEqual(len(self.read_output(year=2023, filename="q.csv")), 1)
+
+    def test_index_is_only_written_when_checking(self):
+        self.run_all()
+        self.assertFalse(
+            os.path.exists(f"{self.account_type_path}/{INDEX_FILENAME}")
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Tests whether the encoding of input files is detected from a sample, and
+whether input files are decoded in a single, streaming read."""
+
+import csv
+import io
+import os
+import tempfile
+import unittest
+
+from hledger_preprocessor import file_reading_and_writing
+from hledger_preprocessor.file_reading_and_writing import (
+    clear_encoding_cache,
+    detect_file_encoding,
+    iter_decoded_lines,
+    open_input_csv,
+    open_input_csv_reversed,
+)
+
+ROWS = [["02-01-2024", "Café de Flore", "12,50"]] * 200
+
+
+def write_csv(*, encoding: str) -> str:
+    filepath: str = f"{tempfile.mkdtemp()}/statement.csv"
+    with open(filepath, mode="w", encoding=encoding, newline="") as csvfile:
+        csv.writer(csvfile).writerows(ROWS)
+    return filepath
+
+
+class Test_encoding_detection(unittest.TestCase):
+    """Object used to test the encoding detection of input files."""
+
+    def test_utf8_file_is_decoded(self):
+        filepath: str = write_csv(encoding="utf-8")
+        self.assertEqual(detect_file_encoding(filepath).lower(), "utf-8")
+        with open_input_csv(input_csv_filepath=filepath) as lines:
+            self.assertEqual(list(csv.reader(lines)), ROWS)
+
+    def test_detection_is_cached_on_sample(self):
+        first_filepath: str = write_csv(encoding="utf-8")
+        second_filepath: str = write_csv(encoding="utf-8")
+        detect_file_encoding(first_filepath)
+        nr_of_cached_encodings: int = len(
+            file_reading_and_writing._detected_encodings
+        )
+        detect_file_encoding(second_filepath)
+        self.assertEqual(
+            len(file_reading_and_writing._detected_encodings),
+            nr_of_cached_encodings,
+        )
+        clear_encoding_cache()
+        self.assertEqual(file_reading_and_writing._detected_encodings, {})
+
+    def test_input_file_is_not_modified(self):
+        filepath: str = write_csv(encoding="cp1252")
+        with open(filepath, "rb") as binary_file:
+            content: bytes = binary_file.read()
+        with open_input_csv(input_csv_filepath=filepath) as lines:
+            list(csv.reader(lines))
+        with open(filepath, "rb") as binary_file:
+            self.assertEqual(binary_file.read(), content)
+
+    def test_decoding_across_chunk_boundaries(self):
+        text: str = "\ufeffCafé,1\r\nCrème brûlée,2\nlast line"
+        for chunk_size in range(1, 8):
+            with self.subTest(chunk_size=chunk_size):
+                lines = list(
+                    iter_decoded_lines(
+                        binary_file=io.BytesIO(text.encode("utf-8")),
+                        encoding="utf-8",
+                        chunk_size=chunk_size,
+                    )
+                )
+                self.assertEqual(
+                    lines, ["Café,1\r\n", "Crème brûlée,2\n", "last line"]
+                )
+
+    def test_non_ascii_bytes_after_the_sample(self):
+        # The sample is ascii, so utf-8 is detected, but the last row is
+        # cp1252.
+        rows = [["02-01-2024", "Albert Heijn", "12,50"]] * 4000 + [
+            ["03-01-2024", "Café Müller", "7,50"]
+        ]
+        filepath: str = f"{tempfile.mkdtemp()}/statement.csv"
+        with open(filepath, mode="w", encoding="cp1252", newline="") as f:
+            csv.writer(f).writerows(rows)
+        self.assertGreater(
+            os.path.getsize(filepath),
+            2 * file_reading_and_writing.ENCODING_SAMPLE_SIZE,
+        )
+        with open_input_csv(input_csv_filepath=filepath) as lines:
+            self.assertEqual(list(csv.reader(lines)), rows)
+        with open_input_csv_reversed(input_csv_filepath=filepath) as lines:
+            self.assertEqual(list(csv.reader(lines)), rows[::-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Tests whether the fast date and amount parsers agree with the `strptime`
+and `float` path."""
+
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from hledger_preprocessor.benchmarking.parsing_benchmark import (
+    run_parsing_benchmark,
+)
+from hledger_preprocessor.benchmarking.synthetic_statements import (
+    SyntheticStatementSettings,
+)
+from hledger_preprocessor.helper import (
+    import_numpy,
+    parse_dd_mm_yyyy_date,
+    parse_european_amount_cents,
+)
+
+
+class Test_helper(unittest.TestCase):
+    """Object used to test the fast parsers."""
+
+    def test_parse_dd_mm_yyyy_date(self):
+        self.assertEqual(
+            parse_dd_mm_yyyy_date("29-02-2024"), datetime(2024, 2, 29)
+        )
+        # Other layouts fall back to strptime.
+        self.assertEqual(
+            parse_dd_mm_yyyy_date("2-1-2024"), datetime(2024, 1, 2)
+        )
+        for invalid_date in ["31-02-2024", "2024-01-02", "ab-cd-efgh"]:
+            with self.subTest(invalid_date=invalid_date):
+                with self.assertRaises(ValueError):
+                    parse_dd_mm_yyyy_date(invalid_date)
+
+    def test_parse_european_amount_cents(self):
+        for amount, cents in [
+            ("1.234.567,89", 123456789),
+            ("-0,05", -5),
+            ("12", 1200),
+            ("12,5", 1250),
+            ("+3,00", 300),
+            (" 7,10 ", 710),
+        ]:
+            with self.subTest(amount=amount):
+                self.assertEqual(parse_european_amount_cents(amount), cents)
+        for invalid_amount in [
+            "",
+            "abc",
+            "1,2,30",
+            "12,345",
+            "1_0,00",
+            "--1,00",
+        ]:
+            with self.subTest(invalid_amount=invalid_amount):
+                with self.assertRaises(ValueError):
+                    parse_european_amount_cents(invalid_amount)
+
+    def test_parsers_agree_on_synthetic_statement(self):
+        results = run_parsing_benchmark(
+            settings=SyntheticStatementSettings(nr_of_rows=500, nr_of_years=2),
+            repeat=1,
+        )
+        self.assertEqual(set(results), {"date", "amount"})
+
+    def test_missing_numpy_names_the_option(self):
+        for option in ["--columnar", "--ai-model nearest_neighbour"]:
+            with self.subTest(option=option):
+                with mock.patch.dict("sys.modules", {"numpy": None}):
+                    with self.assertRaisesRegex(
+                        ImportError,
+                        f"^{option} requires numpy, install it with: pip"
+                        " install numpy$",
+                    ):
+                        import_numpy(option=option)
+
+
+if __name__ == "__main__":
+    unittest.main()
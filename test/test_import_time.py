@@ -0,0 +1,67 @@
+"""Tests whether the bare CLI starts without importing the AI stack, within an
+import-time budget."""
+
+import json
+import os
+import subprocess  # nosec
+import sys
+import unittest
+
+# The heavy (AI) modules may only be imported once a classifier runs.
+HEAVY_MODULES = [
+    "gpt4all",
+    "transformers",
+    "torch",
+    "tensorflow",
+    "fasttext",
+    "numpy",
+]
+
+# Generous upper bound on the bare CLI import time, in seconds.
+IMPORT_TIME_BUDGET_S: float = float(
+    os.environ.get("HLEDGER_PREPROCESSOR_IMPORT_BUDGET_S", "1.0")
+)
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from hledger_preprocessor import main
+import hledger_preprocessor.__main__
+duration = time.perf_counter() - start
+print(json.dumps({"duration": duration, "modules": sorted(sys.modules)}))
+"""
+
+
+class Test_import_time(unittest.TestCase):
+    """Object used to test the import cost of the CLI entry point."""
+
+    def import_cli_in_fresh_interpreter(self) -> dict:
+        completed = subprocess.run(  # nosec
+            [sys.executable, "-c", IMPORT_SCRIPT],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def test_cli_does_not_import_ai_stack(self):
+        result = self.import_cli_in_fresh_interpreter()
+        for heavy_module in HEAVY_MODULES:
+            with self.subTest(module=heavy_module):
+                self.assertNotIn(heavy_module, result["modules"])
+
+    def test_cli_import_time_within_budget(self):
+        # Take the fastest of a few runs to reduce noise from the machine.
+        durations = [
+            self.import_cli_in_fresh_interpreter()["duration"] for _ in range(3)
+        ]
+        self.assertLess(
+            min(durations),
+            IMPORT_TIME_BUDGET_S,
+            f"Bare CLI import took {min(durations):.3f}s, budget is"
+            f" {IMPORT_TIME_BUDGET_S}s.",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
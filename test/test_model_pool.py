@@ -0,0 +1,79 @@
+"""Tests whether the AI models are loaded once, and classify transactions in
+batches."""
+
+import os
+import tempfile
+import unittest
+from test.helpers import EchoLLM, create_transaction
+from typing import List
+from unittest import mock
+
+from hledger_preprocessor.cache_dir import CACHE_DIR_ENV_VAR
+from hledger_preprocessor.classification.ai_based.ai_eg0 import ExampleAIModel
+from hledger_preprocessor.classification.ai_based.model_pool import (
+    ModelPool,
+    get_model_pool,
+)
+
+
+class Test_model_pool(unittest.TestCase):
+    """Object used to test the model pool."""
+
+    def test_models_are_loaded_once(self):
+        model_pool = ModelPool()
+        nr_of_loads: List[int] = []
+        for _ in range(3):
+            model = model_pool.get_model(
+                name="m", load=lambda: nr_of_loads.append(1) or EchoLLM()
+            )
+        self.assertIsInstance(model, EchoLLM)
+        self.assertEqual(len(nr_of_loads), 1)
+        self.assertEqual(model_pool.get_stats(name="m").nr_of_loads, 1)
+
+    def test_batches_are_counted(self):
+        model_pool = ModelPool()
+        for batch in [[1, 2, 3], [4], []]:
+            self.assertEqual(
+                model_pool.run_batch(
+                    name="m",
+                    inputs=batch,
+                    infer=lambda items: [item * 2 for item in items],
+                ),
+                [item * 2 for item in batch],
+            )
+        stats = model_pool.get_stats(name="m")
+        self.assertEqual((stats.nr_of_batches, stats.nr_of_items), (2, 4))
+        self.assertIn("m", model_pool.format_stats())
+        with self.assertRaises(ValueError):
+            model_pool.run_batch(name="m", inputs=[1], infer=lambda items: [])
+
+    def test_example_ai_model_uses_the_pooled_llm(self):
+        tmp_dir: str = tempfile.mkdtemp()
+        local_model_filepath: str = f"{tmp_dir}/model.gguf"
+        with open(local_model_filepath, "wb") as model_file:
+            model_file.write(b"weights")
+        # Put a stand-in for the local LLM in the pool, instead of loading it.
+        get_model_pool().models[local_model_filepath] = EchoLLM()
+        try:
+            with mock.patch.dict(os.environ, {CACHE_DIR_ENV_VAR: tmp_dir}):
+                predictions: List[str] = ExampleAIModel(
+                    local_model_filepath=local_model_filepath
+                ).predict_batch(
+                    [
+                        create_transaction(
+                            date="02-01-2024", description=description
+                        ).to_dict_without_classification()
+                        for description in ["a", "bb"]
+                    ]
+                )
+        finally:
+            del get_model_pool().models[local_model_filepath]
+        self.assertEqual(len(predictions), 2)
+        self.assertTrue(predictions[0].startswith("category:"))
+        self.assertNotEqual(predictions[0], predictions[1])
+        stats = get_model_pool().get_stats(name=local_model_filepath)
+        self.assertEqual((stats.nr_of_batches, stats.nr_of_items), (1, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+"""Tests whether the nearest neighbour model suggests the classification of
+the most similar, previously classified transactions."""
+
+import importlib.util
+import os
+import tempfile
+import unittest
+from test.helpers import write_statement
+from typing import Dict, List
+from unittest.mock import patch
+
+from hledger_preprocessor import main
+
+NUMPY_IS_INSTALLED: bool = importlib.util.find_spec("numpy") is not None
+
+
+def create_data(
+    *, other_party: str, description: str, amount: float, code: str = "Debet"
+) -> Dict:
+    return {
+        "other_party": other_party,
+        "description": description,
+        "amount": amount,
+        "transaction_code": code,
+    }
+
+
+@unittest.skipUnless(NUMPY_IS_INSTALLED, "requires numpy")
+class Test_nearest_neighbour(unittest.TestCase):
+    """Object used to test the nearest neighbour model."""
+
+    def setUp(self):
+        # pylint: disable=import-outside-toplevel
+        from hledger_preprocessor.classification.ai_based import (
+            nearest_neighbour,
+        )
+
+        self.tmp_dir: str = tempfile.mkdtemp()
+        datas: List[Dict] = [
+            create_data(
+                other_party="Albert Heijn 1234",
+                description="Betaalautomaat 02-01-2024",
+                amount=23.5,
+            ),
+            create_data(
+                other_party="Albert Heijn 5678",
+                description="Betaalautomaat 12-03-2024",
+                amount=41.0,
+            ),
+            create_data(
+                other_party="Woonstichting",
+                description="Huur januari",
+                amount=950.0,
+            ),
+            create_data(
+                other_party="Werkgever BV",
+                description="Salaris januari",
+                amount=3100.0,
+                code="Credit",
+            ),
+        ]
+        labels: List[str] = [
+            "groceries:albert_heijn",
+            "groceries:albert_heijn",
+            "house:rent",
+            "income:salary",
+        ]
+        self.index = (
+            nearest_neighbour.NearestNeighbourIndex.from_labelled_transactions(
+                datas=datas, labels=labels
+            )
+        )
+        self.model_class = nearest_neighbour.NearestNeighbourModel
+
+    def test_batch_is_classified_by_similarity(self):
+        model = self.model_class(index=self.index, k=3)
+        self.assertEqual(
+            model.predict_batch(
+                [
+                    create_data(
+                        other_party="Albert Heijn 9999",
+                        description="Betaalautomaat 05-06-2024",
+                        amount=30.0,
+                    ),
+                    create_data(
+                        other_party="Woonstichting",
+                        description="Huur februari",
+                        amount=950.0,
+                    ),
+                    create_data(
+                        other_party="Werkgever BV",
+                        description="Salaris februari",
+                        amount=3100.0,
+                        code="Credit",
+                    ),
+                    create_data(
+                        other_party="Garage Jansen",
+                        description="APK keuring",
+                        amount=80.0,
+                    ),
+                ]
+            ),
+            ["groceries:albert_heijn", "house:rent", "income:salary", None],
+        )
+
+    def test_index_is_persisted(self):
+        index_path: str = f"{self.tmp_dir}/index.npz"
+        self.index.save(index_path=index_path)
+        loaded = type(self.index).load(index_path=index_path)
+        self.assertEqual(loaded.labels, self.index.labels)
+        self.assertEqual(loaded.vectors.tolist(), self.index.vectors.tolist())
+
+    def test_index_is_built_from_preprocessed_files(self):
+        # pylint: disable=import-outside-toplevel
+        from hledger_preprocessor.classification.ai_based import (
+            nearest_neighbour,
+        )
+
+        start_path: str = f"{self.tmp_dir}/finance"
+        write_statement(
+            start_path=start_path,
+            account="alice/triodos/checking",
+            filename="a.csv",
+        )
+        with patch(
+            "sys.argv", ["hledger_preprocessor", "--all", "-s", start_path]
+        ):
+            main()
+        index_path: str = f"{self.tmp_dir}/index.npz"
+        self.assertEqual(
+            nearest_neighbour.build_index(
+                start_path=start_path, index_path=index_path
+            ),
+            2,
+        )
+        model = nearest_neighbour.get_nearest_neighbour_model(
+            index_path=index_path
+        )
+        self.assertEqual(
+            model.predict(
+                create_data(
+                    other_party="Eko Plaza", description="Groceries", amount=9
+                )
+            ),
+            "groceries:eko_plaza",
+        )
+
+        # The model can be used as AI model of the preprocessor.
+        with patch(
+            "sys.argv",
+            [
+                "hledger_preprocessor",
+                "--all",
+                "-s",
+                start_path,
+                "--ai-classification",
+                "--ai-model",
+                "nearest_neighbour",
+                "--nearest-neighbour-index",
+                index_path,
+            ],
+        ):
+            main()
+        output_path: str = (
+            f"{start_path}/import/alice/triodos/checking/2-preprocessed/2024"
+            "/a.csv"
+        )
+        with open(output_path, encoding="utf-8") as output_file:
+            self.assertIn(
+                '"groceries:eko_plaza","groceries:eko_plaza"',
+                output_file.read(),
+            )
+        self.assertTrue(os.path.isfile(index_path))
+
+    def test_unclassified_transactions_are_not_labelled(self):
+        # pylint: disable=import-outside-toplevel
+        from hledger_preprocessor.classification.ai_based import (
+            nearest_neighbour,
+        )
+
+        start_path: str = f"{self.tmp_dir}/finance"
+        output_dir: str = (
+            f"{start_path}/import/alice/triodos/checking/2-preprocessed/2024"
+        )
+        os.makedirs(output_dir)
+        with open(
+            f"{output_dir}/a.csv", mode="w", encoding="utf-8", newline=""
+        ) as output_file:
+            output_file.write(
+                "description,logic_classification\n"
+                "Groceries,groceries:eko_plaza\n"
+                "Unknown,unclassified\n"
+                "Empty,\n"
+            )
+        self.assertEqual(
+            [
+                label
+                for _, label in nearest_neighbour.iter_labelled_transactions(
+                    start_path=start_path
+                )
+            ],
+            ["groceries:eko_plaza"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""Tests whether unchanged input files are skipped, and changed input files
+are preprocessed again."""
+
+import csv
+import os
+import tempfile
+import unittest
+from argparse import Namespace
+from test.helpers import TRIODOS_ROWS, write_statement
+
+from hledger_preprocessor.__main__ import create_models, pre_process_csvs
+from hledger_preprocessor.preprocessing_manifest import get_rules_fingerprint
+
+
+class Test_preprocessing_manifest(unittest.TestCase):
+    """Object used to test the incremental preprocessing."""
+
+    def setUp(self):
+        self.start_path: str = tempfile.mkdtemp()
+        self.input_file: str = write_statement(
+            start_path=self.start_path,
+            account="alice/triodos/checking",
+            filename="a.csv",
+        )
+        self.output_path: str = (
+            f"{self.start_path}/import/alice/triodos/checking/2-preprocessed"
+        )
+        self.ai_models, self.logic_models = create_models()
+
+    def pre_process(self, *, force: bool = False) -> int:
+        args = Namespace(
+            start_path=self.start_path,
+            account_holder="alice",
+            bank="triodos",
+            account_type="checking",
+            input_file=self.input_file,
+            pre_processed_output_dir="2-preprocessed",
+            force=force,
+        )
+        return pre_process_csvs(
+            args=args, ai_models=self.ai_models, logic_models=self.logic_models
+        )
+
+    def test_unchanged_input_is_skipped(self):
+        self.assertEqual(self.pre_process(), 2)
+        self.assertEqual(self.pre_process(), 0)
+        self.assertEqual(self.pre_process(force=True), 2)
+
+    def test_changed_input_removes_stale_outputs(self):
+        self.assertEqual(self.pre_process(), 2)
+        self.assertTrue(os.path.isfile(f"{self.output_path}/2023/a.csv"))
+
+        # Only keep the transaction of 2024.
+        with open(
+            self.input_file, mode="w", encoding="utf-8", newline=""
+        ) as csvfile:
+            csv.writer(csvfile).writerows(TRIODOS_ROWS[:1])
+        self.assertEqual(self.pre_process(), 1)
+        self.assertTrue(os.path.isfile(f"{self.output_path}/2024/a.csv"))
+        self.assertFalse(os.path.isfile(f"{self.output_path}/2023/a.csv"))
+
+    def test_models_without_source_have_a_fingerprint(self):
+        # A class that was defined interactively has no module.
+        model_type = type("InteractiveModel", (), {"name": "interactive"})
+        model_type.__module__ = "not_imported"
+        fingerprint: str = get_rules_fingerprint(models=[model_type()])
+        model_type.__qualname__ = "OtherModel"
+        self.assertNotEqual(
+            get_rules_fingerprint(models=[model_type()]), fingerprint
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Tests whether --profile attributes the time per pipeline stage, and
+writes a JSON report per input file."""
+
+import glob
+import importlib.util
+import json
+import tempfile
+import time
+import unittest
+from test.helpers import write_statement
+from unittest.mock import patch
+
+from hledger_preprocessor import main
+from hledger_preprocessor.profiling import StageProfiler
+
+NUMPY_IS_INSTALLED: bool = importlib.util.find_spec("numpy") is not None
+STAGES = {
+    "detect",
+    "decode",
+    "parse",
+    "classify",
+    "classify:ExampleLogicModel",
+    "partition",
+    "write",
+}
+
+
+class Test_profiling(unittest.TestCase):
+    """Object used to test the stage profiler."""
+
+    def test_nested_stages_are_exclusive(self):
+        with StageProfiler(trace_memory=False) as profiler:
+            with profiler.stage("outer"):
+                time.sleep(0.02)
+                with profiler.stage("inner"):
+                    time.sleep(0.05)
+        self.assertGreaterEqual(profiler.stats["inner"].wall_time, 0.05)
+        self.assertLess(profiler.stats["outer"].wall_time, 0.05)
+        self.assertGreaterEqual(profiler.wall_time, 0.07)
+
+    def test_iter_stage_counts_items(self):
+        profiler = StageProfiler()
+        profiler.start()
+        items = list(
+            profiler.iter_stage(
+                "outer", profiler.iter_stage("inner", [[0] * 1000] * 3)
+            )
+        )
+        profiler.stop()
+        self.assertEqual(len(items), 3)
+        # The final call finds that the iterable is exhausted.
+        self.assertEqual(profiler.stats["inner"].nr_of_calls, 4)
+        self.assertEqual(profiler.stats["outer"].nr_of_calls, 4)
+
+    def run_profile(self, *extra_args: str) -> dict:
+        """Profiles the preprocessing of one statement, and returns its
+        report."""
+        start_path: str = tempfile.mkdtemp()
+        profile_dir: str = tempfile.mkdtemp()
+        write_statement(
+            start_path=start_path,
+            account="alice/triodos/checking",
+            filename="a.csv",
+        )
+        cli_args = [
+            "hledger_preprocessor",
+            "--all",
+            "--start-path",
+            start_path,
+            "--jobs",
+            "1",
+            "--profile",
+            "--cprofile",
+            "--profile-dir",
+            profile_dir,
+            *extra_args,
+        ]
+        with patch("sys.argv", cli_args):
+            main()
+        report_paths = glob.glob(f"{profile_dir}/*.json")
+        self.assertEqual(len(report_paths), 1)
+        self.assertEqual(len(glob.glob(f"{profile_dir}/*.prof")), 1)
+        with open(report_paths[0], encoding="utf-8") as report_file:
+            return json.load(report_file)
+
+    def test_profile_writes_report_per_input_file(self):
+        report = self.run_profile()
+        self.assertEqual(report["account"], "alice:triodos:checking")
+        self.assertEqual(report["nr_of_transactions"], 2)
+        self.assertEqual(set(report["stages"]), STAGES)
+
+    @unittest.skipUnless(NUMPY_IS_INSTALLED, "requires numpy")
+    def test_columnar_profile_has_the_same_stages(self):
+        report = self.run_profile("--columnar")
+        self.assertEqual(report["nr_of_transactions"], 2)
+        self.assertEqual(set(report["stages"]), STAGES)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Tests whether the compiled rule engine classifies like a chain of
+dict_contains_string checks."""
+
+import random
+import time
+import unittest
+from typing import Dict, List, Optional
+
+from typeguard import typechecked
+
+from hledger_preprocessor.classification.helper import dict_contains_string
+from hledger_preprocessor.classification.rule_engine import (
+    CompiledRuleSet,
+    SubstringRule,
+)
+
+
+@typechecked
+def classify_linearly(
+    *, rules: List[SubstringRule], tnx_dict: Dict
+) -> Optional[str]:
+    for rule in rules:
+        if dict_contains_string(
+            d=tnx_dict, substr=rule.substr, case_sensitive=rule.case_sensitive
+        ):
+            return rule.category
+    return None
+
+
+@typechecked
+def generate_rules(*, nr_of_rules: int, seed: int) -> List[SubstringRule]:
+    rng = random.Random(seed)
+    return [
+        SubstringRule(
+            substr="".join(
+                rng.choice("abAB c") for _ in range(rng.randint(1, 4))
+            ),
+            category=f"category:{index}",
+            case_sensitive=rng.random() < 0.3,
+        )
+        for index in range(nr_of_rules)
+    ]
+
+
+class Test_rule_engine(unittest.TestCase):
+    """Object used to test the compiled rule engine."""
+
+    def test_first_matching_rule_wins(self) -> None:
+        rule_set = CompiledRuleSet(
+            [
+                SubstringRule(substr="IKEA BV", category="house:furniture"),
+                SubstringRule(substr="ikea", category="house:other"),
+                SubstringRule(substr="Eko", category="groceries"),
+            ]
+        )
+        self.assertEqual(
+            rule_set.classify(tnx_dict={"other_party": "Eko IKEA bv"}),
+            "house:furniture",
+        )
+        self.assertEqual(
+            rule_set.classify(tnx_dict={"other_party": "IKEA", "x": "EKO"}),
+            "house:other",
+        )
+        self.assertIsNone(rule_set.classify(tnx_dict={"other_party": "Lidl"}))
+
+    def test_patterns_do_not_match_across_fields(self) -> None:
+        rule_set = CompiledRuleSet([SubstringRule(substr="ab", category="ab")])
+        self.assertIsNone(rule_set.classify(tnx_dict={"a": "xa", "b": "bx"}))
+
+    def test_equivalent_to_dict_contains_string(self) -> None:
+        rng = random.Random(0)
+        for seed in range(20):
+            rules = generate_rules(nr_of_rules=rng.randint(0, 30), seed=seed)
+            rule_set = CompiledRuleSet(rules)
+            for _ in range(50):
+                tnx_dict = {
+                    field: "".join(
+                        rng.choice("abAB cd") for _ in range(rng.randint(0, 8))
+                    )
+                    for field in ["other_party", "description", "amount"]
+                }
+                with self.subTest(seed=seed, tnx_dict=tnx_dict):
+                    self.assertEqual(
+                        rule_set.classify(tnx_dict=tnx_dict),
+                        classify_linearly(rules=rules, tnx_dict=tnx_dict),
+                    )
+
+    def test_cost_independent_of_rule_count(self) -> None:
+        tnx_dict = {
+            "other_party": "Some shop without a rule",
+            "description": "Betaling met pas 1234 in Amsterdam",
+        }
+
+        def duration(*, nr_of_rules: int) -> float:
+            rule_set = CompiledRuleSet(
+                [
+                    SubstringRule(substr=f"shop {index}x", category=str(index))
+                    for index in range(nr_of_rules)
+                ]
+            )
+            start = time.perf_counter()
+            for _ in range(200):
+                rule_set.classify(tnx_dict=tnx_dict)
+            return time.perf_counter() - start
+
+        # A linear chain would be 100 times slower, allow for noise.
+        self.assertLess(
+            duration(nr_of_rules=2000), 10 * duration(nr_of_rules=20)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
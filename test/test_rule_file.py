@@ -0,0 +1,161 @@
+"""Tests whether the declarative rule files are compiled, cached and applied
+in priority order."""
+
+import os
+import tempfile
+import unittest
+from test.helpers import TRIODOS_ROWS
+from unittest import mock
+
+from hledger_preprocessor.cache_dir import CACHE_DIR_ENV_VAR
+from hledger_preprocessor.classification import rule_file
+from hledger_preprocessor.classification.logic_based.logic_eg0 import (
+    ExampleLogicModel,
+)
+from hledger_preprocessor.classification.rule_file import (
+    load_rule_file_classifier,
+)
+from hledger_preprocessor.triodos_logic import parse_triodos_transaction
+
+RULE_FILE_CONTENT: str = """field,match_type,pattern,direction,category,priority
+# Comments and empty rows are skipped.
+
+other_account,exact,NL00TRIO0123456789,debit,savings:transfer,10
+other_party,prefix,albert heijn,debit,groceries:albert_heijn,0
+description,substring,salaris,credit,income:salary,0
+description,substring,SALARIS,any,income:salary_any,0
+description,substring,heijn,debit,groceries:other,0
+"""
+
+
+class Test_rule_file(unittest.TestCase):
+    """Object used to test the declarative rule files."""
+
+    def setUp(self):
+        self.tmp_dir: str = tempfile.mkdtemp()
+        self.cache_dir: str = f"{self.tmp_dir}/cache"
+        self.rules_filepath: str = self.write_rule_file(
+            content=RULE_FILE_CONTENT
+        )
+        rule_file._loaded_rule_files.clear()
+
+    def write_rule_file(self, *, content: str) -> str:
+        rules_filepath: str = f"{self.tmp_dir}/rules.csv"
+        with open(rules_filepath, "w", encoding="utf-8") as rules_file:
+            rules_file.write(content)
+        return rules_filepath
+
+    def test_indexes_match_in_priority_order(self):
+        classifier = load_rule_file_classifier(
+            filepath=self.rules_filepath, cache_dir=self.cache_dir
+        )
+        debit = {
+            "other_party": "Albert Heijn 1234",
+            "other_account": "NL00TRIO0123456789",
+            "description": "",
+        }
+        # The exact rule has a higher priority than the prefix rule.
+        self.assertEqual(
+            classifier.classify(transaction_code="Debet", tnx_dict=debit),
+            "savings:transfer",
+        )
+        debit["other_account"] = "NL00TRIO0000000000"
+        self.assertEqual(
+            classifier.classify(transaction_code="Debet", tnx_dict=debit),
+            "groceries:albert_heijn",
+        )
+        # Prefixes only match at the start of the field.
+        debit["other_party"] = "Bij Albert Heijn"
+        self.assertIsNone(
+            classifier.classify(transaction_code="Debet", tnx_dict=debit)
+        )
+        # Same priority, so the first rule in the file wins.
+        credit = {"description": "Salaris januari"}
+        self.assertEqual(
+            classifier.classify(transaction_code="Credit", tnx_dict=credit),
+            "income:salary",
+        )
+        self.assertEqual(
+            classifier.classify(transaction_code="Debet", tnx_dict=credit),
+            "income:salary_any",
+        )
+
+    def test_compiled_rules_are_cached_on_disk(self):
+        load_rule_file_classifier(
+            filepath=self.rules_filepath, cache_dir=self.cache_dir
+        )
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        # A new process loads the compiled rules instead of parsing the file.
+        rule_file._loaded_rule_files.clear()
+        with mock.patch.object(
+            rule_file, "parse_rule_file", side_effect=AssertionError
+        ):
+            classifier = load_rule_file_classifier(
+                filepath=self.rules_filepath, cache_dir=self.cache_dir
+            )
+        self.assertEqual(
+            classifier.classify(
+                transaction_code="Credit", tnx_dict={"description": "salaris"}
+            ),
+            "income:salary",
+        )
+
+        # A changed rule file is compiled again.
+        self.write_rule_file(
+            content=RULE_FILE_CONTENT.replace("income:salary,", "income:pay,")
+        )
+        classifier = load_rule_file_classifier(
+            filepath=self.rules_filepath, cache_dir=self.cache_dir
+        )
+        self.assertEqual(
+            classifier.classify(
+                transaction_code="Credit", tnx_dict={"description": "salaris"}
+            ),
+            "income:pay",
+        )
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_invalid_rules_are_rejected(self):
+        self.write_rule_file(
+            content=(
+                "field,match_type,pattern,direction,category,priority\n"
+                "other_party,regex,IKEA,debit,house,0\n"
+            )
+        )
+        with self.assertRaisesRegex(ValueError, "rules.csv:2.*regex"):
+            load_rule_file_classifier(
+                filepath=self.rules_filepath, cache_dir=self.cache_dir
+            )
+
+    def test_logic_model_consults_rule_file_first(self):
+        with mock.patch.dict(os.environ, {CACHE_DIR_ENV_VAR: self.cache_dir}):
+            logic_model = ExampleLogicModel()
+            fingerprint: str = logic_model.get_fingerprint()
+            self.write_rule_file(
+                content=(
+                    "field,match_type,pattern,direction,category,priority\n"
+                    "other_party,exact,eko plaza,debit,groceries:from_file,0\n"
+                )
+            )
+            logic_model.use_rules_file(filepath=self.rules_filepath)
+        self.assertNotEqual(logic_model.get_fingerprint(), fingerprint)
+        transaction = parse_triodos_transaction(
+            TRIODOS_ROWS[0],
+            nr_in_batch=1,
+            account_holder="alice",
+            bank="triodos",
+            account_type="checking",
+        )
+        self.assertEqual(
+            logic_model.classify(transaction=transaction), "groceries:from_file"
+        )
+        logic_model.use_rules_file(filepath=None)
+        self.assertEqual(logic_model.get_fingerprint(), fingerprint)
+        self.assertEqual(
+            logic_model.classify(transaction=transaction), "groceries:eko_plaza"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""Tests whether the streaming pipeline parses the transactions in the same
+order as parsing all rows in memory."""
+
+import csv
+import io
+import random
+import tempfile
+import unittest
+from test.helpers import TRIODOS_ROWS, write_statement
+
+from hledger_preprocessor.file_reading_and_writing import (
+    iter_decoded_lines,
+    iter_reversed_lines,
+)
+from hledger_preprocessor.statement_parsing import (
+    iter_input_transactions,
+    process_transactions,
+)
+
+
+class Test_streaming_pipeline(unittest.TestCase):
+    """Object used to test the streaming reader and pipeline."""
+
+    def test_reversed_lines_match_forward_lines(self):
+        random.seed(42)
+        texts = ["", "\n", "a", "a\nb", "a\r\nbé\r\n", "x\ny\n\nz"] + [
+            "".join(random.choices("ab\né,", k=random.randint(0, 40)))
+            for _ in range(100)
+        ]
+        for text in texts:
+            for encoding in ["utf-8", "cp1252", "utf-16"]:
+                for chunk_size in [1, 2, 3, 7]:
+                    with self.subTest(
+                        text=text, encoding=encoding, chunk_size=chunk_size
+                    ):
+                        forward_lines = list(
+                            iter_decoded_lines(
+                                binary_file=io.BytesIO(text.encode(encoding)),
+                                encoding=encoding,
+                                chunk_size=chunk_size,
+                            )
+                        )
+                        reversed_lines = list(
+                            iter_reversed_lines(
+                                binary_file=io.BytesIO(text.encode(encoding)),
+                                encoding=encoding,
+                                chunk_size=chunk_size,
+                            )
+                        )
+                        self.assertEqual(reversed_lines, forward_lines[::-1])
+
+    def test_streamed_transactions_match_in_memory_transactions(self):
+        input_file: str = write_statement(
+            start_path=tempfile.mkdtemp(),
+            account="alice/triodos/checking",
+            filename="a.csv",
+        )
+        with open(input_file, encoding="utf-8", newline="") as infile:
+            rows = list(csv.reader(infile))
+        account_kwargs = {
+            "account_holder": "alice",
+            "bank": "triodos",
+            "account_type": "checking",
+        }
+        self.assertEqual(
+            list(
+                iter_input_transactions(
+                    input_csv_filepath=input_file, **account_kwargs
+                )
+            ),
+            process_transactions(rows, **account_kwargs),
+        )
+
+    def test_multi_line_fields_match_in_memory_transactions(self):
+        rows = [list(row) for row in TRIODOS_ROWS * 3]
+        rows[0][7] = "Groceries\nweek 1"
+        rows[2][7] = 'Rent "Main\nStreet"\r\njanuary'
+        rows[4][4] = "IKEA\nBV"
+        input_file: str = f"{tempfile.mkdtemp()}/a.csv"
+        with open(
+            input_file, mode="w", encoding="utf-8", newline=""
+        ) as outfile:
+            csv.writer(outfile).writerows(rows)
+        account_kwargs = {
+            "account_holder": "alice",
+            "bank": "triodos",
+            "account_type": "checking",
+        }
+        self.assertEqual(
+            list(
+                iter_input_transactions(
+                    input_csv_filepath=input_file, **account_kwargs
+                )
+            ),
+            process_transactions(rows, **account_kwargs),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Tests whether the typeguard instrumentation can be disabled, and
+benchmarks the per-row parsing cost with and without it."""
+
+import json
+import os
+import subprocess  # nosec
+import sys
+import unittest
+
+from hledger_preprocessor.typechecking import TYPECHECK_ENV_VAR
+
+NR_OF_ROWS: int = int(
+    os.environ.get("HLEDGER_PREPROCESSOR_BENCHMARK_ROWS", "5000")
+)
+
+BENCHMARK_SCRIPT = """
+import json, sys, time
+from hledger_preprocessor.triodos_logic import parse_triodos_transaction
+from hledger_preprocessor.typechecking import typechecking_is_enabled
+
+row = [
+    "02-01-2024", "NL12TRIO0123456789", "1.012,50", "Debet", "Eko Plaza",
+    "NL99INGB0001234567", "BIC", "Groceries", "987,50",
+]
+nr_of_rows = int(sys.argv[1])
+durations = []
+for _ in range(3):
+    start = time.perf_counter()
+    for nr_in_batch in range(1, nr_of_rows + 1):
+        parse_triodos_transaction(
+            row,
+            nr_in_batch,
+            account_holder="alice",
+            bank="triodos",
+            account_type="checking",
+        )
+    durations.append(time.perf_counter() - start)
+try:
+    parse_triodos_transaction(row, "not an int", "alice", "triodos", "x")
+    rejects_wrong_types = False
+except Exception:
+    rejects_wrong_types = True
+print(json.dumps({
+    "enabled": typechecking_is_enabled(),
+    "seconds_per_row": min(durations) / nr_of_rows,
+    "rejects_wrong_types": rejects_wrong_types,
+}))
+"""
+
+
+def run_benchmark(*, typecheck: str) -> dict:
+    env = dict(os.environ)
+    env[TYPECHECK_ENV_VAR] = typecheck
+    completed = subprocess.run(  # nosec
+        [sys.executable, "-c", BENCHMARK_SCRIPT, str(NR_OF_ROWS)],
+        capture_output=True,
+        check=True,
+        env=env,
+        text=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+class Test_typechecking(unittest.TestCase):
+    """Object used to test the production switch of the typeguard
+    instrumentation."""
+
+    def test_production_mode_disables_typechecking(self):
+        development = run_benchmark(typecheck="1")
+        production = run_benchmark(typecheck="0")
+        print(
+            "Parsing cost per row with typeguard:"
+            f" {development['seconds_per_row'] * 1e6:.1f}us, without:"
+            f" {production['seconds_per_row'] * 1e6:.1f}us."
+        )
+        self.assertTrue(development["enabled"])
+        self.assertTrue(development["rejects_wrong_types"])
+        self.assertFalse(production["enabled"])
+        self.assertFalse(production["rejects_wrong_types"])
+        self.assertLess(
+            production["seconds_per_row"], development["seconds_per_row"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
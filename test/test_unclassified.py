@@ -0,0 +1,178 @@
+"""Tests whether unclassified transactions are deferred to a review file
+instead of blocking the run."""
+
+import os
+import tempfile
+import unittest
+from test.helpers import create_transaction
+from unittest.mock import patch
+
+from hledger_preprocessor.classification.classifier import classify_transaction
+from hledger_preprocessor.classification.logic_based.logic_eg0 import (
+    ExampleLogicModel,
+)
+from hledger_preprocessor.classification.unclassified import (
+    UNCLASSIFIED_CATEGORY,
+    UnclassifiedCollector,
+    get_review_path,
+    load_review_file,
+    review_unclassified_transactions,
+    update_review_file,
+)
+
+
+def create_unclassified_transaction(
+    *, date: str, description: str, other_party: str = "Unknown Shop"
+):
+    transaction = create_transaction(date=date, description=description)
+    transaction.other_party_name = other_party
+    return transaction
+
+
+class Test_unclassified(unittest.TestCase):
+    """Object used to test the deferred review of unclassified
+    transactions."""
+
+    def setUp(self):
+        self.start_path: str = tempfile.mkdtemp()
+        self.account_type_path: str = (
+            f"{self.start_path}/import/alice/triodos/checking"
+        )
+        os.makedirs(self.account_type_path)
+
+    def collect(
+        self, *, input_file: str, descriptions, other_party="Unknown Shop"
+    ):
+        logic_model = ExampleLogicModel()
+        collector = UnclassifiedCollector(input_file=input_file)
+        transactions = [
+            create_unclassified_transaction(
+                date=f"0{day}-01-2024",
+                description=description,
+                other_party=other_party,
+            )
+            for day, description in enumerate(descriptions, start=1)
+        ]
+        with patch("builtins.input", side_effect=AssertionError("blocked")):
+            for transaction in transactions:
+                classify_transaction(transaction, [], [logic_model])
+            list(collector.iter_collected(transactions))
+        return transactions, collector
+
+    def test_unclassified_transactions_do_not_block(self):
+        transactions, collector = self.collect(
+            input_file="1-in/2024/a.csv",
+            descriptions=["Order 123456", "Order 654321", "Gift"],
+        )
+        self.assertEqual(
+            transactions[0].to_dict()["logic_classification"],
+            UNCLASSIFIED_CATEGORY,
+        )
+        # The orders only differ in their reference numbers.
+        self.assertEqual(collector.nr_of_transactions, 3)
+        self.assertEqual(
+            sorted(entry.count for entry in collector.entries.values()), [1, 2]
+        )
+
+    def test_review_file_replaces_entries_per_input_file(self):
+        for input_file in ["1-in/2024/a.csv", "1-in/2024/b.csv"]:
+            _, collector = self.collect(
+                input_file=input_file, descriptions=["Gift"]
+            )
+            update_review_file(
+                account_type_path=self.account_type_path,
+                input_file=input_file,
+                entries=list(collector.entries.values()),
+            )
+        update_review_file(
+            account_type_path=self.account_type_path,
+            input_file="1-in/2024/a.csv",
+            entries=[],
+        )
+        review_path: str = get_review_path(
+            account_type_path=self.account_type_path
+        )
+        self.assertEqual(
+            [
+                entry.input_file
+                for entry in load_review_file(review_path=review_path)
+            ],
+            ["1-in/2024/b.csv"],
+        )
+        update_review_file(
+            account_type_path=self.account_type_path,
+            input_file="1-in/2024/b.csv",
+            entries=[],
+        )
+        self.assertFalse(os.path.exists(review_path))
+
+    def test_review_session_adds_rules(self):
+        for input_file in ["1-in/2024/a.csv", "1-in/2024/b.csv"]:
+            _, collector = self.collect(
+                input_file=input_file, descriptions=["Gift"]
+            )
+            update_review_file(
+                account_type_path=self.account_type_path,
+                input_file=input_file,
+                entries=list(collector.entries.values()),
+            )
+        rules_file: str = f"{self.start_path}/rules.csv"
+        questions = []
+
+        def ask(question: str) -> str:
+            questions.append(question)
+            return "shopping:unknown_shop"
+
+        nr_of_rules: int = review_unclassified_transactions(
+            start_path=self.start_path, rules_file=rules_file, ask=ask
+        )
+        # Both input files contain the same counterparty, which is asked once.
+        self.assertEqual((nr_of_rules, len(questions)), (1, 1))
+
+        logic_model = ExampleLogicModel()
+        logic_model.use_rules_file(filepath=rules_file)
+        self.assertEqual(
+            logic_model.classify(
+                create_unclassified_transaction(
+                    date="05-01-2024", description="Gift"
+                )
+            ),
+            "shopping:unknown_shop",
+        )
+
+    def test_rules_of_padded_counterparties_match(self):
+        # Bank exports pad the counterparty field.
+        other_party: str = "  Unknown Shop      "
+        _, collector = self.collect(
+            input_file="1-in/2024/a.csv",
+            descriptions=["Gift"],
+            other_party=other_party,
+        )
+        update_review_file(
+            account_type_path=self.account_type_path,
+            input_file="1-in/2024/a.csv",
+            entries=list(collector.entries.values()),
+        )
+        rules_file: str = f"{self.start_path}/rules.csv"
+        review_unclassified_transactions(
+            start_path=self.start_path,
+            rules_file=rules_file,
+            ask=lambda question: "shopping:unknown_shop",
+        )
+
+        logic_model = ExampleLogicModel()
+        logic_model.use_rules_file(filepath=rules_file)
+        self.assertEqual(
+            logic_model.classify(
+                create_unclassified_transaction(
+                    date="05-01-2024",
+                    description="Gift",
+                    other_party=other_party,
+                )
+            ),
+            "shopping:unknown_shop",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Tests whether the transactions are partitioned on years in a single pass,
+and benchmarks that the partitioning scales linearly."""
+
+import os
+import random
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from typing import List
+
+from hledger_preprocessor.__main__ import get_years, sort_transactions_on_years
+from hledger_preprocessor.amount import Amount
+from hledger_preprocessor.file_reading_and_writing import YearRoutedCsvWriter
+from hledger_preprocessor.triodos_logic import TriodosTransaction
+
+
+def generate_transactions(
+    *, nr_of_transactions: int, nr_of_years: int
+) -> List[TriodosTransaction]:
+    random.seed(nr_of_transactions)
+    return [
+        TriodosTransaction(
+            account_holder="alice",
+            bank="triodos",
+            account_type="checking",
+            nr_in_batch=nr_in_batch,
+            the_date=datetime(
+                2000 + random.randrange(nr_of_years),
+                random.randint(1, 12),
+                random.randint(1, 28),
+            ),
+            account0="NL12TRIO0123456789",
+            amount0=Amount(cents=1250),
+            transaction_code="Debet",
+            other_party_name="Eko Plaza",
+            account1="NL99INGB0001234567",
+            BIC="BIC",
+            description="Groceries",
+            balance0=Amount(cents=10000),
+        )
+        for nr_in_batch in range(1, nr_of_transactions + 1)
+    ]
+
+
+def time_partitioning(*, transactions: List[TriodosTransaction]) -> float:
+    """Returns the fastest of 3 runs, to reduce the noise of the machine."""
+    durations: List[float] = []
+    for _ in range(3):
+        start: float = time.perf_counter()
+        sort_transactions_on_years(transactions=transactions)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+class Test_year_partitioning(unittest.TestCase):
+    """Object used to test the partitioning of transactions on years."""
+
+    def test_partitioning_preserves_order(self):
+        transactions = generate_transactions(
+            nr_of_transactions=1000, nr_of_years=5
+        )
+        transactions_per_year = sort_transactions_on_years(
+            transactions=transactions
+        )
+        self.assertEqual(
+            list(transactions_per_year.keys()),
+            get_years(transactions=transactions),
+        )
+        self.assertEqual(
+            sum(len(group) for group in transactions_per_year.values()), 1000
+        )
+        for year, group in transactions_per_year.items():
+            self.assertEqual(
+                group, [t for t in transactions if t.get_year() == year]
+            )
+
+    def test_year_routed_writer_writes_one_file_per_year(self):
+        output_dir: str = tempfile.mkdtemp()
+        transactions = generate_transactions(
+            nr_of_transactions=100, nr_of_years=3
+        )
+        with YearRoutedCsvWriter(
+            get_output_filepath=lambda year: f"{output_dir}/{year}.csv"
+        ) as writer:
+            for transaction in transactions:
+                writer.write(transaction=transaction)
+        for year, group in sort_transactions_on_years(
+            transactions=transactions
+        ).items():
+            with open(f"{output_dir}/{year}.csv", encoding="utf-8") as csvfile:
+                # The header plus one line per transaction.
+                self.assertEqual(len(csvfile.readlines()), len(group) + 1)
+
+    def test_partitioning_scales_linearly(self):
+        nr_of_transactions: int = int(
+            os.environ.get("HLEDGER_PREPROCESSOR_BENCHMARK_ROWS", "5000")
+        )
+        small: float = time_partitioning(
+            transactions=generate_transactions(
+                nr_of_transactions=nr_of_transactions, nr_of_years=10
+            )
+        )
+        large: float = time_partitioning(
+            transactions=generate_transactions(
+                nr_of_transactions=8 * nr_of_transactions, nr_of_years=10
+            )
+        )
+        print(
+            f"Partitioned {nr_of_transactions} transactions in {small:.4f}s,"
+            f" {8 * nr_of_transactions} in {large:.4f}s."
+        )
+        # Linear scaling gives a ratio of ~8, quadratic scaling ~64.
+        self.assertLess(large / small, 24)
+
+
+if __name__ == "__main__":
+    unittest.main()